@@ -30,6 +30,7 @@ INSTALLED_APPS = [
     "apps.playlists",
     "apps.deezer",
     "apps.charts",
+    "apps.recommendations",
 ]
 
 MIDDLEWARE = [
@@ -159,6 +160,44 @@ CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_TASK_SOFT_TIME_LIMIT = 15 * 60
 CELERY_TASK_ALWAYS_EAGER = DEBUG
 CELERY_TASK_EAGER_PROPAGATES = DEBUG
+CELERY_BEAT_SCHEDULE = {
+    "rebuild-suggest-index": {
+        "task": "apps.catalogue.tasks.rebuild_suggest_index",
+        "schedule": 60 * 10,
+    },
+    "flush-queue-state": {
+        "task": "apps.playlists.tasks.flush_queue_state",
+        "schedule": 5,
+    },
+    "compact-playlist-changes": {
+        "task": "apps.playlists.tasks.compact_playlist_changes",
+        "schedule": 60 * 60 * 24,
+    },
+    "build-recommender": {
+        "task": "apps.recommendations.tasks.build_recommender",
+        "schedule": 60 * 60 * 6,
+    },
+    "build-embeddings": {
+        "task": "apps.recommendations.tasks.build_embeddings",
+        "schedule": 60 * 60 * 6,
+    },
+    "precompute-recommendations": {
+        "task": "apps.recommendations.tasks.precompute_recommendations",
+        "schedule": 60 * 60 * 24,
+    },
+}
+
+# "redis" keeps active queues in Redis so navigation is one round trip; "database" reads Postgres directly
+QUEUE_BACKEND = os.getenv("QUEUE_BACKEND", "database")
+# Produce CSV exports with COPY ... TO STDOUT when the database is Postgres
+EXPORT_USE_COPY = os.getenv("EXPORT_USE_COPY", "True") == "True"
+QUEUE_CACHE_TTL = 60 * 60 * 24
+# Playlist change log for delta sync: how long entries are kept, and the largest change worth logging
+PLAYLIST_CHANGE_LOG_TTL = 60 * 60 * 24 * 30
+PLAYLIST_CHANGE_LOG_MAX_OPS = 500
+# Radio refill is queued once fewer tracks than this are left after the current one, and adds this many
+RADIO_LOW_WATERMARK = 5
+RADIO_REFILL_SIZE = 10
 
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
@@ -171,6 +210,25 @@ DEFAULT_FILE_STORAGE = "storages.backends.s3boto3.S3Boto3Storage"
 MEDIA_URL = f"https://{AWS_S3_CUSTOM_DOMAIN}/"
 
 DEEZER_BASE_URL = os.getenv("DEEZER_BASE_URL", "https://api.deezer.com")
+DEEZER_MAX_CONCURRENCY = 8
+
+# Write-through mirror of fetched Deezer documents into the catalogue tables
+CATALOGUE_MIRROR_ENABLED = os.getenv("CATALOGUE_MIRROR_ENABLED", "True") == "True"
+CATALOGUE_MIRROR_FRESHNESS = 60 * 60
+
+# Typeahead prefix index: entries kept and how often each worker reloads it
+SUGGEST_INDEX_SIZE = 20000
+SUGGEST_INDEX_REFRESH = 60 * 5
+
+# Item-item recommender: days of playback history it is built from and how often each worker checks for a new build
+RECOMMENDER_HISTORY_DAYS = 180
+RECOMMENDER_REFRESH = 60 * 10
+# Users who played something this many days back get their recommendations precomputed every night
+RECOMMENDER_ACTIVE_DAYS = 30
+# Days after which a play counts half as much in a user's taste profile
+RECOMMENDER_TASTE_HALF_LIFE = 30
+# Memory-mapped track embeddings; must be shared by the workers that build them and the web workers that read them
+RECOMMENDER_EMBEDDINGS_DIR = os.getenv("RECOMMENDER_EMBEDDINGS_DIR", str(BASE_DIR / "var" / "embeddings"))
 
 USE_DIRECT_AUDIO_REDIRECT = False
 
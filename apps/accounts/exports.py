@@ -0,0 +1,185 @@
+"""
+Streaming exports of a user's history, favourites and playlists as NDJSON,
+CSV or M3U. Rows are read in chunks through server-side cursors and written
+out as they arrive, so memory stays flat however long the history is and the
+first bytes leave before the query has finished. On Postgres, CSV is produced
+by COPY ... TO STDOUT instead.
+"""
+import csv
+import datetime
+import json
+import queue
+import threading
+import uuid
+from django.conf import settings
+from django.db import connection
+from django.http import StreamingHttpResponse
+
+from .models import Favorite, PlaybackHistory
+
+CHUNK_SIZE = 2000
+
+KINDS = ('history', 'favorites', 'playlists')
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'm3u': 'audio/x-mpegurl; charset=utf-8',
+}
+
+COLUMNS = {
+    'history': (
+        'timestamp', 'track_id', 'track_title', 'artist_id', 'artist_name',
+        'album_title', 'album_cover', 'genre', 'position',
+    ),
+    'favorites': (
+        'created_at', 'track_id', 'track_title', 'artist_id', 'artist_name',
+        'album_title', 'album_cover', 'duration',
+    ),
+    'playlists': (
+        'playlist_id', 'playlist__name', 'position', 'track_id', 'track_title', 'artist_id',
+        'artist_name', 'album_title', 'album_cover', 'duration', 'added_at',
+    ),
+}
+
+TRACK_URL = 'https://www.deezer.com/track/{}'
+
+
+def export_rows(user, kind, playlist_id=None):
+    """values_list queryset of the rows to export, in a stable order"""
+    if kind == 'history':
+        qs = PlaybackHistory.objects.filter(user=user).order_by('timestamp', 'id')
+    elif kind == 'favorites':
+        qs = Favorite.objects.filter(user=user).order_by('created_at', 'id')
+    else:
+        from apps.playlists.models import PlaylistTrack
+
+        qs = PlaylistTrack.objects.filter(playlist__user=user).order_by('playlist_id', 'position')
+        if playlist_id:
+            qs = qs.filter(playlist_id=playlist_id)
+    return qs.values_list(*COLUMNS[kind])
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _ndjson(rows, columns):
+    names = [column.replace('__', '_') for column in columns]
+    for row in rows:
+        yield json.dumps(dict(zip(names, map(_json_value, row))), separators=(',', ':')) + '\n'
+
+
+class _Echo:
+    """csv.writer target that hands each formatted line back instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_header(columns):
+    return csv.writer(_Echo()).writerow([column.replace('__', '_') for column in columns])
+
+
+def _csv(rows, columns):
+    writer = csv.writer(_Echo())
+    yield _csv_header(columns)
+    for row in rows:
+        yield writer.writerow([_json_value(value) for value in row])
+
+
+def _m3u(rows, columns):
+    yield '#EXTM3U\n'
+    index = {column: i for i, column in enumerate(columns)}
+    duration = index.get('duration')
+    playlist = index.get('playlist_id')
+    current = None
+    for row in rows:
+        if playlist is not None and row[playlist] != current:
+            current = row[playlist]
+            yield f"#PLAYLIST:{row[index['playlist__name']]}\n"
+        seconds = row[duration] if duration is not None else -1
+        yield f"#EXTINF:{seconds},{row[index['artist_name']]} - {row[index['track_title']]}\n"
+        yield TRACK_URL.format(row[index['track_id']]) + '\n'
+
+
+class _CopySink:
+    """File-like target for copy_expert that passes chunks to the response through a bounded queue"""
+
+    def __init__(self):
+        self.chunks = queue.Queue(maxsize=16)
+        self.closed = False
+
+    def write(self, data):
+        while not self.closed:
+            try:
+                self.chunks.put(data, timeout=1)
+                return
+            except queue.Full:
+                continue
+        raise IOError("Export cancelled by the client")
+
+
+def _copy_csv(rows, columns):
+    """Stream COPY (query) TO STDOUT WITH CSV; psycopg2 only writes to files, so it runs in a thread"""
+    yield _csv_header(columns)
+    query, params = rows.query.sql_with_params()
+    with connection.cursor() as cursor:
+        sql = cursor.mogrify(query, params).decode()
+    raw = connection.connection
+    sink = _CopySink()
+    done = object()
+    errors = []
+
+    def run():
+        try:
+            with raw.cursor() as cursor:
+                cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH CSV", sink)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            sink.chunks.put(done)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = sink.chunks.get()
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        sink.closed = True
+        thread.join()
+    if errors and not isinstance(errors[0], IOError):
+        raise errors[0]
+
+
+def use_copy():
+    return connection.vendor == 'postgresql' and getattr(settings, 'EXPORT_USE_COPY', True)
+
+
+def stream(user, kind, fmt, playlist_id=None):
+    """Iterator over the chunks of the export: str, or bytes when COPY produces the CSV"""
+    rows = export_rows(user, kind, playlist_id)
+    columns = COLUMNS[kind]
+    if fmt == 'csv' and use_copy():
+        return _copy_csv(rows, columns)
+    rows = rows.iterator(chunk_size=CHUNK_SIZE)
+    if fmt == 'ndjson':
+        return _ndjson(rows, columns)
+    if fmt == 'csv':
+        return _csv(rows, columns)
+    return _m3u(rows, columns)
+
+
+def streaming_response(user, kind, fmt, playlist_id=None):
+    response = StreamingHttpResponse(stream(user, kind, fmt, playlist_id), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="playpod-{kind}.{fmt}"'
+    # Let proxies pass chunks through as they are produced
+    response['X-Accel-Buffering'] = 'no'
+    return response
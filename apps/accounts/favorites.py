@@ -0,0 +1,63 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.core.cache import get_cache_key, get_cached_data, cache_data
+from .models import Favorite
+
+
+def _ids_key(user_id):
+    return get_cache_key('favorites', f"user_{user_id}")
+
+
+def _version_key(user_id):
+    return get_cache_key('favorites_version', f"user_{user_id}")
+
+
+def favorite_track_ids(user):
+    """The user's favourite track ids, from the per-user cached set or one query"""
+    cache_key = _ids_key(user.pk)
+    track_ids = get_cached_data(cache_key)
+    if track_ids is None:
+        track_ids = list(Favorite.objects.filter(user=user).values_list('track_id', flat=True))
+        cache_data(cache_key, track_ids, timeout=getattr(settings, 'CACHE_TTL_LONG', 86400))
+    return frozenset(str(track_id) for track_id in track_ids)
+
+
+def favorites_version(user_id):
+    """
+    Token that changes whenever the user's favourites change, for ETags of
+    responses carrying is_favorite flags. A lost token is replaced with a new
+    timestamp, so eviction can only cause a redundant 200, never a stale 304.
+    """
+    version_key = _version_key(user_id)
+    version = cache.get(version_key)
+    if version is None:
+        version = time.time_ns()
+        cache.set(version_key, version, None)
+    return version
+
+
+def invalidate_favorites(user_id):
+    cache.delete(_ids_key(user_id))
+    cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+def favorites_for_request(request):
+    """Resolve the favourite set once per request and reuse it for every row"""
+    if request is None or not request.user.is_authenticated:
+        return frozenset()
+    favorite_ids = getattr(request, '_favorite_track_ids', None)
+    if favorite_ids is None:
+        favorite_ids = favorite_track_ids(request.user)
+        request._favorite_track_ids = favorite_ids
+    return favorite_ids
+
+
+def mark_favorites(request, tracks):
+    """Copy Deezer track documents with an is_favorite flag added"""
+    favorite_ids = favorites_for_request(request)
+    return [
+        dict(track, is_favorite=str(track.get('id')) in favorite_ids) if isinstance(track, dict) else track
+        for track in tracks or []
+    ]
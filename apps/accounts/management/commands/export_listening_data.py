@@ -0,0 +1,40 @@
+import sys
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.exports import FORMATS, KINDS, stream
+
+
+class Command(BaseCommand):
+    help = (
+        "Export a user's playback history, favourites or playlists as NDJSON, CSV or M3U. "
+        "Rows are streamed, so memory use does not grow with the size of the export."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help="Username or user id")
+        parser.add_argument('--kind', choices=KINDS, default='history')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+        parser.add_argument('--playlist', help="Only export this playlist (with --kind playlists)")
+        parser.add_argument('--output', '-o', help="File to write (defaults to stdout)")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user = User.objects.filter(username=options['user']).first()
+        if user is None:
+            try:
+                user = User.objects.filter(pk=options['user']).first()
+            except (ValueError, TypeError):
+                user = None
+        if user is None:
+            raise CommandError(f"No user {options['user']}")
+
+        chunks = stream(user, options['kind'], options['format'], options['playlist'])
+        out = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in chunks:
+                out.write(chunk.decode() if isinstance(chunk, bytes) else chunk)
+        finally:
+            if options['output']:
+                out.close()
+                self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
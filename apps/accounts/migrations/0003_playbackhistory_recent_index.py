@@ -0,0 +1,17 @@
+# Generated by Django 5.0.5 on 2026-10-19 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_playbackhistory_genre_playbackhistory_genre_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='playbackhistory',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='history_user_recent_idx'),
+        ),
+    ]
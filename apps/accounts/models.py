@@ -33,6 +33,7 @@ class Favorite(models.Model):
     class Meta:
         unique_together = ('user', 'track_id')
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['user', '-created_at'], name='favorite_user_recent_idx')]
 
     def __str__(self):
         return f"{self.user.username} - {self.track_title}"
@@ -55,6 +56,8 @@ class PlaybackHistory(models.Model):
     class Meta:
         ordering = ['-timestamp']
         verbose_name_plural = "Playback histories"
+        # Serves keyset pagination of a user's history, see apps.core.pagination
+        indexes = [models.Index(fields=['user', '-timestamp', '-id'], name='history_user_recent_idx')]
 
     def __str__(self):
         return f"{self.user.username} - {self.track_title} at {self.timestamp}"
\ No newline at end of file
@@ -1,7 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import Favorite, PlaybackHistory
+from .favorites import favorites_for_request
+from apps.core.membership import MembershipField
 from apps.playlists.serializers import PlaylistSerializer
+from apps.playlists.queue_cache import queued_track_ids
 
 User = get_user_model()
 
@@ -91,8 +94,9 @@ class FavoriteCreateSerializer(serializers.Serializer):
 
 
 class PlaybackHistorySerializer(serializers.ModelSerializer):
-    in_queue = serializers.SerializerMethodField()
-    
+    in_queue = MembershipField(queued_track_ids)
+    is_favorite = MembershipField(favorites_for_request)
+
     class Meta:
         model = PlaybackHistory
         fields = [
@@ -105,24 +109,12 @@ class PlaybackHistorySerializer(serializers.ModelSerializer):
             'album_cover',
             'position',
             'timestamp',
-            'in_queue'
+            'in_queue',
+            'is_favorite'
         ]
-        read_only_fields = ['id', 'timestamp', 'in_queue']
+        read_only_fields = ['id', 'timestamp', 'in_queue', 'is_favorite']
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         representation['played_at'] = representation.pop('timestamp')
         return representation
-        
-    def get_in_queue(self, obj):
-        """Check if this track is currently in the user's queue"""
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-            
-        user = request.user
-        try:
-            queue = user.queue
-            return queue.tracks.filter(track_id=obj.track_id).exists()
-        except:
-            return False
\ No newline at end of file
@@ -1,3 +1,66 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from apps.core.pagination import HistoryPagination
+from apps.core.query_plans import analyze, plan_problems
+from .models import Favorite, PlaybackHistory
+
+User = get_user_model()
+
+USERS = 50
+PLAYS_PER_USER = 400
+FAVORITES_PER_USER = 300
+
+
+def track_columns(i):
+    return {
+        'track_id': str(i),
+        'artist_id': str(i % 500),
+        'track_title': f'Track {i}',
+        'artist_name': f'Artist {i % 500}',
+        'album_title': f'Album {i % 2000}',
+    }
+
+
+class HotQueryPlanTests(TestCase):
+    """History and favourites pages must come straight off an index, however large the tables grow"""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(username=f'user{n}', email=f'user{n}@example.com') for n in range(USERS)
+        )
+        PlaybackHistory.objects.bulk_create(
+            (PlaybackHistory(user=user, position=i, **track_columns(i))
+             for user in users for i in range(PLAYS_PER_USER)),
+            batch_size=5000,
+        )
+        Favorite.objects.bulk_create(
+            (Favorite(user=user, **track_columns(i)) for user in users for i in range(FAVORITES_PER_USER)),
+            batch_size=5000,
+        )
+        analyze(User, PlaybackHistory, Favorite)
+        cls.user = users[USERS // 2]
+
+    def assertIndexed(self, queryset, **kwargs):
+        self.assertEqual(plan_problems(queryset, **kwargs), [], queryset.explain())
+
+    def test_history_first_page(self):
+        ordering = HistoryPagination.ordering
+        self.assertIndexed(PlaybackHistory.objects.filter(user=self.user).order_by(*ordering)[:51])
+
+    def test_history_deep_page(self):
+        last = PlaybackHistory.objects.filter(user=self.user).order_by('-timestamp')[300]
+        qs = PlaybackHistory.objects.filter(user=self.user, timestamp__lt=last.timestamp)
+        self.assertIndexed(qs.order_by(*HistoryPagination.ordering)[:51])
+
+    def test_favorites_page(self):
+        self.assertIndexed(Favorite.objects.filter(user=self.user).order_by('-created_at')[:20])
+
+    def test_favorite_lookup(self):
+        self.assertIndexed(Favorite.objects.filter(user=self.user, track_id='42').order_by())
+
+    def test_history_export(self):
+        # Unbounded, so sorting one user's rows may legitimately win; only the scan is checked
+        qs = PlaybackHistory.objects.filter(user=self.user).order_by('timestamp', 'id')
+        self.assertIndexed(qs, allow_sort=True)
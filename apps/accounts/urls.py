@@ -4,7 +4,7 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .views import (
     MeView, MeUpdateView, UserPublicView,
     FavoriteViewSet, PlaybackHistoryViewSet, PlaybackHistoryView,
-    AvatarUploadView, RegisterView
+    AvatarUploadView, RegisterView, ExportView
 )
 
 router = DefaultRouter()
@@ -20,5 +20,6 @@ urlpatterns = [
     path('me/avatar/', AvatarUploadView.as_view(), name='me_avatar'),
     path('users/<uuid:pk>/', UserPublicView.as_view(), name='user_public'),
     path('history/all/', PlaybackHistoryView.as_view(), name='history_all'),
+    path('export/<slug:kind>.<slug:fmt>', ExportView.as_view(), name='export'),
     path('', include(router.urls)),
 ]
@@ -1,3 +1,4 @@
+import uuid
 from rest_framework import viewsets, mixins, status, parsers
 from rest_framework.views import APIView
 from rest_framework.generics import RetrieveAPIView, UpdateAPIView, CreateAPIView
@@ -8,7 +9,10 @@ from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
 
 from apps.deezer.client import deezer_client
+from apps.core.pagination import HistoryPagination
 from .models import Favorite, PlaybackHistory
+from .favorites import invalidate_favorites
+from . import exports
 from .serializers import (
     UserSerializer, UserUpdateSerializer, PublicUserSerializer,
     FavoriteSerializer, FavoriteCreateSerializer,
@@ -198,6 +202,7 @@ class FavoriteViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
             album_cover=album.get('cover_medium') or album.get('cover') or '',
             duration=data.get('duration', 0)
         )
+        invalidate_favorites(request.user.pk)
         return Response(FavoriteSerializer(fav).data, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['post'])
@@ -224,6 +229,7 @@ class FavoriteViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         tid = serializer.validated_data['track_id']
         fav = get_object_or_404(Favorite, user=request.user, track_id=tid)
         fav.delete()
+        invalidate_favorites(request.user.pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 class PlaybackHistoryViewSet(viewsets.ReadOnlyModelViewSet):
@@ -238,20 +244,72 @@ class PlaybackHistoryViewSet(viewsets.ReadOnlyModelViewSet):
     """
     serializer_class = PlaybackHistorySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = HistoryPagination
     def get_queryset(self):
         return PlaybackHistory.objects.filter(user=self.request.user)
 
 class PlaybackHistoryView(APIView):
     """
-    API endpoint to retrieve all of a user's playback history.
+    API endpoint to page through all of a user's playback history, most recent first.
     ---
     responses:
       200:
-        description: Complete playback history
+        description: A page of playback history with next and previous links
       401:
         description: Authentication required
     """
     permission_classes = [IsAuthenticated]
     def get(self, request):
-        hist = PlaybackHistory.objects.filter(user=request.user).order_by('-timestamp')
-        return Response(PlaybackHistorySerializer(hist, many=True).data)
+        hist = PlaybackHistory.objects.filter(user=request.user)
+        paginator = HistoryPagination()
+        page = paginator.paginate_queryset(hist, request, view=self)
+        return paginator.get_paginated_response(
+            PlaybackHistorySerializer(page, many=True, context={'request': request}).data
+        )
+
+
+class ExportView(APIView):
+    """
+    Stream the user's history, favorites or playlists as a download.
+    ---
+    parameters:
+      - name: kind
+        in: path
+        required: true
+        schema:
+          type: string
+          enum: [history, favorites, playlists]
+      - name: fmt
+        in: path
+        required: true
+        schema:
+          type: string
+          enum: [ndjson, csv, m3u]
+      - name: playlist
+        in: query
+        required: false
+        schema:
+          type: string
+        description: Only export this playlist (kind playlists)
+    responses:
+      200:
+        description: The export, streamed as it is read
+      404:
+        description: Unknown kind or format
+    """
+    permission_classes = [IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The body is not rendered by DRF, so any Accept header will do
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, kind, fmt):
+        if kind not in exports.KINDS or fmt not in exports.FORMATS:
+            return Response({'detail': 'Unknown export'}, status=status.HTTP_404_NOT_FOUND)
+        playlist_id = request.query_params.get('playlist')
+        if playlist_id:
+            try:
+                playlist_id = uuid.UUID(playlist_id)
+            except ValueError:
+                return Response({'detail': 'Invalid playlist id'}, status=status.HTTP_400_BAD_REQUEST)
+        return exports.streaming_response(request.user, kind, fmt, playlist_id)
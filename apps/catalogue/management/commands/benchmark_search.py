@@ -0,0 +1,58 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+
+from apps.catalogue import search as local_search
+from apps.catalogue.models import Track
+from apps.deezer.client import deezer_client
+
+
+class Command(BaseCommand):
+    help = "Compare local catalogue search latency with upstream Deezer search"
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', help="Queries to run (defaults to words from popular mirrored tracks)")
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--skip-upstream', action='store_true', help="Only time the local search")
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or self._sample_queries()
+        if not queries:
+            self.stderr.write("No queries given and the catalogue mirror is empty")
+            return
+
+        limit = options['limit']
+
+        def local(query):
+            local_search.search_artists(query, limit=limit)
+            local_search.search_tracks(query, limit=limit)
+            local_search.search_albums(query, limit=limit)
+
+        def upstream(query):
+            # Bypass the cache so every call measures a real Deezer round trip
+            for kind in ('artist', 'track', 'album'):
+                deezer_client._make_request(f'search/{kind}', {'q': query, 'limit': limit})
+
+        self._report('local', local, queries, options['repeat'])
+        if not options['skip_upstream']:
+            self._report('upstream', upstream, queries, options['repeat'])
+
+    def _sample_queries(self):
+        titles = Track.objects.order_by('-popularity').values_list('title', flat=True)[:20]
+        return [title.split()[0] for title in titles if title.split()]
+
+    def _report(self, label, search, queries, repeat):
+        timings = []
+        for _ in range(repeat):
+            for query in queries:
+                started = time.perf_counter()
+                search(query)
+                timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"{label:>8}: {len(timings)} searches, "
+            f"median {statistics.median(timings):.2f} ms, p95 {p95:.2f} ms, max {timings[-1]:.2f} ms"
+        )
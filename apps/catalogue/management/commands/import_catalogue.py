@@ -0,0 +1,145 @@
+import csv
+import gzip
+import json
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.catalogue.mirror import mirror_documents
+
+KINDS = ('artist', 'album', 'track')
+
+
+def _csv_document(row):
+    """Rebuild a Deezer-shaped document from a flattened CSV row"""
+    document = {
+        key: value for key, value in row.items()
+        if value not in (None, '') and not key.startswith(('artist_', 'album_'))
+    }
+    for number in ('duration', 'rank'):
+        if document.get(number):
+            document[number] = int(document[number])
+    if row.get('artist_id'):
+        document['artist'] = {
+            'id': row['artist_id'],
+            'name': row.get('artist_name', ''),
+            'picture_medium': row.get('artist_picture', ''),
+        }
+    if row.get('album_id'):
+        document['album'] = {
+            'id': row['album_id'],
+            'title': row.get('album_title', ''),
+            'cover_medium': row.get('album_cover', ''),
+        }
+    return document
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a Deezer catalogue dump (JSONL or CSV, optionally gzipped) into Artist, Album and Track. "
+        "Records are streamed, written in batches and checkpointed so an interrupted import resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Dump file; one JSON document or one CSV row per line")
+        parser.add_argument('--format', choices=['jsonl', 'csv'], help="Defaults to the file extension")
+        parser.add_argument('--kind', choices=KINDS, help="Record kind when the dump has no 'type' field/column")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--checkpoint', help="Checkpoint file (defaults to <path>.checkpoint)")
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint")
+        parser.add_argument(
+            '--complete', action='store_true',
+            help="Treat records as full detail documents that detail views may serve while fresh",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+
+        fmt = options['format'] or ('csv' if '.csv' in os.path.basename(path) else 'jsonl')
+        checkpoint_path = options['checkpoint'] or f"{path}.checkpoint"
+        checkpoint = {'offset': 0, 'rows': 0, 'skipped': 0}
+        if not options['restart'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                checkpoint = dict(checkpoint, **json.load(f))
+            self.stdout.write(f"Resuming at byte {checkpoint['offset']} after {checkpoint['rows']} rows")
+
+        id_cache = {'artists': {}, 'albums': {}}
+        batch = {kind: [] for kind in KINDS}
+        pending = 0
+        imported = checkpoint['rows']
+        skipped = checkpoint['skipped']
+        started = time.monotonic()
+        started_rows = imported
+
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            header = None
+            if fmt == 'csv':
+                header = next(csv.reader([f.readline().decode('utf-8-sig')]))
+            if checkpoint['offset']:
+                f.seek(checkpoint['offset'])
+
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                line = line.decode('utf-8').strip()
+                if not line:
+                    continue
+
+                if fmt == 'csv':
+                    document = _csv_document(dict(zip(header, next(csv.reader([line])))))
+                else:
+                    document = json.loads(line)
+
+                kind = document.pop('type', None) or options['kind'] or 'track'
+                if kind not in KINDS:
+                    continue
+                batch[kind].append(document)
+                pending += 1
+
+                if pending >= options['batch_size']:
+                    written = self._flush(batch, id_cache, options['complete'])
+                    imported += written
+                    skipped += pending - written
+                    pending = 0
+                    self._save_checkpoint(checkpoint_path, f.tell(), imported, skipped)
+                    self._report(imported, skipped, imported - started_rows, started)
+
+            if pending:
+                written = self._flush(batch, id_cache, options['complete'])
+                imported += written
+                skipped += pending - written
+                self._save_checkpoint(checkpoint_path, f.tell(), imported, skipped)
+
+        self._report(imported, skipped, imported - started_rows, started)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} rows from {path}, skipped {skipped}"))
+
+    def _flush(self, batch, id_cache, complete):
+        """Write the batch; returns the rows written, which excludes invalid and duplicate records"""
+        with transaction.atomic():
+            written = mirror_documents(
+                artists=batch['artist'],
+                albums=batch['album'],
+                tracks=batch['track'],
+                complete=complete,
+                id_cache=id_cache,
+            )
+        for documents in batch.values():
+            documents.clear()
+        return written
+
+    def _save_checkpoint(self, checkpoint_path, offset, rows, skipped):
+        tmp_path = f"{checkpoint_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'offset': offset, 'rows': rows, 'skipped': skipped}, f)
+        os.replace(tmp_path, checkpoint_path)
+
+    def _report(self, imported, skipped, rows_this_run, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(f"{imported} rows imported, {skipped} skipped, {rows_this_run / elapsed:,.0f} rows/s")
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.5 on 2026-10-19 11:20
+
+from django.db import migrations
+
+SEARCH_INDEXES = [
+    ('catalogue_artist', 'name'),
+    ('catalogue_album', 'title'),
+    ('catalogue_track', 'title'),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table, column in SEARCH_INDEXES:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm '
+                f'ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+            )
+    elif vendor == 'sqlite':
+        for table, column in SEARCH_INDEXES:
+            fts = f'{table}_fts'
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} "
+                f"USING fts5({column}, content='{table}', content_rowid='rowid')"
+            )
+            schema_editor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts}(rowid, {column}) VALUES (new.rowid, new.{column}); END"
+            )
+            schema_editor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.rowid, old.{column}); END"
+            )
+            schema_editor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.rowid, old.{column}); "
+                f"INSERT INTO {fts}(rowid, {column}) VALUES (new.rowid, new.{column}); END"
+            )
+            schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for table, column in SEARCH_INDEXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_trgm')
+    elif vendor == 'sqlite':
+        for table, column in SEARCH_INDEXES:
+            fts = f'{table}_fts'
+            for suffix in ('ai', 'ad', 'au'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue', '0002_artist_album_track_payload_synced_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,184 @@
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Artist, Album, Track
+
+MIRROR_BATCH_SIZE = 500
+
+
+def _deezer_id(data):
+    if not isinstance(data, dict) or data.get('id') in (None, ''):
+        return None
+    return str(data['id'])
+
+
+def _release_date(value):
+    try:
+        return parse_date(value) if value else None
+    except ValueError:
+        return None
+
+
+def _collect(target, data, complete):
+    """Keep one payload per deezer_id, preferring full detail documents over nested references"""
+    deezer_id = _deezer_id(data)
+    if deezer_id and (complete or deezer_id not in target):
+        target[deezer_id] = (data, complete)
+
+
+def _upsert(model, rows, update_fields):
+    if not rows:
+        return
+    model.objects.bulk_create(
+        rows,
+        batch_size=MIRROR_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['deezer_id'],
+        update_fields=update_fields,
+    )
+
+
+def _insert_missing(model, rows):
+    if rows:
+        model.objects.bulk_create(rows, batch_size=MIRROR_BATCH_SIZE, ignore_conflicts=True)
+
+
+def _id_map(model, deezer_ids, known=None):
+    """Resolve deezer_ids to primary keys, only querying the ones not already known"""
+    known = {} if known is None else known
+    missing = [deezer_id for deezer_id in deezer_ids if deezer_id not in known]
+    if missing:
+        known.update(model.objects.filter(deezer_id__in=missing).values_list('deezer_id', 'id'))
+    return known
+
+
+def mirror_documents(artists=(), albums=(), tracks=(), complete=False, id_cache=None):
+    """
+    Upsert Deezer artist, album and track payloads into the local catalogue.
+
+    Every model is written with one bulk statement per batch. Payloads passed
+    with complete=True are full detail documents: they replace the stored
+    payload and refresh synced_at, so the detail views may serve them back.
+    List items only refresh their descriptive columns (their payload is kept
+    for new rows only), and nested artist or album references are inserted
+    when missing but never overwrite a row.
+
+    id_cache ({'artists': {}, 'albums': {}}) carries deezer_id -> pk maps
+    across calls, so batch importers resolve foreign keys without re-querying.
+
+    Returns how many distinct artists, albums and tracks given as arguments
+    were written; documents without a name or title, and albums or tracks
+    whose artist is unknown, are skipped.
+    """
+    now = timezone.now()
+    id_cache = {'artists': {}, 'albums': {}} if id_cache is None else id_cache
+    artist_docs, album_docs, track_docs = {}, {}, {}
+    given = {
+        Artist: {_deezer_id(artist) for artist in artists},
+        Album: {_deezer_id(album) for album in albums},
+    }
+    written = 0
+
+    for artist in artists:
+        _collect(artist_docs, artist, complete)
+    for album in albums:
+        _collect(album_docs, album, complete)
+        _collect(artist_docs, album.get('artist'), False)
+    for track in tracks:
+        _collect(track_docs, track, complete)
+        _collect(artist_docs, track.get('artist'), False)
+        album = track.get('album')
+        if isinstance(album, dict) and album.get('title') and not album.get('artist'):
+            album = dict(album, artist=track.get('artist'))
+        _collect(album_docs, album, False)
+
+    full_artists, nested_artists = [], []
+    for deezer_id, (data, is_complete) in artist_docs.items():
+        if not data.get('name'):
+            continue
+        written += deezer_id in given[Artist]
+        row = Artist(
+            deezer_id=deezer_id,
+            name=data['name'][:255],
+            image_url=data.get('picture_medium') or data.get('picture') or '',
+            website=data.get('link') or '',
+            payload=data,
+        )
+        if is_complete:
+            row.synced_at = now
+            full_artists.append(row)
+        elif deezer_id not in id_cache['artists']:
+            nested_artists.append(row)
+    _upsert(Artist, full_artists, ['name', 'image_url', 'website', 'payload', 'synced_at'])
+    _insert_missing(Artist, nested_artists)
+
+    artist_ids = {_deezer_id(data.get('artist')) for data, _ in album_docs.values()}
+    artist_ids.update(_deezer_id(data.get('artist')) for data, _ in track_docs.values())
+    artist_map = _id_map(Artist, [i for i in artist_ids if i], id_cache['artists'])
+
+    full_albums, nested_albums = [], []
+    for deezer_id, (data, is_complete) in album_docs.items():
+        artist_pk = artist_map.get(_deezer_id(data.get('artist')))
+        if not artist_pk or not data.get('title'):
+            continue
+        written += deezer_id in given[Album]
+        row = Album(
+            deezer_id=deezer_id,
+            title=data['title'][:255],
+            artist_id=artist_pk,
+            cover_url=data.get('cover_medium') or data.get('cover') or '',
+            release_date=_release_date(data.get('release_date')),
+            payload=data,
+        )
+        if is_complete:
+            row.synced_at = now
+            full_albums.append(row)
+        elif deezer_id not in id_cache['albums']:
+            nested_albums.append(row)
+    _upsert(Album, full_albums, ['title', 'artist', 'cover_url', 'release_date', 'payload', 'synced_at'])
+    _insert_missing(Album, nested_albums)
+
+    album_ids = [_deezer_id(data.get('album')) for data, _ in track_docs.values()]
+    album_map = _id_map(Album, [i for i in album_ids if i], id_cache['albums'])
+
+    full_tracks, listed_tracks = [], []
+    for deezer_id, (data, is_complete) in track_docs.items():
+        artist_pk = artist_map.get(_deezer_id(data.get('artist')))
+        if not artist_pk or not data.get('title'):
+            continue
+        written += 1
+        row = Track(
+            deezer_id=deezer_id,
+            title=data['title'][:255],
+            artist_id=artist_pk,
+            album_id=album_map.get(_deezer_id(data.get('album'))),
+            duration=max(data.get('duration') or 0, 0),
+            audio_url=data.get('preview') or '',
+            popularity=max(data.get('rank') or 0, 0),
+            payload=data,
+        )
+        if is_complete:
+            row.synced_at = now
+            full_tracks.append(row)
+        else:
+            listed_tracks.append(row)
+    _upsert(Track, full_tracks, ['title', 'artist', 'album', 'duration', 'audio_url', 'popularity', 'payload', 'synced_at'])
+    _upsert(Track, listed_tracks, ['title', 'artist', 'duration', 'audio_url', 'popularity'])
+    return written
+
+
+def stored_documents(model, deezer_ids):
+    """Mirrored payloads for deezer_ids in one query, whatever their age"""
+    rows = model.objects.filter(deezer_id__in=[str(i) for i in deezer_ids]).exclude(payload={})
+    return dict(rows.values_list('deezer_id', 'payload'))
+
+
+def fresh_document(model, deezer_id):
+    """Return the mirrored Deezer payload for deezer_id if it was synced within the freshness window"""
+    window = getattr(settings, 'CATALOGUE_MIRROR_FRESHNESS', 3600)
+    return model.objects.filter(
+        deezer_id=str(deezer_id),
+        synced_at__gte=timezone.now() - timedelta(seconds=window),
+    ).values_list('payload', flat=True).first()
@@ -9,6 +9,8 @@ class Artist(models.Model):
     bio = models.TextField(blank=True)
     website = models.URLField(blank=True)
     deezer_id = models.CharField(max_length=255, unique=True)
+    payload = models.JSONField(default=dict, blank=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['name']
@@ -28,6 +30,8 @@ class Album(models.Model):
     cover_url = models.URLField(blank=True)
     release_date = models.DateField(null=True, blank=True)
     deezer_id = models.CharField(max_length=255, unique=True)
+    payload = models.JSONField(default=dict, blank=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['-release_date']
@@ -56,6 +60,8 @@ class Track(models.Model):
     popularity = models.PositiveIntegerField(default=0)
     genre = models.CharField(max_length=100, blank=True)
     deezer_id = models.CharField(max_length=255, unique=True)
+    payload = models.JSONField(default=dict, blank=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['title']
@@ -0,0 +1,81 @@
+from django.db import connection
+from django.db.models import F, Max
+
+from .models import Artist, Album, Track
+
+
+def _fts_match(query):
+    """Turn free text into an FTS5 prefix query, quoting every token"""
+    tokens = [token.replace('"', '""') for token in query.split()]
+    return ' '.join(f'"{token}"*' for token in tokens if token)
+
+
+def _matching(queryset, column, query):
+    """
+    Filter a catalogue queryset on a text column using the local search index.
+    PostgreSQL answers icontains from the UPPER(column) gin_trgm_ops index,
+    SQLite goes through the FTS5 shadow table kept in sync by triggers.
+    """
+    if connection.vendor == 'sqlite':
+        match = _fts_match(query)
+        if not match:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            where=[f"{table}.rowid IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s)"],
+            params=[match],
+        )
+    return queryset.filter(**{f"{column}__icontains": query})
+
+
+def _artist_document(artist):
+    return artist.payload or {
+        'id': int(artist.deezer_id) if artist.deezer_id.isdigit() else artist.deezer_id,
+        'name': artist.name,
+        'picture_medium': artist.image_url,
+        'type': 'artist',
+    }
+
+
+def _album_document(album):
+    return album.payload or {
+        'id': int(album.deezer_id) if album.deezer_id.isdigit() else album.deezer_id,
+        'title': album.title,
+        'cover_medium': album.cover_url,
+        'artist': _artist_document(album.artist),
+        'type': 'album',
+    }
+
+
+def _track_document(track):
+    if track.payload:
+        return track.payload
+    document = {
+        'id': int(track.deezer_id) if track.deezer_id.isdigit() else track.deezer_id,
+        'title': track.title,
+        'duration': track.duration,
+        'rank': track.popularity,
+        'preview': track.audio_url,
+        'artist': _artist_document(track.artist),
+        'type': 'track',
+    }
+    if track.album:
+        document['album'] = {'id': track.album.deezer_id, 'title': track.album.title, 'cover_medium': track.album.cover_url}
+    return document
+
+
+def search_tracks(query, limit=10):
+    qs = _matching(Track.objects.select_related('artist', 'album'), 'title', query)
+    return [_track_document(track) for track in qs.order_by('-popularity')[:limit]]
+
+
+def search_artists(query, limit=10):
+    qs = _matching(Artist.objects.all(), 'name', query)
+    qs = qs.annotate(score=Max('tracks__popularity')).order_by(F('score').desc(nulls_last=True), 'name')
+    return [_artist_document(artist) for artist in qs[:limit]]
+
+
+def search_albums(query, limit=10):
+    qs = _matching(Album.objects.select_related('artist'), 'title', query)
+    qs = qs.annotate(score=Max('tracks__popularity')).order_by(F('score').desc(nulls_last=True), 'title')
+    return [_album_document(album) for album in qs[:limit]]
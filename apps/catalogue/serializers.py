@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from apps.accounts.favorites import favorites_for_request
+from apps.core.membership import MembershipField
 from .models import Artist, Album, Track
 
 
@@ -34,7 +36,7 @@ class AlbumSerializer(serializers.ModelSerializer):
 class TrackListSerializer(serializers.ModelSerializer):
     artist_name = serializers.CharField(source='artist.name', read_only=True)
     album_title = serializers.CharField(source='album.title', read_only=True, allow_null=True)
-    is_favorite = serializers.SerializerMethodField()
+    is_favorite = MembershipField(favorites_for_request, source='deezer_id')
 
     class Meta:
         model = Track
@@ -43,18 +45,12 @@ class TrackListSerializer(serializers.ModelSerializer):
             'duration', 'genre', 'is_favorite', 'deezer_id'
         ]
 
-    def get_is_favorite(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.favorited_by.filter(user=request.user).exists()
-        return False
-
 
 class TrackDetailSerializer(serializers.ModelSerializer):
     artist_name = serializers.CharField(source='artist.name', read_only=True)
     album_title = serializers.CharField(source='album.title', read_only=True, allow_null=True)
     album_cover = serializers.URLField(source='album.cover_url', read_only=True, allow_null=True)
-    is_favorite = serializers.SerializerMethodField()
+    is_favorite = MembershipField(favorites_for_request, source='deezer_id')
 
     class Meta:
         model = Track
@@ -63,12 +59,6 @@ class TrackDetailSerializer(serializers.ModelSerializer):
             'album_cover', 'duration', 'genre', 'audio_url', 'is_favorite', 'deezer_id'
         ]
 
-    def get_is_favorite(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.favorited_by.filter(user=request.user).exists()
-        return False
-
 
 class RadioNextSerializer(serializers.Serializer):
     seed = serializers.UUIDField()
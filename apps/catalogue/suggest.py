@@ -0,0 +1,163 @@
+import heapq
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from apps.core.cache import get_cache_key, get_cached_data, cache_data
+from apps.core.reloadable import Reloadable
+
+SUGGEST_CACHE_KEY = get_cache_key('suggest', 'entries')
+REBUILD_LOCK_KEY = get_cache_key('suggest', 'rebuilding')
+# How long a cache miss waits before queuing another rebuild
+REBUILD_LOCK_TTL = 60 * 5
+# Prefixes this short match too many keys to scan, so their answers are precomputed
+SHORT_PREFIX = 2
+MAX_SUGGESTIONS = 20
+SCAN_LIMIT = 5000
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse whitespace"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.lower().split())
+
+
+def _keys(label):
+    """Index a label under itself and under every later word, so "Daft Punk" matches "punk" too"""
+    words = normalize(label).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class PrefixIndex:
+    """
+    Immutable prefix index over suggestion entries.
+    Keys live in one sorted list searched with bisect; each key points at an
+    entry slot. Lookups never touch the database, the cache or the network.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        rows = []
+        for slot, entry in enumerate(entries):
+            for key in _keys(entry['label']):
+                rows.append((key, -entry['score'], slot))
+        rows.sort()
+        self.keys = [row[0] for row in rows]
+        self.slots = [row[2] for row in rows]
+
+        short = defaultdict(list)
+        for key, neg_score, slot in rows:
+            for size in range(1, min(SHORT_PREFIX, len(key)) + 1):
+                short[key[:size]].append((neg_score, slot))
+        self.short = {
+            prefix: self._top(candidates, MAX_SUGGESTIONS)
+            for prefix, candidates in short.items()
+        }
+
+    def _top(self, candidates, limit):
+        seen, best = set(), []
+        for _, slot in heapq.nsmallest(limit * 4, candidates):
+            if slot not in seen:
+                seen.add(slot)
+                best.append(slot)
+                if len(best) == limit:
+                    break
+        return best
+
+    def lookup(self, prefix, limit=8):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        limit = min(limit, MAX_SUGGESTIONS)
+
+        if len(prefix) <= SHORT_PREFIX:
+            slots = self.short.get(prefix, [])[:limit]
+        else:
+            lo = bisect_left(self.keys, prefix)
+            hi = bisect_left(self.keys, prefix + '\uffff', lo, min(len(self.keys), lo + SCAN_LIMIT))
+            candidates = ((-self.entries[self.slots[i]]['score'], self.slots[i]) for i in range(lo, hi))
+            slots = self._top(candidates, limit)
+
+        return [self.entries[slot]['item'] for slot in slots]
+
+
+def build_entries():
+    """
+    Collect suggestion entries from listening history play counts, the
+    cached Deezer charts and the most popular mirrored tracks.
+    """
+    from apps.accounts.models import PlaybackHistory
+    from apps.catalogue.models import Track
+    from apps.deezer.client import deezer_client
+
+    size = getattr(settings, 'SUGGEST_INDEX_SIZE', 20000)
+    scores = defaultdict(float)
+    items = {}
+
+    def add(kind, deezer_id, label, subtitle, score):
+        if not deezer_id or not label:
+            return
+        key = (kind, str(deezer_id))
+        scores[key] += score
+        items.setdefault(key, {'type': kind, 'id': str(deezer_id), 'label': label, 'subtitle': subtitle})
+
+    played = (
+        PlaybackHistory.objects
+        .values('track_id', 'track_title', 'artist_id', 'artist_name')
+        .annotate(plays=Count('id'))
+        .order_by('-plays')[:size]
+    )
+    for row in played:
+        add('track', row['track_id'], row['track_title'], row['artist_name'], row['plays'] * 10)
+        add('artist', row['artist_id'], row['artist_name'], '', row['plays'] * 10)
+
+    for rank, track in enumerate(deezer_client.get_top_charts(limit=100)):
+        artist = track.get('artist') or {}
+        add('track', track.get('id'), track.get('title'), artist.get('name', ''), 100 - rank)
+        add('artist', artist.get('id'), artist.get('name'), '', 100 - rank)
+    for rank, album in enumerate(deezer_client.get_top_albums(limit=50)):
+        artist = album.get('artist') or {}
+        add('album', album.get('id'), album.get('title'), artist.get('name', ''), 50 - rank)
+
+    popular = Track.objects.select_related('artist').order_by('-popularity')[:size]
+    for track in popular:
+        # Deezer ranks run up to ~1,000,000; scale them below a handful of plays
+        add('track', track.deezer_id, track.title, track.artist.name, track.popularity / 100000)
+
+    ranked = heapq.nlargest(size, scores.items(), key=lambda pair: pair[1])
+    return [
+        {'label': items[key]['label'], 'score': score, 'item': items[key]}
+        for key, score in ranked
+    ]
+
+
+def rebuild():
+    """Build suggestion entries and publish them for every web worker"""
+    entries = build_entries()
+    cache_data(SUGGEST_CACHE_KEY, entries, timeout=getattr(settings, 'CACHE_TTL_LONG', 86400))
+    return len(entries)
+
+
+def _load(current):
+    entries = get_cached_data(SUGGEST_CACHE_KEY)
+    if entries is None:
+        # Building calls Deezer, so a request never waits for it: keep serving what this
+        # process has (nothing on a cold start) while one worker rebuilds
+        if cache.add(REBUILD_LOCK_KEY, 1, REBUILD_LOCK_TTL):
+            from .tasks import rebuild_suggest_index
+
+            rebuild_suggest_index.delay()
+        return current or PrefixIndex([])
+    return PrefixIndex(entries)
+
+
+_index = Reloadable(_load, 'SUGGEST_INDEX_REFRESH', 300)
+
+
+def get_index():
+    """Return this process's prefix index, reloaded every SUGGEST_INDEX_REFRESH seconds"""
+    return _index.get()
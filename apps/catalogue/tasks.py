@@ -0,0 +1,8 @@
+from celery import shared_task
+
+
+@shared_task
+def rebuild_suggest_index():
+    from .suggest import rebuild
+
+    return rebuild()
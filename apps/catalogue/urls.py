@@ -1,11 +1,12 @@
 from django.urls import path
 from .views import (
-    SearchView, ArtistDetailView, AlbumDetailView,
+    SearchView, SuggestView, ArtistDetailView, AlbumDetailView,
     TrackDetailView, StreamTrackView, GenresView
 )
 
 urlpatterns = [
     path('search/', SearchView.as_view(), name='search'),
+    path('suggest/', SuggestView.as_view(), name='suggest'),
     path('genres/', GenresView.as_view(), name='genres'),
     path('artists/<int:artist_id>/', ArtistDetailView.as_view(), name='artist-detail'),
     path('albums/<int:album_id>/', AlbumDetailView.as_view(), name='album-detail'),
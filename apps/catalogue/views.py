@@ -1,5 +1,6 @@
 import requests
 from django.http import StreamingHttpResponse
+from django.utils.http import quote_etag
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -7,10 +8,27 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from apps.deezer.client import deezer_client
 from django.conf import settings
 from apps.accounts.models import PlaybackHistory
-from apps.catalogue.models import Artist
+from apps.catalogue.models import Artist, Album, Track
+from apps.catalogue.mirror import fresh_document
+from apps.catalogue import search as local_search
+from apps.catalogue import suggest
+from apps.core.etag import content_digest, combine_digests, not_modified, with_etag
+from apps.accounts.favorites import favorites_version, mark_favorites
 import uuid
 import logging
 
+logger = logging.getLogger(__name__)
+
+
+def _personal_etag(request, digest):
+    # Responses carry is_favorite flags, so the viewer's favourites are part of the entity
+    return quote_etag(combine_digests(digest, str(favorites_version(request.user.pk))))
+
+
+def _document_etag(request, *cache_keys):
+    digest = deezer_client.cached_etag(*cache_keys)
+    return _personal_etag(request, digest) if digest else None
+
 
 class SearchView(APIView):
     """
@@ -44,17 +62,65 @@ class SearchView(APIView):
         if not q:
             return Response({'error': 'Search query is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        artists = deezer_client.search_artists(q, limit=limit)
-        tracks = deezer_client.search_tracks(q, limit=limit)
-        albums = deezer_client.search_albums(q, limit=limit)
+        artists, tracks, albums = [], [], []
+        if getattr(settings, 'CATALOGUE_MIRROR_ENABLED', True):
+            # Answer from the mirrored catalogue and only go upstream for
+            # categories without a full page of local matches
+            artists = local_search.search_artists(q, limit=limit)
+            tracks = local_search.search_tracks(q, limit=limit)
+            albums = local_search.search_albums(q, limit=limit)
+
+        if len(artists) < limit:
+            artists = deezer_client.search_artists(q, limit=limit)
+        if len(tracks) < limit:
+            tracks = deezer_client.search_tracks(q, limit=limit)
+        if len(albums) < limit:
+            albums = deezer_client.search_albums(q, limit=limit)
 
         return Response({
             'artists': artists,
-            'tracks': tracks,
+            'tracks': mark_favorites(request, tracks),
             'albums': albums
         })
 
 
+class SuggestView(APIView):
+    """
+    API endpoint for typeahead suggestions while the user types a search.
+    Answered from an in-memory prefix index of popular tracks, artists and
+    albums; no database or Deezer call is made per keystroke.
+    ---
+    parameters:
+      - name: q
+        in: query
+        required: true
+        schema:
+          type: string
+        description: Prefix typed so far
+      - name: limit
+        in: query
+        schema:
+          type: integer
+          default: 8
+          maximum: 20
+        description: Maximum number of suggestions to return
+    responses:
+      200:
+        description: Suggestions ranked by popularity
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        q = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', 8))
+        except ValueError:
+            limit = 8
+        limit = max(limit, 1)
+
+        return Response({'suggestions': suggest.get_index().lookup(q, limit=limit)})
+
+
 class GenresView(APIView):
     """
     API endpoint to retrieve all available music genres from Deezer.
@@ -104,8 +170,8 @@ class ArtistDetailView(APIView):
                 # Not a valid UUID, continue with numeric ID
                 pass
                 
-            # Get the artist from Deezer API
-            artist = deezer_client.get_artist(artist_id)
+            # Serve the mirrored artist while it is fresh, otherwise fetch it from Deezer
+            artist = fresh_document(Artist, artist_id) or deezer_client.get_artist(artist_id)
             if not artist:
                 return Response({'error': 'Artist not found'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -117,11 +183,10 @@ class ArtistDetailView(APIView):
             return Response({
                 'artist': artist,
                 'albums': albums,
-                'top_tracks': top_tracks
+                'top_tracks': mark_favorites(request, top_tracks)
             })
         except Exception as e:
             import traceback
-            logger = logging.getLogger(__name__)
             logger.error(f"Artist detail error: {str(e)}\n{traceback.format_exc()}")
             return Response({'error': f'Error retrieving artist: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -146,18 +211,26 @@ class AlbumDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, album_id):
+        document_keys = (f"deezer:album:{album_id}", f"deezer:album_tracks:{album_id}")
+        etag = _document_etag(request, *document_keys)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+
         try:
-            album = deezer_client.get_album(album_id)
+            album = fresh_document(Album, album_id) or deezer_client.get_album(album_id)
             if not album:
                 return Response({'error': 'Album not found'}, status=status.HTTP_404_NOT_FOUND)
 
             # get_album_tracks already returns a list
             tracks = deezer_client.get_album_tracks(album_id)
 
-            return Response({
+            payload = {
                 'album': album,
-                'tracks': tracks
-            })
+                'tracks': mark_favorites(request, tracks)
+            }
+            etag = _document_etag(request, *document_keys) or _personal_etag(request, content_digest(payload))
+            return with_etag(Response(payload), etag)
         except Exception as e:
             logger.error(f"Album detail error: {str(e)}")
             return Response({'error': f'Error retrieving album: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -183,18 +256,27 @@ class TrackDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, track_id):
+        document_keys = (f"deezer:track:{track_id}", f"deezer:track_related:{track_id}:10")
+        etag = _document_etag(request, *document_keys)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+
         try:
-            track = deezer_client.get_track(track_id)
+            track = fresh_document(Track, track_id) or deezer_client.get_track(track_id)
             if not track:
                 return Response({'error': 'Track not found'}, status=status.HTTP_404_NOT_FOUND)
 
             # get_related_tracks already returns a list
             related_tracks = deezer_client.get_related_tracks(track_id)
 
-            return Response({
+            track = mark_favorites(request, [track])[0]
+            payload = {
                 'track': track,
-                'related_tracks': related_tracks
-            })
+                'related_tracks': mark_favorites(request, related_tracks)
+            }
+            etag = _document_etag(request, *document_keys) or _personal_etag(request, content_digest(payload))
+            return with_etag(Response(payload), etag)
         except Exception as e:
             logger.error(f"Track detail error: {str(e)}")
             return Response({'error': f'Error retrieving track: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
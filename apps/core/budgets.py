@@ -0,0 +1,165 @@
+"""
+Per-endpoint budgets for database queries, repeated queries, cache (Redis)
+operations, upstream Deezer calls and latency. routes() lists every DRF
+endpoint in the URLconf, Meter measures one request, and compare() checks
+the measurements against the checked-in budget file, rendering regressions
+as a readable table. See apps/core/tests.py for the harness that drives it.
+"""
+import json
+import re
+import time
+from collections import Counter
+from unittest import mock
+import requests
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver
+
+from apps.deezer.client import deezer_client
+
+METRICS = ('queries', 'duplicate_queries', 'redis_ops', 'upstream_calls', 'ms')
+
+CACHE_METHODS = (
+    'get', 'set', 'add', 'delete', 'touch', 'has_key', 'incr', 'decr',
+    'get_many', 'set_many', 'delete_many', 'get_or_set', 'clear',
+)
+
+# Latency is noisy, so its budget is a generous multiple of what was measured
+LATENCY_HEADROOM = 5
+MIN_LATENCY_BUDGET_MS = 250
+
+
+def routes(urlconf=None):
+    """{"METHOD url-name": path pattern} for every DRF view in the URLconf"""
+    found = {}
+
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns, prefix + str(pattern.pattern))
+                continue
+            view = getattr(pattern.callback, 'cls', None)
+            if view is None or not pattern.name:
+                continue
+            actions = getattr(pattern.callback, 'actions', None)
+            # DRF adds "head" to a viewset's actions once it has served a GET
+            methods = list(actions) if actions else [method for method in view.http_method_names if hasattr(view, method)]
+            for method in methods:
+                if method in ('head', 'options', 'trace'):
+                    continue
+                # Format-suffix variants share the name and come second
+                found.setdefault(f"{method.upper()} {pattern.name}", prefix + str(pattern.pattern))
+
+    walk(get_resolver(urlconf).url_patterns, '')
+    return found
+
+
+def shape(sql):
+    """The statement with its literals blanked out, so N+1 lookups count as repeats"""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    return re.sub(r'\b\d+(\.\d+)?\b', '?', sql)
+
+
+class Meter:
+    """Context manager counting what one request costs"""
+
+    def __init__(self, cache_alias='default'):
+        self.cache = caches[cache_alias]
+        self.result = {}
+
+    def __enter__(self):
+        self.redis_ops = 0
+        self.upstream_calls = 0
+        self._depth = 0
+        self._patches = [mock.patch.object(self.cache, name, self._counted(getattr(self.cache, name)))
+                         for name in CACHE_METHODS if hasattr(self.cache, name)]
+        # Deezer API calls, and preview audio proxied from Deezer's CDN
+        self._patches += [
+            mock.patch.object(deezer_client.session, 'get', self._upstream(deezer_client.session.get)),
+            mock.patch.object(requests, 'get', self._upstream(requests.get)),
+        ]
+        for patch in self._patches:
+            patch.start()
+        self._queries = CaptureQueriesContext(connection)
+        self._queries.__enter__()
+        self._started = time.perf_counter()
+        return self
+
+    def _upstream(self, get):
+        def wrapper(*args, **kwargs):
+            self.upstream_calls += 1
+            return get(*args, **kwargs)
+        return wrapper
+
+    def _counted(self, method):
+        def wrapper(*args, **kwargs):
+            # get_or_set and friends call other cache methods; count the outer call only
+            if self._depth == 0:
+                self.redis_ops += 1
+            self._depth += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._depth -= 1
+        return wrapper
+
+    def __exit__(self, *exc):
+        elapsed = (time.perf_counter() - self._started) * 1000
+        self._queries.__exit__(*exc)
+        for patch in reversed(self._patches):
+            patch.stop()
+        statements = Counter(shape(query['sql']) for query in self._queries.captured_queries)
+        self.result = {
+            'queries': len(self._queries.captured_queries),
+            'duplicate_queries': sum(count - 1 for count in statements.values()),
+            'redis_ops': self.redis_ops,
+            'upstream_calls': self.upstream_calls,
+            'ms': round(elapsed, 1),
+        }
+        self.repeated = [sql for sql, count in statements.most_common() if count > 1]
+        return False
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def budget_for(measured):
+    """A budget entry that allows exactly the measured counts"""
+    budget = {metric: measured[metric] for metric in METRICS if metric != 'ms'}
+    budget['ms'] = max(MIN_LATENCY_BUDGET_MS, int(measured['ms'] * LATENCY_HEADROOM))
+    return budget
+
+
+def write(path, measurements):
+    budgets = {key: budget_for(measured) for key, measured in sorted(measurements.items())}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(budgets, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(measurements, budgets):
+    """(endpoint, metric, budget, measured) for every metric over budget, and endpoints without one"""
+    rows = []
+    for key, measured in sorted(measurements.items()):
+        budget = budgets.get(key)
+        if budget is None:
+            rows.append((key, '-', 'missing', '-'))
+            continue
+        for metric in METRICS:
+            if metric in budget and measured[metric] > budget[metric]:
+                rows.append((key, metric, budget[metric], measured[metric]))
+    return rows
+
+
+def format_rows(rows):
+    header = ('endpoint', 'metric', 'budget', 'measured')
+    lines = [header] + [
+        (key, metric, str(budget), f"{measured} (+{round(measured - budget, 1)})"
+         if isinstance(budget, (int, float)) else str(measured))
+        for key, metric, budget, measured in rows
+    ]
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip() for line in lines)
@@ -0,0 +1,48 @@
+import json
+import hashlib
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def content_digest(data):
+    """Stable content hash of a JSON-serialisable document"""
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def combine_digests(*digests):
+    return hashlib.sha1(':'.join(digests).encode('utf-8')).hexdigest()
+
+
+def version_etag(prefix, pk, version, updated_at, variant=None):
+    """
+    Strong ETag for a row tracked by an updated_at timestamp and a change counter.
+    `variant` folds in per-viewer state rendered into the response.
+    """
+    stamp = int(updated_at.timestamp() * 1000000) if updated_at else 0
+    suffix = f"-{variant}" if variant is not None else ''
+    return quote_etag(f"{prefix}-{pk}-{version}-{stamp}{suffix}")
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header or not etag:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag in etags or f"W/{etag}" in etags
+
+
+def not_modified(request, etag):
+    """Return a bodiless 304 response if the client already holds this ETag, else None"""
+    if not etag_matches(request, etag):
+        return None
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    response['ETag'] = etag
+    return response
+
+
+def with_etag(response, etag):
+    if etag:
+        response['ETag'] = etag
+    return response
@@ -0,0 +1,38 @@
+"""
+Per-row membership flags (is_favorite, in_queue, ...) for serializers.
+Asking "is this row's track in the user's X?" once per row costs a query per
+row; MembershipField asks once per serializer context instead, and every row
+of the page is checked against the same set.
+"""
+from rest_framework import serializers
+
+
+def members(context, key, resolver):
+    """The set resolver(request) returns, resolved once and kept in the serializer context under key"""
+    found = context.get(key)
+    if found is None:
+        found = frozenset(str(member) for member in resolver(context.get('request')))
+        context[key] = found
+    return found
+
+
+class MembershipField(serializers.ReadOnlyField):
+    """
+    Boolean flag for whether the row's `source` value is in the set
+    resolver(request) returns. A view that already holds the set can put it
+    in the serializer context under `key` and skip the resolver.
+    """
+
+    def __init__(self, resolver, key=None, **kwargs):
+        kwargs.setdefault('source', 'track_id')
+        self.resolver = resolver
+        self.key = key
+        super().__init__(**kwargs)
+
+    def bind(self, field_name, parent):
+        super().bind(field_name, parent)
+        if self.key is None:
+            self.key = f'{field_name}_members'
+
+    def to_representation(self, value):
+        return str(value) in members(self.context, self.key, self.resolver)
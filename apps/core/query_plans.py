@@ -0,0 +1,43 @@
+"""
+Query-plan checks for the hot read paths. plan_problems() runs EXPLAIN on a
+queryset and reports steps that read a table without an index or sort rows
+an index should have returned in order. Postgres and SQLite plans are both
+understood, so the regression tests run on either backend.
+"""
+import re
+from django.db import connection
+
+# Postgres may sort rows that an index range already narrowed down to about a
+# page, which is cheap; only sorts estimated above this many rows are reported
+SMALL_SORT = 100
+
+
+def explain(queryset):
+    return queryset.explain()
+
+
+def analyze(*models):
+    """Refresh planner statistics after seeding, as autovacuum would in production"""
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+
+def plan_problems(queryset, allow_sort=False):
+    """Lines of the plan for queryset that scan a table sequentially or, unless allow_sort, sort more than SMALL_SORT rows"""
+    plan = explain(queryset)
+    problems = []
+    for line in plan.splitlines():
+        step = line.strip().lstrip('->').strip()
+        if connection.vendor == 'postgresql':
+            scan = step.startswith('Seq Scan')
+            sort = re.match(r'(Incremental )?Sort\s+\(.*rows=(\d+)', step)
+            sort = sort and int(sort.group(2)) > SMALL_SORT
+        else:
+            # SQLite: "SCAN table" without an index, "USE TEMP B-TREE FOR ORDER BY"
+            step = re.sub(r'^\d+ \d+ \d+ ', '', step)
+            scan = step.startswith('SCAN ') and 'USING' not in step
+            sort = 'TEMP B-TREE' in step
+        if scan or (sort and not allow_sort):
+            problems.append(step)
+    return problems
@@ -0,0 +1,47 @@
+"""
+Per-process copies of data built elsewhere (the suggest index, the
+recommender model, the embedding index). The first use loads the data
+inline; once it is older than its refresh setting, the stale copy keeps
+serving while a daemon thread loads the new one.
+"""
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+
+
+class Reloadable:
+    """
+    Holds loader(current)'s result. The loader gets the value it would
+    replace, so it can return it unchanged when nothing newer is published.
+    """
+
+    def __init__(self, loader, refresh_setting, default_refresh=300):
+        self.loader = loader
+        self.refresh_setting = refresh_setting
+        self.default_refresh = default_refresh
+        self.value = None
+        self.loaded_at = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Swap in the fully loaded value with a single assignment
+        self.value = self.loader(self.value)
+        self.loaded_at = time.monotonic()
+
+    def _background_load(self):
+        try:
+            self._load()
+        finally:
+            connection.close()
+            self._lock.release()
+
+    def get(self):
+        if self.loaded_at == 0:
+            with self._lock:
+                if self.loaded_at == 0:
+                    self._load()
+        elif time.monotonic() - self.loaded_at > getattr(settings, self.refresh_setting, self.default_refresh):
+            if self._lock.acquire(blocking=False):
+                threading.Thread(target=self._background_load, daemon=True).start()
+        return self.value
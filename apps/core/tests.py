@@ -1,3 +1,293 @@
-from django.test import TestCase
+import io
+import os
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from apps.accounts.models import Favorite, PlaybackHistory
+from apps.deezer.client import deezer_client
+from apps.playlists.models import GenerationJob, Playlist, PlaylistTrack, Queue, QueueTrack
+from apps.playlists.ordering import spaced_positions
+from . import budgets
+
+User = get_user_model()
+
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), 'endpoint_budgets.json')
+PASSWORD = 'budget-pass-123'
+
+# A 1x1 transparent GIF
+GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00'
+    b'\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+# Documentation renderers, not product endpoints
+EXCLUDED = {'GET schema-swagger-ui', 'GET schema-redoc'}
+
+
+def fake_track(i):
+    return {
+        'id': i, 'title': f'Track {i}', 'duration': 200, 'rank': 100000 - i,
+        'preview': f'https://cdn.example.com/{i}.mp3', 'track_position': i,
+        'artist': {'id': i % 7 + 1, 'name': f'Artist {i % 7 + 1}', 'picture_medium': 'https://img.example.com/a'},
+        'album': {'id': i % 5 + 1, 'title': f'Album {i % 5 + 1}', 'cover_medium': 'https://img.example.com/c',
+                  'release_date': '2020-01-01'},
+        'genre': {'id': 132, 'name': 'Pop'},
+    }
+
+
+class FakeResponse:
+    def __init__(self, data=None, body=b''):
+        self.data = data
+        self.status_code = 200
+        self.headers = {'Content-Type': 'audio/mpeg', 'Content-Length': str(len(body))}
+        self.raw = io.BytesIO(body)
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+def fake_preview(url, **kwargs):
+    return FakeResponse(body=b'\xff\xfb' * 512)
+
+
+def fake_deezer(url, params=None, timeout=None):
+    """Deterministic stand-in for api.deezer.com, shaped like its responses"""
+    parts = url.split('://', 1)[-1].split('/', 1)[-1].split('/')
+    kind, rest = parts[0], parts[1:]
+    if kind == 'track' and len(rest) == 1:
+        return FakeResponse(fake_track(int(rest[0])))
+    if kind == 'album' and len(rest) == 1:
+        return FakeResponse({
+            'id': int(rest[0]), 'title': f'Album {rest[0]}', 'cover_medium': 'https://img.example.com/c',
+            'release_date': '2020-01-01', 'artist': {'id': 1, 'name': 'Artist 1'},
+            'genres': {'data': [{'id': 132, 'name': 'Pop'}]},
+            'tracks': {'data': [fake_track(i) for i in range(1, 11)]},
+        })
+    if kind == 'artist' and len(rest) == 1:
+        return FakeResponse({'id': int(rest[0]), 'name': f'Artist {rest[0]}', 'picture_medium': 'https://img.example.com/a'})
+    if kind == 'genre' and not rest:
+        return FakeResponse({'data': [{'id': 132, 'name': 'Pop'}, {'id': 152, 'name': 'Rock'}]})
+    if kind == 'genre' and len(rest) == 1:
+        return FakeResponse({'id': int(rest[0]), 'name': 'Pop'})
+    if kind == 'artist' and rest[-1] == 'related':
+        return FakeResponse({'data': [{'id': i, 'name': f'Artist {i}'} for i in range(8, 11)]})
+    if kind == 'chart' and rest and rest[-1] == 'albums':
+        return FakeResponse({'data': [fake_track(i)['album'] for i in range(1, 11)]})
+    return FakeResponse({'data': [fake_track(i) for i in range(100, 130)]})
+
+
+# "METHOD url-name" -> how to call it. Values may be callables taking the test case.
+SCENARIOS = {
+    'POST token_obtain_pair': {'anonymous': True, 'data': lambda t: {'email': t.user.email, 'password': PASSWORD}},
+    'POST token_refresh': {'anonymous': True, 'data': lambda t: {'refresh': str(RefreshToken.for_user(t.user))}},
+    'POST register': {'anonymous': True, 'data': {
+        'email': 'new@example.com', 'username': 'newcomer', 'password': PASSWORD, 'password_confirm': PASSWORD,
+    }},
+    'GET me': {},
+    'PUT me_update': {'data': {'username': 'renamed', 'bio': 'Listening a lot'}},
+    'PATCH me_update': {'data': {'bio': 'Listening a lot'}},
+    'POST me_avatar': {'format': 'multipart', 'data': lambda t: {
+        'avatar': SimpleUploadedFile('avatar.gif', GIF, content_type='image/gif'),
+    }},
+    'GET user_public': {'kwargs': lambda t: {'pk': t.other.pk}},
+    'GET history_all': {},
+    'GET export': {'kwargs': {'kind': 'history', 'fmt': 'ndjson'}},
+    'GET favorite-list': {},
+    'POST favorite-add': {'data': {'track_id': '40'}},
+    'POST favorite-remove': {'data': {'track_id': '1'}},
+    'GET playback-history-list': {},
+    'GET playback-history-detail': {'kwargs': lambda t: {'pk': t.history[0].pk}},
+    'GET api-root': {},
+    'GET search': {'query': {'q': 'track'}},
+    'GET suggest': {'query': {'q': 'tr'}},
+    'GET genres': {},
+    'GET artist-detail': {'kwargs': {'artist_id': 1}},
+    'GET album-detail': {'kwargs': {'album_id': 1}},
+    'GET track-detail': {'kwargs': {'track_id': 1}},
+    'GET stream-track': {'kwargs': {'track_id': 1}},
+    'GET playlist-list': {},
+    'POST playlist-list': {'data': {'name': 'New playlist'}},
+    'GET playlist-detail': {'kwargs': lambda t: {'pk': t.playlist.pk}},
+    'PUT playlist-detail': {'kwargs': lambda t: {'pk': t.playlist.pk},
+                            'data': {'name': 'Renamed', 'description': '', 'is_public': True}},
+    'PATCH playlist-detail': {'kwargs': lambda t: {'pk': t.playlist.pk}, 'data': {'name': 'Renamed'}},
+    'DELETE playlist-detail': {'kwargs': lambda t: {'pk': t.playlist.pk}},
+    'GET playlist-tracks': {'kwargs': lambda t: {'pk': t.playlist.pk}},
+    'POST playlist-add-track': {'kwargs': lambda t: {'pk': t.playlist.pk}, 'data': {'track_id': 40}},
+    'POST playlist-add-tracks': {'kwargs': lambda t: {'pk': t.playlist.pk},
+                                 'data': {'tracks': list(range(35, 55))}},
+    'DELETE playlist-remove-track': {'kwargs': lambda t: {'pk': t.playlist.pk}, 'query': {'track_id': '3'}},
+    'POST playlist-move': {'kwargs': lambda t: {'pk': t.playlist.pk}, 'data': {'track_id': '5', 'after': '10'}},
+    'POST playlist-reorder': {'kwargs': lambda t: {'pk': t.playlist.pk}, 'data': {'moves': [
+        {'track_id': '5', 'after': '10'}, {'track_id': '20', 'before': '1'}, {'track_id': '7', 'after': '30'},
+    ]}},
+    'POST playlist-play': {'kwargs': lambda t: {'pk': t.playlist.pk}, 'data': {'position': 3}},
+    'GET playlist-changes': {'kwargs': lambda t: {'pk': t.playlist.pk}, 'query': {'since': 0}},
+    'POST playlist-duplicate': {'kwargs': lambda t: {'pk': t.public.pk}},
+    'GET playlist-recommendations': {},
+    'POST playlist-play-recommendation': {'data': {'track_id': '100'}},
+    'POST playlist-generate': {'data': {'genre_id': 132}},
+    'GET playlist-generate-job': {'kwargs': lambda t: {'job_id': t.job.pk}},
+    'GET queue-list': {},
+    'POST queue-next': {},
+    'GET queue-tracks': {},
+    'POST queue-enqueue': {'data': {'track_id': 40}},
+    'POST queue-previous': {},
+    'POST queue-clear': {},
+    'GET queue-current': {},
+    'POST queue-position': {'data': {'position': 10}},
+    'POST queue-shuffle': {},
+    'POST queue-unshuffle': {},
+    'POST queue-move': {'data': {'track_id': '5', 'before': '1'}},
+    'POST queue-reorder': {'data': {'moves': [{'track_id': '5', 'before': '1'}, {'track_id': '12', 'after': '20'}]}},
+    'POST queue-stream': {'data': {'track_id': 7}},
+    'GET queue-history': {},
+    'GET top-charts': {},
+    'GET top-albums': {},
+    'GET new-releases': {},
+}
+
+
+def _value(value, test):
+    return value(test) if callable(value) else value
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'budgets',
+                         'KEY_PREFIX': 'playpod'}},
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+    QUEUE_BACKEND='database',
+)
+class EndpointBudgetTests(TestCase):
+    """
+    Every DRF route is called against seeded data and a fake Deezer, and its
+    queries, repeated queries, cache operations, upstream calls and latency
+    are checked against endpoint_budgets.json. After an intended change,
+    rewrite the file with UPDATE_BUDGETS=1 and review the diff.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='listener', email='listener@example.com', password=PASSWORD)
+        cls.other = User.objects.create_user(username='curator', email='curator@example.com', password=PASSWORD)
+        tracks = [fake_track(i) for i in range(1, 31)]
+
+        cls.playlist = Playlist.objects.create(user=cls.user, name='Mix')
+        rows = PlaylistTrack.objects.bulk_create(
+            PlaylistTrack(playlist=cls.playlist, position=position, **cls.columns(track))
+            for track, position in zip(tracks, spaced_positions(len(tracks)))
+        )
+        cls.playlist.bump_version(added=rows)
+        cls.job = GenerationJob.objects.create(user=cls.user, status=GenerationJob.SUCCEEDED, playlist=cls.playlist)
+        for n in range(3):
+            cls.public = public = Playlist.objects.create(user=cls.other, name=f'Public {n}', is_public=True)
+            public.bump_version(added=PlaylistTrack.objects.bulk_create(
+                PlaylistTrack(playlist=public, position=position, **cls.columns(track))
+                for track, position in zip(tracks[:10], spaced_positions(10))
+            ))
+
+        queue = Queue.objects.create(user=cls.user, current_track_id='5', current_position=4)
+        QueueTrack.objects.bulk_create(
+            QueueTrack(queue=queue, position=position, **cls.columns(track))
+            for track, position in zip(tracks[:20], spaced_positions(20))
+        )
+        Favorite.objects.bulk_create(Favorite(user=cls.user, **cls.columns(track)) for track in tracks[:10])
+        cls.history = PlaybackHistory.objects.bulk_create(
+            PlaybackHistory(user=cls.user, position=i, **{k: v for k, v in cls.columns(track).items() if k != 'duration'})
+            for i, track in enumerate(tracks)
+        )
+
+    @staticmethod
+    def columns(track):
+        return {
+            'track_id': str(track['id']),
+            'artist_id': str(track['artist']['id']),
+            'track_title': track['title'],
+            'artist_name': track['artist']['name'],
+            'album_title': track['album']['title'],
+            'album_cover': track['album']['cover_medium'],
+            'duration': track['duration'],
+        }
+
+    def setUp(self):
+        self.access = str(RefreshToken.for_user(self.user).access_token)
+        patches = [
+            mock.patch.object(deezer_client.session, 'get', fake_deezer),
+            mock.patch('requests.get', fake_preview),
+            # Background work is queued, not run, so it does not count against the request
+            mock.patch('celery.app.task.Task.apply_async'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def request(self, key):
+        scenario = SCENARIOS[key]
+        method, name = key.split(' ', 1)
+        path = reverse(name, kwargs=_value(scenario.get('kwargs', {}), self))
+
+        client = APIClient()
+        if not scenario.get('anonymous'):
+            # A real token, so loading the user is measured as in production
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        data = _value(scenario.get('data'), self)
+        query = _value(scenario.get('query'), self)
+        if query:
+            path += '?' + '&'.join(f'{name}={value}' for name, value in query.items())
+        call = getattr(client, method.lower())
+        fmt = scenario.get('format', 'json')
+        return call(path, data, format=fmt) if data is not None else call(path)
+
+    def measure(self, key):
+        cache.clear()
+        with transaction.atomic():
+            with budgets.Meter() as meter:
+                response = self.request(key)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            # Every scenario starts from the same seed
+            transaction.set_rollback(True)
+        return response, meter
+
+    def test_every_route_has_a_scenario(self):
+        missing = sorted(set(budgets.routes()) - set(SCENARIOS) - EXCLUDED)
+        self.assertEqual(missing, [], "Add a scenario (and a budget) for these endpoints")
+
+    def test_budgets(self):
+        measurements, failures, repeated = {}, [], {}
+        for key in sorted(budgets.routes()):
+            if key in EXCLUDED or key not in SCENARIOS:
+                continue
+            response, meter = self.measure(key)
+            if response.status_code >= 400:
+                failures.append(f"{key}: {response.status_code} {getattr(response, 'data', '')}")
+            measurements[key] = meter.result
+            if meter.repeated:
+                repeated[key] = meter.repeated[0]
+        self.assertEqual(failures, [], "Scenarios must exercise the endpoint successfully")
+
+        if os.environ.get('UPDATE_BUDGETS'):
+            budgets.write(BUDGET_FILE, measurements)
+            return
+        rows = budgets.compare(measurements, budgets.load(BUDGET_FILE))
+        if rows:
+            details = '\n'.join(f"  {key}: {sql[:200]}" for key, sql in repeated.items()
+                                if any(row[0] == key for row in rows))
+            self.fail(
+                "Endpoints over budget (rerun with UPDATE_BUDGETS=1 if the change is intended):\n"
+                + budgets.format_rows(rows)
+                + (f"\nMost repeated query per endpoint:\n{details}" if details else '')
+            )
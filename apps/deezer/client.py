@@ -1,12 +1,33 @@
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from django.db import connection
 from django.core.cache import cache
 import logging
-import random
+from apps.core.etag import content_digest, combine_digests
 
 logger = logging.getLogger(__name__)
 
 
+def _detail(kind):
+    """Mirror a single full Deezer document"""
+    return lambda data: {kind: [data], 'complete': True}
+
+
+def _listed(kind):
+    """Mirror the items of a Deezer list response"""
+    return lambda data: {kind: data.get('data', []) if isinstance(data, dict) else []}
+
+
+def _has_album(track):
+    """
+    Whether a mirrored track document can fill the album columns. Tracks
+    mirrored from an album's track list only carry the album id.
+    """
+    album = track.get('album') or {}
+    return bool(album.get('title') and (album.get('cover_medium') or album.get('cover')))
+
+
 class DeezerClient:
     BASE_URL = 'https://api.deezer.com'
 
@@ -14,8 +35,12 @@ class DeezerClient:
         self.base_url = settings.DEEZER_BASE_URL or self.BASE_URL
         self.session = requests.Session()
 
-    def _make_request(self, endpoint, params=None, cache_key=None, cache_time=3600):
-        """Make a request to the Deezer API with caching support"""
+    def _make_request(self, endpoint, params=None, cache_key=None, cache_time=3600, mirror=None):
+        """
+        Make a request to the Deezer API with caching support.
+        `mirror` maps a freshly fetched payload to mirror_documents() arguments,
+        so only upstream responses (never cache hits) are written to the catalogue.
+        """
         if cache_key:
             cached_response = cache.get(cache_key)
             if cached_response:
@@ -49,7 +74,10 @@ class DeezerClient:
                 logger.info(f"Received non-dictionary response from {url}: {type(data)}")
 
             if cache_key and data:
-                cache.set(cache_key, data, cache_time)
+                cache.set_many({cache_key: data, self._etag_key(cache_key): content_digest(data)}, cache_time)
+
+            if mirror and data:
+                self._mirror(mirror(data))
 
             return data
         except requests.RequestException as e:
@@ -59,55 +87,79 @@ class DeezerClient:
             logger.error(f"Unexpected error accessing Deezer API {url}: {str(e)}")
             return None
 
+    def _mirror(self, documents):
+        """Write fetched payloads through to the local catalogue without failing the read"""
+        if not getattr(settings, 'CATALOGUE_MIRROR_ENABLED', True):
+            return
+        try:
+            from apps.catalogue.mirror import mirror_documents
+            mirror_documents(**documents)
+        except Exception as e:
+            logger.warning(f"Failed to mirror Deezer payload into the catalogue: {str(e)}")
+
+    def _etag_key(self, cache_key):
+        return f"{cache_key}:etag"
+
+    def cached_etag(self, *cache_keys):
+        """Combined content hash of cached documents, or None if any of them is not cached"""
+        etag_keys = [self._etag_key(key) for key in cache_keys]
+        digests = cache.get_many(etag_keys)
+        if len(digests) != len(etag_keys):
+            return None
+        return combine_digests(*(digests[key] for key in etag_keys))
+
     def search_artists(self, query, limit=20, offset=0):
         """Search for artists by query string"""
         params = {'q': query, 'limit': limit, 'index': offset}
         cache_key = f"deezer:artist_search:{query}:{limit}:{offset}"
-        response = self._make_request('search/artist', params, cache_key)
+        response = self._make_request('search/artist', params, cache_key, mirror=_listed('artists'))
         return response.get('data', []) if response else []
 
     def search_tracks(self, query, limit=20, offset=0):
         """Search for tracks by query string"""
         params = {'q': query, 'limit': limit, 'index': offset}
         cache_key = f"deezer:track_search:{query}:{limit}:{offset}"
-        response = self._make_request('search/track', params, cache_key)
+        response = self._make_request('search/track', params, cache_key, mirror=_listed('tracks'))
         return response.get('data', []) if response else []
 
     def search_albums(self, query, limit=20, offset=0):
         """Search for albums by query string"""
         params = {'q': query, 'limit': limit, 'index': offset}
         cache_key = f"deezer:album_search:{query}:{limit}:{offset}"
-        response = self._make_request('search/album', params, cache_key)
+        response = self._make_request('search/album', params, cache_key, mirror=_listed('albums'))
         return response.get('data', []) if response else []
 
     def get_artist(self, artist_id):
         """Get information about a specific artist"""
         cache_key = f"deezer:artist:{artist_id}"
-        return self._make_request(f"artist/{artist_id}", cache_key=cache_key)
+        return self._make_request(f"artist/{artist_id}", cache_key=cache_key, mirror=_detail('artists'))
 
     def get_artist_albums(self, artist_id, limit=20, offset=0):
         """Get albums for a specific artist"""
         params = {'limit': limit, 'index': offset}
         cache_key = f"deezer:artist_albums:{artist_id}:{limit}:{offset}"
-        response = self._make_request(f"artist/{artist_id}/albums", params, cache_key)
+        # Artist album listings omit the artist, so attach it for the mirror
+        mirror = lambda data: {'albums': [dict(album, artist={'id': artist_id}) for album in data.get('data', [])]}
+        response = self._make_request(f"artist/{artist_id}/albums", params, cache_key, mirror=mirror)
         return response.get('data', []) if isinstance(response, dict) else []
 
     def get_artist_top_tracks(self, artist_id, limit=20):
         """Get top tracks for a specific artist"""
         params = {'limit': limit}
         cache_key = f"deezer:artist_top:{artist_id}:{limit}"
-        response = self._make_request(f"artist/{artist_id}/top", params, cache_key)
+        response = self._make_request(f"artist/{artist_id}/top", params, cache_key, mirror=_listed('tracks'))
         return response.get('data', []) if isinstance(response, dict) else []
 
     def get_album(self, album_id):
         """Get information about a specific album"""
         cache_key = f"deezer:album:{album_id}"
-        return self._make_request(f"album/{album_id}", cache_key=cache_key)
+        return self._make_request(f"album/{album_id}", cache_key=cache_key, mirror=_detail('albums'))
 
     def get_album_tracks(self, album_id):
         """Get tracks for a specific album"""
         cache_key = f"deezer:album_tracks:{album_id}"
-        response = self._make_request(f"album/{album_id}/tracks", cache_key=cache_key)
+        mirror = lambda data: {'tracks': [dict(track, album=track.get('album') or {'id': album_id}) for track in data.get('data', [])]}
+        response = self._make_request(f"album/{album_id}/tracks", cache_key=cache_key, mirror=mirror)
         return response.get('data', []) if response else []
 
     def get_track(self, track_id, skip_cache=False):
@@ -116,15 +168,53 @@ class DeezerClient:
         
         # Skip cache if requested
         if skip_cache:
-            return self._make_request(f"track/{track_id}")
+            return self._make_request(f"track/{track_id}", mirror=_detail('tracks'))
             
-        return self._make_request(f"track/{track_id}", cache_key=cache_key)
+        return self._make_request(f"track/{track_id}", cache_key=cache_key, mirror=_detail('tracks'))
+
+    def get_tracks(self, track_ids, use_mirror=True, fetch_missing=True):
+        """
+        Hydrate many tracks at once: one cache round trip, then one catalogue
+        mirror query, then concurrent Deezer requests for whatever is left.
+        Returns a dict of track id -> document; unknown tracks are omitted.
+        With fetch_missing=False Deezer is never called and tracks found in
+        neither the cache nor the mirror are omitted too. Mirrored documents
+        without the album's title and cover count as not found.
+        """
+        track_ids = [str(track_id) for track_id in dict.fromkeys(track_ids)]
+        cache_keys = {f"deezer:track:{track_id}": track_id for track_id in track_ids}
+        found = {cache_keys[key]: data for key, data in cache.get_many(list(cache_keys)).items() if data}
+
+        missing = [track_id for track_id in track_ids if track_id not in found]
+        if missing and use_mirror:
+            from apps.catalogue.mirror import stored_documents
+            from apps.catalogue.models import Track
+            found.update(
+                (track_id, data) for track_id, data in stored_documents(Track, missing).items() if _has_album(data)
+            )
+            missing = [track_id for track_id in track_ids if track_id not in found]
+
+        if missing and fetch_missing:
+            def fetch(track_id):
+                try:
+                    return track_id, self._make_request(f"track/{track_id}", cache_key=f"deezer:track:{track_id}")
+                finally:
+                    connection.close()
+
+            workers = getattr(settings, 'DEEZER_MAX_CONCURRENCY', 8)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                fetched = {track_id: data for track_id, data in pool.map(fetch, missing) if data}
+            if fetched:
+                self._mirror({'tracks': list(fetched.values()), 'complete': True})
+            found.update(fetched)
+
+        return found
 
     def get_related_tracks(self, track_id, limit=10):
         """Get tracks related to a specific track"""
         params = {'limit': limit}
         cache_key = f"deezer:track_related:{track_id}:{limit}"
-        response = self._make_request(f"track/{track_id}/related", params, cache_key)
+        response = self._make_request(f"track/{track_id}/related", params, cache_key, mirror=_listed('tracks'))
         return response.get('data', []) if response else []
         
     def get_track_recommendations(self, track_id, limit=20):
@@ -150,7 +240,7 @@ class DeezerClient:
             
         params = {'limit': limit}
         cache_key = f"deezer:genre_tracks:{genre_id}:{limit}"
-        response = self._make_request(f"genre/{genre_id}/tracks", params, cache_key)
+        response = self._make_request(f"genre/{genre_id}/tracks", params, cache_key, mirror=_listed('tracks'))
         return response.get('data', []) if response else []
         
     def get_genre_tracks_by_id(self, genre_id, limit=30):
@@ -167,7 +257,7 @@ class DeezerClient:
             params = {'limit': limit}
             cache_key = f"deezer:genre_tracks:{genre_id}:{limit}"
             
-            response = self._make_request(f"genre/{genre_id}/tracks", params, cache_key)
+            response = self._make_request(f"genre/{genre_id}/tracks", params, cache_key, mirror=_listed('tracks'))
             
             if not response or not response.get('data'):
                 genre_info = self.get_genre(genre_id)
@@ -195,7 +285,7 @@ class DeezerClient:
         return 132
 
     def get_artist_genres(self, artist_id):
-        """Get genres associated with an artist"""
+        """Genres of an artist's first albums; [] when Deezer lists none"""
         artist = self.get_artist(artist_id)
         if not artist:
             return []
@@ -210,40 +300,36 @@ class DeezerClient:
                 for genre in album_genres:
                     genres.append(genre.get('name'))
                     
-        if not genres:
-            common_genres = ["pop", "rock", "hip hop", "electronic", "jazz", "r&b", "classical"]
-            return [random.choice(common_genres)]
-            
-        return list(set(genres))
+        return sorted({genre for genre in genres if genre})
 
     def get_top_charts(self, limit=50):
         """Get the top charting tracks from Deezer"""
         params = {'limit': limit}
         cache_key = f"deezer:top_charts:{limit}"
-        response = self._make_request("chart/0/tracks", params, cache_key, cache_time=7200)
+        response = self._make_request("chart/0/tracks", params, cache_key, cache_time=7200, mirror=_listed('tracks'))
         return response.get('data', []) if response else []
         
     def get_top_albums(self, limit=25):
         """Get the top albums from Deezer"""
         params = {'limit': limit}
         cache_key = f"deezer:top_albums:{limit}"
-        response = self._make_request("chart/0/albums", params, cache_key, cache_time=7200)
+        response = self._make_request("chart/0/albums", params, cache_key, cache_time=7200, mirror=_listed('albums'))
         return response.get('data', []) if response else []
         
     def get_new_releases(self, limit=50):
         """Get new album releases from Deezer"""
         params = {'limit': limit}
         cache_key = f"deezer:new_releases:{limit}"
-        response = self._make_request("editorial/0/releases", params, cache_key, cache_time=7200)
+        response = self._make_request("editorial/0/releases", params, cache_key, cache_time=7200, mirror=_listed('albums'))
         return response.get('data', []) if response else []
 
     def clear_cache_for_track(self, track_id):
         """Clear cache for a specific track"""
         cache_key = f"deezer:track:{track_id}"
-        cache.delete(cache_key)
+        related_key = f"deezer:track_related:{track_id}:10"
         
-        # Also clear related cache entries
-        cache.delete(f"deezer:track_related:{track_id}:10")
+        # Also clear related cache entries and their content hashes
+        cache.delete_many([cache_key, self._etag_key(cache_key), related_key, self._etag_key(related_key)])
         return True
 
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Playlist, PlaylistTrack, Queue, QueueTrack
+from .models import Playlist, PlaylistTrack, Queue, QueueTrack, GenerationJob
 
 
 class PlaylistTrackInline(admin.TabularInline):
@@ -19,7 +19,8 @@ class PlaylistAdmin(admin.ModelAdmin):
     list_display = ['id', 'name', 'user', 'is_public', 'track_count', 'created_at', 'updated_at']
     list_filter = ['is_public', 'created_at', 'updated_at']
     search_fields = ['name', 'description', 'user__username']
-    readonly_fields = ['id', 'created_at', 'updated_at']
+    # Kept by the API; run reconcile_playlist_counters after editing tracks here
+    readonly_fields = ['id', 'track_count', 'total_duration', 'cover_mosaic', 'created_at', 'updated_at']
     inlines = [PlaylistTrackInline]
 
 
@@ -28,4 +29,11 @@ class QueueAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'current_track_id', 'updated_at']
     search_fields = ['user__username', 'current_track_id']
     readonly_fields = ['id', 'updated_at']
-    inlines = [QueueTrackInline]
\ No newline at end of file
+    inlines = [QueueTrackInline]
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'status', 'playlist', 'created_at', 'updated_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['user__username']
+    readonly_fields = ['id', 'created_at', 'updated_at']
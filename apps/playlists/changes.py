@@ -0,0 +1,81 @@
+"""
+Per-playlist change log for clients that keep a local copy. Every version
+bump that adds, removes or moves tracks logs one row per operation, and
+GET /playlists/<id>/changes/?since=<version> replays the operations after
+that version. Moves are logged relative to an anchor track, not as
+positions, so a rebalance never invalidates the log. When the log cannot
+answer (it was compacted, or one change was too large to be worth logging),
+Playlist.log_floor is raised and older clients are told to resync.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Playlist, PlaylistChange
+from .utils import TRACK_COLUMNS
+
+
+def _inserted(row):
+    data = {column: getattr(row, column) for column in TRACK_COLUMNS}
+    data.update(id=str(row.id), position=row.position, added_at=row.added_at.isoformat() if row.added_at else None)
+    return data
+
+
+def record(playlist, added=(), removed=(), moved=()):
+    """Log the operations of the version bump just written for playlist"""
+    if not (added or removed or moved):
+        return
+    version = Playlist.objects.filter(pk=playlist.pk).values_list('version', flat=True).get()
+    if len(added) + len(removed) + len(moved) > getattr(settings, 'PLAYLIST_CHANGE_LOG_MAX_OPS', 500):
+        # A full download is cheaper than replaying this many operations
+        Playlist.objects.filter(pk=playlist.pk).update(log_floor=version)
+        playlist.log_floor = version
+        return
+    entries = [
+        PlaylistChange(playlist=playlist, version=version, op=PlaylistChange.REMOVE, track_id=row.track_id)
+        for row in removed
+    ]
+    entries += [
+        PlaylistChange(playlist=playlist, version=version, op=PlaylistChange.INSERT,
+                       track_id=row.track_id, data=_inserted(row))
+        for row in added
+    ]
+    entries += [
+        PlaylistChange(playlist=playlist, version=version, op=PlaylistChange.MOVE, track_id=move['track_id'],
+                       data={key: move[key] for key in ('before', 'after') if key in move})
+        for move in moved
+    ]
+    PlaylistChange.objects.bulk_create(entries)
+
+
+def changes_since(playlist, since):
+    """The logged operations after version since, oldest first, or None when the client must resync"""
+    if since < playlist.log_floor or since > playlist.version:
+        return None
+    entries = PlaylistChange.objects.filter(playlist=playlist, version__gt=since).order_by('id')
+    changes = []
+    for entry in entries:
+        change = {'version': entry.version, 'op': entry.op}
+        if entry.op == PlaylistChange.INSERT:
+            change['track'] = entry.data
+        else:
+            change['track_id'] = entry.track_id
+            change.update(entry.data)
+        changes.append(change)
+    return changes
+
+
+def compact(older_than=None):
+    """
+    Drop log entries older than PLAYLIST_CHANGE_LOG_TTL seconds, raising each
+    playlist's log_floor past them. Returns the number of entries dropped.
+    """
+    if older_than is None:
+        older_than = timezone.now() - timedelta(seconds=getattr(settings, 'PLAYLIST_CHANGE_LOG_TTL', 60 * 60 * 24 * 30))
+    stale = PlaylistChange.objects.filter(created_at__lt=older_than)
+    floors = stale.values('playlist_id').annotate(floor=Max('version')).order_by()
+    for row in floors.iterator():
+        Playlist.objects.filter(pk=row['playlist_id'], log_floor__lt=row['floor']).update(log_floor=row['floor'])
+    deleted, _ = stale.delete()
+    return deleted
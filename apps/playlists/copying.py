@@ -0,0 +1,86 @@
+"""
+Set-based copies of track rows into a playlist or queue. copy_tracks issues
+one INSERT INTO ... SELECT, so the rows never pass through Python: the new
+ids, respaced positions and added_at are computed by the database.
+"""
+from django.db import connection
+from django.db.models import F, Max, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .ordering import POSITION_GAP, spaced_positions
+from .utils import TRACK_COLUMNS
+
+# A new primary key, in the form each backend stores a UUIDField
+UUID_SQL = {
+    'postgresql': 'gen_random_uuid()',
+    'sqlite': 'lower(hex(randomblob(16)))',
+}
+
+FALLBACK_BATCH = 1000
+
+
+def _parent_field(model):
+    return model._meta.get_field('playlist' if model._meta.model_name == 'playlisttrack' else 'queue')
+
+
+def copy_tracks(source, model, parent, offset=0):
+    """
+    Append the rows of source (a PlaylistTrack or QueueTrack queryset), in
+    position order and from the offset-th on, to parent's model rows, spaced
+    POSITION_GAP apart. The caller holds the parent lock. Returns the number
+    of rows copied.
+    """
+    parent_field = _parent_field(model)
+    last = model.objects.filter(**{parent_field.name: parent}).aggregate(last=Max('position'))['last'] or 0
+    uuid_sql = UUID_SQL.get(connection.vendor)
+    if uuid_sql is None:
+        return _copy_in_batches(source, model, parent_field, parent, offset, last)
+
+    numbered = (
+        source.order_by()
+        .annotate(copy_rank=Window(RowNumber(), order_by=F('position').asc()))
+        .values_list(*TRACK_COLUMNS, 'copy_rank')
+    )
+    select_sql, select_params = numbered.query.sql_with_params()
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(model._meta.get_field(name).column) for name in TRACK_COLUMNS)
+    rank = qn('copy_rank')
+    sql = (
+        f"INSERT INTO {qn(model._meta.db_table)} "
+        f"({qn('id')}, {qn(parent_field.column)}, {columns}, {qn('position')}, {qn('added_at')}) "
+        f"SELECT {uuid_sql}, %s, {columns}, %s + ({rank} - %s) * %s, %s "
+        f"FROM ({select_sql}) copied WHERE {rank} > %s"
+    )
+    params = [
+        parent_field.get_db_prep_value(parent.pk, connection),
+        last, offset, POSITION_GAP,
+        connection.ops.adapt_datetimefield_value(timezone.now()),
+        *select_params,
+        offset,
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def _copy_in_batches(source, model, parent_field, parent, offset, last):
+    """For backends without a UUID function: stream the rows through Python a batch at a time"""
+    rows = source.order_by('position').values_list(*TRACK_COLUMNS)[offset:]
+    copied = 0
+    batch = []
+    for values in rows.iterator(chunk_size=FALLBACK_BATCH):
+        batch.append(model(**{parent_field.name: parent}, **dict(zip(TRACK_COLUMNS, values))))
+        if len(batch) == FALLBACK_BATCH:
+            copied += _write(model, batch, last + copied * POSITION_GAP)
+            batch = []
+    if batch:
+        copied += _write(model, batch, last + copied * POSITION_GAP)
+    return copied
+
+
+def _write(model, rows, after):
+    for row, position in zip(rows, spaced_positions(len(rows), after=after)):
+        row.position = position
+    model.objects.bulk_create(rows)
+    return len(rows)
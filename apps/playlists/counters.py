@@ -0,0 +1,94 @@
+"""
+Playlist.track_count, total_duration and cover_mosaic are kept on the
+playlist row so listing playlists needs no per-row COUNT. Writers move
+them through Playlist.bump_version in the transaction that changes the
+tracks; reconcile_playlist_counters repairs any drift.
+"""
+from django.db.models import Count, Sum
+
+from .models import Playlist, PlaylistTrack
+
+MOSAIC_SIZE = 4
+
+
+def mosaic(covers, initial=()):
+    """The first MOSAIC_SIZE distinct non-empty covers, continuing from initial"""
+    result = list(initial)
+    for cover in covers:
+        if len(result) >= MOSAIC_SIZE:
+            break
+        if cover and cover not in result:
+            result.append(cover)
+    return result
+
+
+def stored_mosaic(playlist_id):
+    covers = (
+        PlaylistTrack.objects.filter(playlist_id=playlist_id)
+        .exclude(album_cover='')
+        .order_by('position')
+        .values_list('album_cover', flat=True)
+    )
+    return mosaic(covers.iterator())
+
+
+def next_mosaic(playlist, added=(), removed=()):
+    """
+    The playlist's mosaic after rows were appended, removed or reordered, or
+    None when it is unchanged. Appends extend it without a query; removals
+    only rebuild it when they took a cover it shows.
+    """
+    current = playlist.cover_mosaic or []
+    if added and not removed:
+        if len(current) >= MOSAIC_SIZE:
+            return None
+        extended = mosaic((row.album_cover for row in added), current)
+        return extended if extended != current else None
+    if removed and not any(row.album_cover in current for row in removed):
+        return None
+    rebuilt = stored_mosaic(playlist.pk)
+    return rebuilt if rebuilt != current else None
+
+
+def actual_counters(playlist_ids):
+    """{playlist_id: (track_count, total_duration, cover_mosaic)} computed from PlaylistTrack"""
+    counters = {playlist_id: (0, 0, []) for playlist_id in playlist_ids}
+    totals = (
+        PlaylistTrack.objects.filter(playlist_id__in=playlist_ids)
+        .values('playlist_id')
+        .annotate(count=Count('id'), duration=Sum('duration'))
+        .order_by()
+    )
+    for row in totals:
+        counters[row['playlist_id']] = (row['count'], row['duration'] or 0, [])
+
+    covers = {}
+    rows = (
+        PlaylistTrack.objects.filter(playlist_id__in=playlist_ids)
+        .exclude(album_cover='')
+        .order_by('playlist_id', 'position')
+        .values_list('playlist_id', 'album_cover')
+    )
+    for playlist_id, cover in rows.iterator():
+        shown = covers.setdefault(playlist_id, [])
+        if len(shown) < MOSAIC_SIZE and cover not in shown:
+            shown.append(cover)
+    return {
+        playlist_id: (count, duration, covers.get(playlist_id, []))
+        for playlist_id, (count, duration, _) in counters.items()
+    }
+
+
+def reconcile(playlist_ids, dry_run=False):
+    """Rewrite the counters of the given playlists that drifted; returns the drifted playlists"""
+    actual = actual_counters(playlist_ids)
+    drifted = []
+    for playlist in Playlist.objects.filter(pk__in=playlist_ids).only(
+            'id', 'track_count', 'total_duration', 'cover_mosaic'):
+        count, duration, covers = actual[playlist.pk]
+        if (playlist.track_count, playlist.total_duration, playlist.cover_mosaic) != (count, duration, covers):
+            playlist.track_count, playlist.total_duration, playlist.cover_mosaic = count, duration, covers
+            drifted.append(playlist)
+    if drifted and not dry_run:
+        Playlist.objects.bulk_update(drifted, ['track_count', 'total_duration', 'cover_mosaic'], batch_size=1000)
+    return drifted
@@ -0,0 +1,121 @@
+"""
+Genre playlist generation, run by the generate_playlist task. The genre's
+details and its track sources are fetched from Deezer concurrently, tracks
+are deduplicated across sources, and the playlist and all of its tracks are
+written in one transaction with a single bulk_create.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection, transaction
+
+from apps.deezer.client import deezer_client
+from .models import Playlist, PlaylistTrack
+from .ordering import spaced_positions
+from .utils import track_fields
+
+logger = logging.getLogger(__name__)
+
+TRACK_LIMIT = 30
+
+
+class NoTracksFound(Exception):
+    pass
+
+
+def parse_genre(genre, genre_id):
+    """(genre name, genre id) from the request; a numeric genre is taken as an id"""
+    if genre and not genre_id:
+        try:
+            return None, int(genre)
+        except (ValueError, TypeError):
+            pass
+    return genre, genre_id
+
+
+def _concurrently(*calls):
+    """Run the zero-argument callables on the Deezer pool and return their results in order"""
+    def run(call):
+        try:
+            return call()
+        except Exception as e:
+            logger.error(f"Error fetching generation source: {str(e)}")
+            return None
+        finally:
+            connection.close()
+
+    workers = min(len(calls), getattr(settings, 'DEEZER_MAX_CONCURRENCY', 8))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, calls))
+
+
+def collect(sources, limit=TRACK_LIMIT):
+    """The first `limit` distinct tracks across the source lists, in source order"""
+    seen = set()
+    tracks = []
+    for source in sources:
+        for track in source or []:
+            track_id = str(track.get('id'))
+            if track.get('id') is None or track_id in seen:
+                continue
+            seen.add(track_id)
+            tracks.append(track)
+            if len(tracks) >= limit:
+                return tracks
+    return tracks
+
+
+def fetch_tracks(genre, genre_id, limit=TRACK_LIMIT):
+    """(genre name, tracks) for the genre, topped up from a genre search when its chart is short"""
+    if genre_id:
+        genre_info, genre_tracks = _concurrently(
+            lambda: deezer_client.get_genre(genre_id),
+            lambda: deezer_client.get_genre_tracks_by_id(genre_id, limit=limit),
+        )
+        genre_name = (genre_info or {}).get('name')
+    else:
+        genre_name = None
+        genre_tracks = deezer_client.get_genre_tracks(genre, limit=limit)
+
+    tracks = collect([genre_tracks], limit)
+    search_name = genre_name or genre
+    if len(tracks) < limit and search_name:
+        searched = deezer_client.search_tracks(f'genre:"{search_name}"', limit=limit)
+        tracks = collect([tracks, searched], limit)
+    return genre_name, tracks
+
+
+def generate(user, genre=None, genre_id=None, name=None):
+    """Create the user's genre playlist; raises NoTracksFound when Deezer has nothing for it"""
+    genre, genre_id = parse_genre(genre, genre_id)
+    genre_name, tracks = fetch_tracks(genre, genre_id)
+    if not tracks:
+        raise NoTracksFound('No tracks found for genre')
+
+    if not name:
+        if genre_name:
+            name = f"{genre_name} Mix"
+        elif genre:
+            name = f"{genre.title()} Mix"
+        else:
+            name = "Genre Mix"
+
+    with transaction.atomic():
+        playlist = Playlist.objects.create(
+            user=user,
+            name=name,
+            description=f"A playlist of {genre_name or genre or 'genre'} music",
+        )
+        rows = []
+        for track, position in zip(tracks, spaced_positions(len(tracks))):
+            track_genre = track.get('genre') if isinstance(track.get('genre'), dict) else {}
+            rows.append(PlaylistTrack(
+                playlist=playlist,
+                position=position,
+                genre=track_genre.get('name', ''),
+                genre_id=track_genre.get('id', ''),
+                **track_fields(track)
+            ))
+        PlaylistTrack.objects.bulk_create(rows)
+        playlist.bump_version(added=rows)
+    return playlist
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from apps.playlists.counters import reconcile
+from apps.playlists.models import Playlist
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Playlist.track_count, total_duration and cover_mosaic from PlaylistTrack "
+        "and rewrite the playlists whose stored values drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report drifted playlists without fixing them")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = Playlist.objects.order_by('pk').values_list('pk', flat=True)
+        checked = fixed = 0
+        last = None
+        while True:
+            batch = list((ids.filter(pk__gt=last) if last else ids)[:batch_size])
+            if not batch:
+                break
+            drifted = reconcile(batch, dry_run=options['dry_run'])
+            for playlist in drifted:
+                self.stdout.write(
+                    f"{playlist.pk}: {playlist.track_count} tracks, {playlist.total_duration}s, "
+                    f"{len(playlist.cover_mosaic)} covers"
+                )
+            checked += len(batch)
+            fixed += len(drifted)
+            last = batch[-1]
+
+        verb = "would be fixed" if options['dry_run'] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} playlists, {fixed} {verb}"))
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.5 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playlists', '0002_playlisttrack_genre_playlisttrack_genre_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlist',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='queue',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
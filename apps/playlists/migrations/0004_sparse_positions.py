@@ -0,0 +1,52 @@
+# Generated by Django 5.0.5 on 2026-10-19 02:35
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+PARENTS = {'PlaylistTrack': 'playlist_id', 'QueueTrack': 'queue_id'}
+
+
+def spread_positions(apps, schema_editor):
+    # Dense 0..n-1 positions become (i + 1) * 1024, matching apps.playlists.ordering
+    for name in PARENTS:
+        apps.get_model('playlists', name).objects.update(position=(F('position') + 1) * 1024)
+
+
+def compact_positions(apps, schema_editor):
+    for name, parent in PARENTS.items():
+        model = apps.get_model('playlists', name)
+        for parent_id in model.objects.order_by().values_list(parent, flat=True).distinct():
+            rows = list(model.objects.filter(**{parent: parent_id}).order_by('position'))
+            for i, row in enumerate(rows):
+                row.position = i
+            model.objects.bulk_update(rows, ['position'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playlists', '0003_playlist_version_queue_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='playlisttrack',
+            name='position',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='queuetrack',
+            name='position',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(spread_positions, compact_positions),
+        migrations.AddIndex(
+            model_name='playlisttrack',
+            index=models.Index(fields=['playlist', 'position'], name='playlists_p_playlis_7565e9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='queuetrack',
+            index=models.Index(fields=['queue', 'position'], name='playlists_q_queue_i_dea710_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.5 on 2026-10-19 02:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playlists', '0004_sparse_positions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queue',
+            name='source_offset',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='queue',
+            name='source_order',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='queue',
+            name='source_playlist',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='playlists.playlist'),
+        ),
+    ]
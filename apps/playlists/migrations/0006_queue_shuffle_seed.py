@@ -0,0 +1,37 @@
+# Generated by Django 5.0.5 on 2026-10-19 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playlists', '0005_queue_source'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='queue',
+            name='source_order',
+        ),
+        migrations.AddField(
+            model_name='queue',
+            name='shuffle_anchor',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='queue',
+            name='shuffle_seed',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='queue',
+            name='shuffle_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='queue',
+            name='shuffled',
+            field=models.BooleanField(default=False),
+        ),
+    ]
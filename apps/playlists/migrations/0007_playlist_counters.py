@@ -0,0 +1,50 @@
+# Generated by Django 5.0.5 on 2026-10-19 02:49
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    # Same values as apps.playlists.counters.actual_counters, mosaic of up to 4 covers
+    Playlist = apps.get_model('playlists', 'Playlist')
+    PlaylistTrack = apps.get_model('playlists', 'PlaylistTrack')
+    tracks = PlaylistTrack.objects.filter(playlist_id=OuterRef('pk')).order_by().values('playlist_id')
+    Playlist.objects.update(
+        track_count=Coalesce(Subquery(tracks.annotate(n=Count('id')).values('n')), 0, output_field=IntegerField()),
+        total_duration=Coalesce(Subquery(tracks.annotate(d=Sum('duration')).values('d')), 0, output_field=IntegerField()),
+    )
+    covers = {}
+    rows = PlaylistTrack.objects.exclude(album_cover='').order_by('playlist_id', 'position')
+    for playlist_id, cover in rows.values_list('playlist_id', 'album_cover').iterator():
+        shown = covers.setdefault(playlist_id, [])
+        if len(shown) < 4 and cover not in shown:
+            shown.append(cover)
+    playlists = [Playlist(pk=playlist_id, cover_mosaic=shown) for playlist_id, shown in covers.items()]
+    Playlist.objects.bulk_update(playlists, ['cover_mosaic'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playlists', '0006_queue_shuffle_seed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlist',
+            name='cover_mosaic',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='total_duration',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='track_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.5 on 2026-10-19 03:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_logs(apps, schema_editor):
+    # Nothing is logged before this migration, so clients of existing playlists resync once
+    Playlist = apps.get_model('playlists', 'Playlist')
+    Playlist.objects.update(log_floor=F('version'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playlists', '0009_generation_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlist',
+            name='log_floor',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(start_logs, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='PlaylistChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('version', models.PositiveIntegerField()),
+                ('op', models.CharField(choices=[('insert', 'Insert'), ('remove', 'Remove'), ('move', 'Move')], max_length=6)),
+                ('track_id', models.CharField(max_length=50)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('playlist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='playlists.playlist')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['playlist', 'version'], name='playlist_change_version_idx'), models.Index(fields=['created_at'], name='playlist_change_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.5 on 2026-10-19 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('playlists', '0010_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queue',
+            name='radio',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 import uuid
 from django.conf import settings
 
@@ -9,15 +11,80 @@ class Playlist(models.Model):
     description = models.TextField(blank=True)
     cover_image = models.ImageField(upload_to='playlist_covers/', null=True, blank=True)
     is_public = models.BooleanField(default=False)
+    version = models.PositiveIntegerField(default=0)
+    # Oldest version GET changes/?since= can answer from; older clients resync
+    log_floor = models.PositiveIntegerField(default=0)
+    # Denormalised from PlaylistTrack, see apps.playlists.counters
+    track_count = models.PositiveIntegerField(default=0)
+    total_duration = models.PositiveIntegerField(default=0)
+    cover_mosaic = models.JSONField(default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['user', '-updated_at'], name='playlist_user_recent_idx'),
+            # Public playlists are a small slice of the table; list pages OR them with the user's own
+            models.Index(
+                fields=['-updated_at'], condition=models.Q(is_public=True), name='playlist_public_recent_idx'
+            ),
+        ]
+
+    def bump_version(self, added=(), removed=(), moved=()):
+        """
+        Record a change to the playlist's tracks without re-saving the row,
+        moving the counters by the rows just added or removed in the same UPDATE.
+        A call with neither is taken as a reorder. The added and removed rows
+        and the {track_id, before | after} moves go to the change log.
+        """
+        from .counters import next_mosaic
+        from .changes import record
+
+        now = timezone.now()
+        count = len(added) - len(removed)
+        duration = sum(row.duration for row in added) - sum(row.duration for row in removed)
+        changes = {'version': F('version') + 1, 'updated_at': now}
+        if count:
+            changes['track_count'] = F('track_count') + count
+        if duration:
+            changes['total_duration'] = F('total_duration') + duration
+        mosaic = next_mosaic(self, added, removed)
+        if mosaic is not None:
+            changes['cover_mosaic'] = mosaic
+        Playlist.objects.filter(pk=self.pk).update(**changes)
+
+        self.version += 1
+        self.track_count += count
+        self.total_duration += duration
+        if mosaic is not None:
+            self.cover_mosaic = mosaic
+        self.updated_at = now
+        record(self, added, removed, moved)
+
+class PlaylistChange(models.Model):
+    """One track operation in a playlist's change log, at the version that made it"""
+    INSERT = 'insert'
+    REMOVE = 'remove'
+    MOVE = 'move'
+    OP_CHOICES = [(INSERT, 'Insert'), (REMOVE, 'Remove'), (MOVE, 'Move')]
+
+    # Sequential, so operations within one version replay in the order they were made
+    id = models.BigAutoField(primary_key=True)
+    playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE, related_name='changes')
+    version = models.PositiveIntegerField()
+    op = models.CharField(max_length=6, choices=OP_CHOICES)
+    track_id = models.CharField(max_length=50)
+    # The inserted row, or the {before | after} anchor of a move
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['playlist', 'version'], name='playlist_change_version_idx'),
+            models.Index(fields=['created_at'], name='playlist_change_created_idx'),
+        ]
 
-    @property
-    def track_count(self):
-        return self.tracks.count()
 
 class PlaylistTrack(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -31,20 +98,46 @@ class PlaylistTrack(models.Model):
     genre_id = models.CharField(max_length=50, blank=True, null=True)
     genre = models.CharField(max_length=100, blank=True)
     duration = models.PositiveIntegerField(default=0)
-    position = models.PositiveIntegerField(default=0)
+    # Sparse ordering key, see apps.playlists.ordering
+    position = models.PositiveBigIntegerField(default=0)
     added_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['position']
         unique_together = ('playlist', 'track_id')
+        indexes = [models.Index(fields=['playlist', 'position'])]
 
 class Queue(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='queue')
     current_track_id = models.CharField(max_length=50, null=True, blank=True)
-    current_position = models.PositiveIntegerField(default=0)
+    current_position = models.PositiveIntegerField(default=0)  # index of the current track in queue order
+    version = models.PositiveIntegerField(default=0)
+    # Set while the queue plays a playlist without copying it, see apps.playlists.queue_engine
+    source_playlist = models.ForeignKey(Playlist, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    source_offset = models.PositiveIntegerField(default=0)
+    # Shuffle is applied on read from the seed, see apps.playlists.queue_engine
+    shuffled = models.BooleanField(default=False)
+    shuffle_seed = models.BigIntegerField(null=True, blank=True)
+    shuffle_anchor = models.PositiveIntegerField(default=0)
+    shuffle_size = models.PositiveIntegerField(default=0)
+    # Started from a recommendation; only radio queues are refilled, see apps.playlists.radio
+    radio = models.BooleanField(default=False)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def bump_version(self, **changes):
+        """Record a change to the queue's tracks without re-saving the row, writing `changes` in the same UPDATE"""
+        now = timezone.now()
+        Queue.objects.filter(pk=self.pk).update(version=F('version') + 1, updated_at=now, **changes)
+        for field, value in changes.items():
+            setattr(self, field, value)
+        self.version += 1
+        self.updated_at = now
+
+        from .queue_cache import enabled, drop
+        if enabled():
+            drop(self.user_id)
+
 class QueueTrack(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     queue = models.ForeignKey(Queue, on_delete=models.CASCADE, related_name='tracks')
@@ -57,8 +150,37 @@ class QueueTrack(models.Model):
     genre_id = models.CharField(max_length=50, blank=True, null=True)
     genre = models.CharField(max_length=100, blank=True)
     duration = models.PositiveIntegerField(default=0)
-    position = models.PositiveIntegerField(default=0)
+    # Sparse ordering key, see apps.playlists.ordering
+    position = models.PositiveBigIntegerField(default=0)
     added_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = [['queue','track_id'],]
\ No newline at end of file
+        unique_together = [['queue','track_id'],]
+        indexes = [models.Index(fields=['queue', 'position'])]
+
+class GenerationJob(models.Model):
+    """A genre playlist being generated in the background; clients poll it until it finishes"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='generation_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # genre, genre_id and name as posted
+    params = models.JSONField(default=dict)
+    playlist = models.ForeignKey(Playlist, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    detail = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
@@ -0,0 +1,74 @@
+from django.db.models import Max
+
+# Rows are spaced this far apart so an insert or move can take the midpoint
+# of its neighbours without renumbering anything else
+POSITION_GAP = 1024
+# Once a move leaves neighbours closer than this, a background rebalance is scheduled
+LOW_WATER_GAP = 8
+
+
+def lock(obj):
+    """Lock the parent playlist or queue row for the rest of the transaction"""
+    type(obj).objects.select_for_update().filter(pk=obj.pk).values_list('pk', flat=True).first()
+
+
+def spaced_positions(count, after=0):
+    """count positions POSITION_GAP apart, following position after"""
+    return [after + (i + 1) * POSITION_GAP for i in range(count)]
+
+
+def append_positions(siblings, count=1):
+    """
+    Positions for count rows appended after siblings. The caller must hold
+    the parent lock so concurrent appends cannot pick the same positions.
+    """
+    last = siblings.aggregate(last=Max('position'))['last']
+    return spaced_positions(count, after=last or 0)
+
+
+def rebalance(siblings):
+    """Respace every row POSITION_GAP apart, keeping the current order"""
+    rows = list(siblings.order_by('position', 'added_at', 'id').only('id', 'position'))
+    changed = []
+    for row, position in zip(rows, spaced_positions(len(rows))):
+        if row.position != position:
+            row.position = position
+            changed.append(row)
+    if changed:
+        siblings.model.objects.bulk_update(changed, ['position'], batch_size=1000)
+    return len(changed)
+
+
+def _bounds(siblings, before=None, after=None):
+    if after is not None:
+        low = after.position
+        high = siblings.filter(position__gt=low).order_by('position').values_list('position', flat=True).first()
+        return low, low + 2 * POSITION_GAP if high is None else high
+    high = before.position
+    low = siblings.filter(position__lt=high).order_by('-position').values_list('position', flat=True).first()
+    return -1 if low is None else low, high
+
+
+def place(siblings, row, before=None, after=None):
+    """
+    Move row directly before or after an anchor row, writing only row.
+    Returns True when the remaining gap is small enough that the caller
+    should schedule a background rebalance.
+    """
+    siblings = siblings.exclude(pk=row.pk)
+    low, high = _bounds(siblings, before, after)
+    if high - low < 2:
+        # Out of room between the neighbours: respace now and retry
+        rebalance(siblings)
+        anchor = after if after is not None else before
+        anchor.refresh_from_db(fields=['position'])
+        low, high = _bounds(siblings, before, after)
+
+    row.position = low + (high - low) // 2
+    type(row).objects.filter(pk=row.pk).update(position=row.position)
+    return min(row.position - low, high - row.position) < LOW_WATER_GAP
+
+
+def index_of(siblings, row):
+    """Zero-based index of row in its list"""
+    return siblings.filter(position__lt=row.position).count()
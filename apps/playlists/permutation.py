@@ -0,0 +1,57 @@
+"""
+Keyed bijections on range(size), used to shuffle a queue without storing
+its order. A small Feistel network permutes a power-of-four domain just
+large enough to hold size, and cycle walking folds it back into range(size),
+so any single position maps to a track (and back) without building the
+whole order.
+"""
+import hashlib
+
+ROUNDS = 4
+
+
+def _half_bits(size):
+    return max(1, ((size - 1).bit_length() + 1) // 2)
+
+
+def _round(seed, round_no, value, bits):
+    digest = hashlib.blake2b(f"{seed}:{round_no}:{value}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') & ((1 << bits) - 1)
+
+
+def _encrypt(value, half, seed):
+    mask = (1 << half) - 1
+    left, right = value >> half, value & mask
+    for round_no in range(ROUNDS):
+        left, right = right, left ^ _round(seed, round_no, right, half)
+    return (left << half) | right
+
+
+def _decrypt(value, half, seed):
+    mask = (1 << half) - 1
+    left, right = value >> half, value & mask
+    for round_no in reversed(range(ROUNDS)):
+        left, right = right ^ _round(seed, round_no, left, half), left
+    return (left << half) | right
+
+
+def permute(index, size, seed):
+    """Where index lands in the seeded permutation of range(size)"""
+    if not 0 <= index < size:
+        raise IndexError(index)
+    half = _half_bits(size)
+    value = _encrypt(index, half, seed)
+    while value >= size:
+        value = _encrypt(value, half, seed)
+    return value
+
+
+def unpermute(value, size, seed):
+    """Inverse of permute"""
+    if not 0 <= value < size:
+        raise IndexError(value)
+    half = _half_bits(size)
+    index = _decrypt(value, half, seed)
+    while index >= size:
+        index = _decrypt(index, half, seed)
+    return index
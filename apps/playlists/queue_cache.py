@@ -0,0 +1,227 @@
+"""
+Optional Redis-resident queue state for the navigation endpoints, enabled
+with QUEUE_BACKEND = 'redis'. Each active user's queue is kept as:
+
+    <prefix>:order    list of track ids in play order
+    <prefix>:state    hash of cursor, track_id, queue_id, version and radio
+    <prefix>:entries  hash of track id -> serialized queue entry
+    <prefix>:plays    list of plays not yet written to PlaybackHistory
+
+next, previous, position, current and stream move the cursor with a single
+Lua script call. flush_queue_state writes cursors and plays back to Postgres;
+any other queue change drops the keys so the next read reloads them.
+"""
+import json
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from apps.accounts.favorites import favorites_for_request
+from . import queue_engine
+
+DIRTY_KEY = 'playpod:queue:dirty'
+
+# KEYS: order, state, entries, plays, dirty
+# ARGV: mode (step | index | track), value, user id, ttl,
+#       history position for the track being left ('' to skip),
+#       history position for the track arrived at ('' to skip),
+#       '1' to record the track being left even when the cursor cannot move
+MOVE_SCRIPT = """
+local cursor = redis.call('HGET', KEYS[2], 'cursor')
+if not cursor then return {-1} end
+cursor = tonumber(cursor)
+local size = redis.call('LLEN', KEYS[1])
+local target
+if ARGV[1] == 'step' then
+    target = cursor + tonumber(ARGV[2])
+elseif ARGV[1] == 'index' then
+    target = tonumber(ARGV[2])
+else
+    target = redis.call('LPOS', KEYS[1], ARGV[2])
+    if not target then return {-2} end
+end
+
+local moved = target >= 0 and target < size
+local current_id = redis.call('LINDEX', KEYS[1], cursor)
+local target_id = false
+if moved then target_id = redis.call('LINDEX', KEYS[1], target) end
+local dirty = false
+
+local function play(track_id, position)
+    local entry = redis.call('HGET', KEYS[3], track_id)
+    if entry then
+        redis.call('RPUSH', KEYS[4], cjson.encode({tonumber(position), entry}))
+        dirty = true
+    end
+end
+
+if ARGV[5] ~= '' and current_id and target_id ~= current_id and (moved or ARGV[7] == '1') then
+    play(current_id, ARGV[5])
+end
+if moved then
+    if target ~= cursor then
+        redis.call('HSET', KEYS[2], 'cursor', target, 'track_id', target_id)
+        dirty = true
+    end
+    if ARGV[6] ~= '' then play(target_id, ARGV[6]) end
+end
+if dirty then redis.call('SADD', KEYS[5], ARGV[3]) end
+for i = 1, 4 do redis.call('EXPIRE', KEYS[i], ARGV[4]) end
+
+local radio = redis.call('HGET', KEYS[2], 'radio') or '0'
+if moved then
+    return {1, target, redis.call('HGET', KEYS[3], target_id), size, radio}
+end
+return {0, cursor, redis.call('HGET', KEYS[3], current_id), size, radio}
+"""
+
+_move_script = None
+
+
+def enabled():
+    return getattr(settings, 'QUEUE_BACKEND', 'database') == 'redis'
+
+
+def _connection():
+    return get_redis_connection('default')
+
+
+def _keys(user_id):
+    prefix = f"playpod:queue:{user_id}"
+    return [f"{prefix}:order", f"{prefix}:state", f"{prefix}:entries", f"{prefix}:plays"]
+
+
+def load(user_id):
+    """Copy the user's queue from Postgres into Redis; False when there is no current track to navigate from"""
+    from .models import Queue, QueueTrack
+    from .serializers import QueueTrackSerializer
+
+    queue = Queue.objects.filter(user_id=user_id).first()
+    if queue is None or not queue.current_track_id:
+        return False
+    try:
+        index, _ = queue_engine.current(queue)
+    except QueueTrack.DoesNotExist:
+        return False
+    entries = QueueTrackSerializer(queue_engine.entries(queue), many=True).data
+
+    order_key, state_key, entries_key, _ = _keys(user_id)
+    ttl = getattr(settings, 'QUEUE_CACHE_TTL', 86400)
+    pipe = _connection().pipeline()
+    pipe.delete(order_key, state_key, entries_key)
+    pipe.rpush(order_key, *[entry['track_id'] for entry in entries])
+    pipe.hset(entries_key, mapping={entry['track_id']: json.dumps(entry) for entry in entries})
+    pipe.hset(state_key, mapping={
+        'cursor': index,
+        'track_id': queue.current_track_id,
+        'queue_id': str(queue.pk),
+        'version': queue.version,
+        'radio': int(queue.radio),
+    })
+    for key in (order_key, state_key, entries_key):
+        pipe.expire(key, ttl)
+    pipe.execute()
+    return True
+
+
+def move(user_id, mode, value=0, record_left=None, record_arrived=None, record_when_blocked=False):
+    """
+    Move the cursor in one round trip, loading the queue on a miss.
+    Returns (moved, index, entry, size, radio), or None when the caller should fall back
+    to the database (no queue, no current track, or track not queued).
+    """
+    global _move_script
+    if _move_script is None:
+        _move_script = _connection().register_script(MOVE_SCRIPT)
+
+    keys = _keys(user_id) + [DIRTY_KEY]
+    args = [
+        mode, value, str(user_id), getattr(settings, 'QUEUE_CACHE_TTL', 86400),
+        '' if record_left is None else record_left,
+        '' if record_arrived is None else record_arrived,
+        '1' if record_when_blocked else '0',
+    ]
+    result = _move_script(keys=keys, args=args)
+    if result[0] == -1:
+        if not load(user_id):
+            return None
+        result = _move_script(keys=keys, args=args)
+    if result[0] < 0 or not result[2]:
+        return None
+    return bool(result[0]), int(result[1]), json.loads(result[2]), int(result[3]), bool(int(result[4]))
+
+
+def queued_track_ids(request):
+    """
+    Track ids in the requesting user's queue, for in_queue flags: the Redis
+    copy's entry ids when it is loaded, otherwise one query.
+    """
+    from .models import Queue
+
+    if request is None or not request.user.is_authenticated:
+        return frozenset()
+    if enabled():
+        track_ids = _connection().hkeys(_keys(request.user.pk)[2])
+        if track_ids:
+            return {track_id.decode() for track_id in track_ids}
+    queue = Queue.objects.filter(user=request.user).first()
+    return queue_engine.track_ids(queue) if queue is not None else frozenset()
+
+
+def with_favorite(request, entry):
+    return dict(entry, is_favorite=entry['track_id'] in favorites_for_request(request))
+
+
+def flush(user_ids=None):
+    """Write cursors and plays recorded in Redis back to Postgres"""
+    from apps.accounts.models import PlaybackHistory
+    from apps.recommendations.tasks import record_taste
+    from .models import Queue
+
+    conn = _connection()
+    if user_ids is None:
+        user_ids = [user_id.decode() for user_id in conn.smembers(DIRTY_KEY)]
+
+    for user_id in map(str, user_ids):
+        _, state_key, _, plays_key = _keys(user_id)
+        pipe = conn.pipeline()
+        pipe.srem(DIRTY_KEY, user_id)
+        pipe.hmget(state_key, 'cursor', 'track_id', 'queue_id', 'version')
+        pipe.lrange(plays_key, 0, -1)
+        pipe.delete(plays_key)
+        was_dirty, (cursor, track_id, queue_id, version), plays, _ = pipe.execute()
+
+        if was_dirty and cursor is not None:
+            # A queue edited since it was loaded keeps the position the edit gave it
+            # update() skips auto_now, so updated_at is set here to change the queue's ETag
+            Queue.objects.filter(pk=queue_id.decode(), version=int(version)).update(
+                current_position=int(cursor),
+                current_track_id=track_id.decode(),
+                updated_at=timezone.now(),
+            )
+        history = []
+        for play in plays:
+            position, entry = json.loads(play)
+            entry = json.loads(entry)
+            history.append(PlaybackHistory(
+                user_id=user_id,
+                track_id=entry['track_id'],
+                artist_id=entry['artist_id'],
+                track_title=entry['track_title'],
+                artist_name=entry['artist_name'],
+                album_title=entry['album_title'],
+                album_cover=entry['album_cover'],
+                position=position,
+            ))
+        if history:
+            PlaybackHistory.objects.bulk_create(history)
+            # bulk_create sends no post_save, so the plays are queued for the taste profile here
+            play_ids = [str(play.pk) for play in history]
+            transaction.on_commit(lambda: record_taste.delay(play_ids))
+
+
+def drop(user_id):
+    """Forget the Redis copy once the stored queue changes; pending plays are kept for the next flush"""
+    order_key, state_key, entries_key, _ = _keys(user_id)
+    transaction.on_commit(lambda: _connection().delete(order_key, state_key, entries_key))
@@ -0,0 +1,279 @@
+"""
+A queue is either materialised, one QueueTrack row per entry, or lazy: it
+points at a source playlist and plays its tracks from source_offset on.
+Lazy entries are resolved from PlaylistTrack on demand and only copied into
+QueueTrack rows when the user edits the queue.
+
+Either way the stored order can be shuffled without rewriting it: a
+shuffled queue plays the anchor track first and the other first
+shuffle_size tracks in the order of a permutation keyed by shuffle_seed.
+Tracks appended after shuffling follow in stored order.
+"""
+import random
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import PlaylistTrack, QueueTrack
+from .ordering import POSITION_GAP, spaced_positions, index_of
+from .permutation import permute, unpermute
+from .utils import TRACK_COLUMNS
+from .copying import copy_tracks
+
+
+def is_lazy(queue):
+    return queue.source_playlist_id is not None
+
+
+def _source_tracks(queue):
+    return PlaylistTrack.objects.filter(playlist_id=queue.source_playlist_id).order_by('position')
+
+
+def _stored_tracks(queue):
+    return QueueTrack.objects.filter(queue=queue).order_by('position')
+
+
+def _entry(queue, row, index):
+    """A stored QueueTrack as is, or an unsaved QueueTrack standing in for the playlist track at index"""
+    if isinstance(row, QueueTrack):
+        return row
+    entry = QueueTrack(
+        id=row.id,
+        queue=queue,
+        position=(index + 1) * POSITION_GAP,
+        **{column: getattr(row, column) for column in TRACK_COLUMNS}
+    )
+    entry.added_at = row.added_at
+    return entry
+
+
+# Stored order: QueueTrack rows by position, or the source playlist from source_offset on
+
+def _base_size(queue):
+    if not is_lazy(queue):
+        return _stored_tracks(queue).count()
+    return max(_source_tracks(queue).count() - queue.source_offset, 0)
+
+
+def _base_at(queue, index):
+    if not is_lazy(queue):
+        return _stored_tracks(queue)[index:index + 1].first()
+    start = queue.source_offset + index
+    return _source_tracks(queue)[start:start + 1].first()
+
+
+def _base_find(queue, track_id):
+    if not is_lazy(queue):
+        row = QueueTrack.objects.filter(queue=queue, track_id=track_id).first()
+        return (None, None) if row is None else (index_of(_stored_tracks(queue), row), row)
+    row = _source_tracks(queue).filter(track_id=track_id).first()
+    if row is None:
+        return None, None
+    index = index_of(_source_tracks(queue), row) - queue.source_offset
+    return (None, None) if index < 0 else (index, row)
+
+
+def _base_rows(queue):
+    if not is_lazy(queue):
+        return list(_stored_tracks(queue))
+    return list(_source_tracks(queue))[queue.source_offset:]
+
+
+# Play order on top of the stored order
+
+def _shuffled_size(queue, size):
+    return min(queue.shuffle_size, size) if queue.shuffled else 0
+
+
+def _to_base(queue, index, size):
+    shuffled = _shuffled_size(queue, size)
+    if index >= shuffled:
+        return index
+    anchor = min(queue.shuffle_anchor, shuffled - 1)
+    if index == 0:
+        return anchor
+    base = permute(index - 1, shuffled - 1, queue.shuffle_seed)
+    return base + 1 if base >= anchor else base
+
+
+def _from_base(queue, base, size):
+    shuffled = _shuffled_size(queue, size)
+    if base >= shuffled:
+        return base
+    anchor = min(queue.shuffle_anchor, shuffled - 1)
+    if base == anchor:
+        return 0
+    return unpermute(base - 1 if base > anchor else base, shuffled - 1, queue.shuffle_seed) + 1
+
+
+def length(queue):
+    return _base_size(queue)
+
+
+def track_at(queue, index):
+    """The entry at a zero-based index in play order, or None past either end"""
+    if index < 0:
+        return None
+    if queue.shuffled:
+        size = _base_size(queue)
+        if index >= size:
+            return None
+        index = _to_base(queue, index, size)
+    row = _base_at(queue, index)
+    return _entry(queue, row, index) if row else None
+
+
+def find(queue, track_id):
+    """(index in play order, entry) for track_id, or (None, None) if it is not queued"""
+    base, row = _base_find(queue, str(track_id))
+    if row is None:
+        return None, None
+    entry = _entry(queue, row, base)
+    if queue.shuffled:
+        return _from_base(queue, base, _base_size(queue)), entry
+    return base, entry
+
+
+def stored_index(queue, track_id):
+    """Index of track_id in the stored, unshuffled order, or None"""
+    return _base_find(queue, str(track_id))[0]
+
+
+def get(queue, track_id):
+    """Like find, but raises QueueTrack.DoesNotExist instead of returning None"""
+    index, entry = find(queue, track_id)
+    if entry is None:
+        raise QueueTrack.DoesNotExist(f"Track {track_id} is not in the queue")
+    return index, entry
+
+
+def current(queue):
+    """(index, entry) of the current track, trusting current_position when it still points at it"""
+    entry = track_at(queue, queue.current_position)
+    if entry is not None and entry.track_id == queue.current_track_id:
+        return queue.current_position, entry
+    return get(queue, queue.current_track_id)
+
+
+def contains(queue, track_id):
+    if not is_lazy(queue):
+        return QueueTrack.objects.filter(queue=queue, track_id=str(track_id)).exists()
+    return find(queue, track_id)[0] is not None
+
+
+def track_ids(queue):
+    """Every track id in the queue, in one query"""
+    if not is_lazy(queue):
+        return set(QueueTrack.objects.filter(queue=queue).values_list('track_id', flat=True))
+    return set(_source_tracks(queue)[queue.source_offset:].values_list('track_id', flat=True))
+
+
+def entries(queue):
+    """Every entry in play order"""
+    rows = [_entry(queue, row, index) for index, row in enumerate(_base_rows(queue))]
+    if not queue.shuffled:
+        return rows
+    return [rows[_to_base(queue, index, len(rows))] for index in range(len(rows))]
+
+
+def window(queue, index, count, after=None, before=None):
+    """
+    (entries, keys) for play indexes [index, index + count), where keys are
+    the stored positions of the rows behind the entries.
+    Given the stored position just outside the window (after or before), an
+    unshuffled queue seeks to it instead of using OFFSET, so a deep page
+    costs the same as the first. A shuffled queue maps the indexes through
+    its permutation and fetches just those rows by their rank in stored
+    order, without reading the rest of the queue; it has no keys.
+    """
+    if index < 0 or count <= 0:
+        return [], []
+    rows = _source_tracks(queue) if is_lazy(queue) else _stored_tracks(queue)
+    offset = queue.source_offset if is_lazy(queue) else 0
+
+    if queue.shuffled:
+        size = _base_size(queue)
+        bases = [_to_base(queue, i, size) for i in range(index, min(index + count, size))]
+        ranked = rows.annotate(rank=Window(RowNumber(), order_by=F('position').asc()))
+        by_base = {row.rank - offset - 1: row for row in ranked.filter(rank__in=[offset + base + 1 for base in bases])}
+        return [_entry(queue, by_base[base], base) for base in bases if base in by_base], None
+
+    if after is not None:
+        page = list(rows.filter(position__gt=after)[:count])
+    elif before is not None:
+        page = list(rows.filter(position__lt=before).order_by('-position')[:count])[::-1]
+    else:
+        page = list(rows[offset + index:offset + index + count])
+    return [_entry(queue, row, index + i) for i, row in enumerate(page)], [row.position for row in page]
+
+
+def around_current(queue, count):
+    """(index, entries, keys) for a window of count entries with the current track near its middle"""
+    index = queue.current_position
+    start = max(index - count // 2, 0)
+    rows = _source_tracks(queue) if is_lazy(queue) else _stored_tracks(queue)
+    position = None
+    if not queue.shuffled and queue.current_track_id:
+        position = rows.filter(track_id=queue.current_track_id).values_list('position', flat=True).first()
+    if position is None:
+        return (start, *window(queue, start, count))
+
+    # Seek both ways from the current row, trusting current_position for the indexes
+    earlier = list(rows.filter(position__lt=position).order_by('-position')[:index - start])[::-1]
+    later = list(rows.filter(position__gte=position)[:count - len(earlier)])
+    page = earlier + later
+    start = index - len(earlier)
+    entries = [_entry(queue, row, start + i) for i, row in enumerate(page)]
+    return start, entries, [row.position for row in page]
+
+
+def shuffle_fields(anchor, size):
+    """Queue field values that shuffle `size` stored tracks, playing the one at `anchor` first"""
+    return {
+        'shuffled': True,
+        'shuffle_seed': random.getrandbits(62),
+        'shuffle_anchor': anchor,
+        'shuffle_size': size,
+    }
+
+
+def detach(queue):
+    """Forget the source playlist; the caller saves the queue"""
+    queue.source_playlist = None
+    queue.source_offset = 0
+
+
+def clear(queue):
+    """Empty the queue, stored and lazy entries alike; the caller saves the queue"""
+    QueueTrack.objects.filter(queue=queue).delete()
+    detach(queue)
+    queue.shuffled = False
+    queue.radio = False
+
+
+def materialize(queue):
+    """Copy a lazy queue into QueueTrack rows, in stored order, so it can be edited"""
+    if not is_lazy(queue):
+        return
+    with transaction.atomic():
+        QueueTrack.objects.filter(queue=queue).delete()
+        copy_tracks(_source_tracks(queue), QueueTrack, queue, offset=queue.source_offset)
+        detach(queue)
+        queue.save(update_fields=['source_playlist', 'source_offset'])
+
+
+def bake(queue):
+    """
+    Write a shuffled play order into QueueTrack positions, for edits such
+    as moves that are expressed relative to the order the user sees.
+    """
+    materialize(queue)
+    if not queue.shuffled:
+        return
+    rows = entries(queue)
+    for row, position in zip(rows, spaced_positions(len(rows))):
+        row.position = position
+    with transaction.atomic():
+        QueueTrack.objects.bulk_update(rows, ['position'], batch_size=1000)
+        queue.shuffled = False
+        queue.save(update_fields=['shuffled'])
@@ -0,0 +1,55 @@
+"""
+Radio refill ahead of the end of the queue. Whenever navigation in a radio
+queue (one started from a recommendation) leaves fewer than
+RADIO_LOW_WATERMARK tracks after the current one, a refill task is queued,
+at most one per user at a time, so radio listeners never reach the end while
+the new tracks are being fetched. Other queues end where their tracks do.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.core.cache import get_cache_key
+
+# How long a refill may run before another one can be queued for the same user
+REFILL_LOCK_TTL = 60 * 5
+
+
+def _refill_key(user_id):
+    return get_cache_key('radio_refill', user_id)
+
+
+def low_watermark():
+    return getattr(settings, 'RADIO_LOW_WATERMARK', 5)
+
+
+def refill_if_low(user_id, remaining, is_radio):
+    """Queue a refill once a radio queue's `remaining` tracks after the cursor drop below the watermark; True if one was queued"""
+    if not is_radio or remaining >= low_watermark():
+        return False
+    # cache.add only succeeds for the first caller, so a burst of skips queues one refill
+    if not cache.add(_refill_key(user_id), 1, REFILL_LOCK_TTL):
+        return False
+    from .tasks import generate_radio_recommendations
+
+    transaction.on_commit(lambda: generate_radio_recommendations.delay(str(user_id)))
+    return True
+
+
+def refill_done(user_id):
+    cache.delete(_refill_key(user_id))
+
+
+def pick(candidates, exclude, limit):
+    """Up to `limit` distinct track documents from candidates, in order, skipping ids in exclude"""
+    seen = set(exclude)
+    picked = []
+    for track in candidates:
+        track_id = str(track.get('id'))
+        if track.get('id') is None or track_id in seen:
+            continue
+        seen.add(track_id)
+        picked.append(track)
+        if len(picked) >= limit:
+            break
+    return picked
@@ -1,46 +1,52 @@
 from rest_framework import serializers
-from .models import Playlist, PlaylistTrack, Queue, QueueTrack
+from apps.accounts.favorites import favorites_for_request
+from apps.core.membership import MembershipField
+from .models import Playlist, PlaylistTrack, Queue, QueueTrack, GenerationJob
+from . import queue_engine
 
 
 class PlaylistSerializer(serializers.ModelSerializer):
-    track_count = serializers.IntegerField(read_only=True)
-
     class Meta:
         model = Playlist
         fields = [
             'id', 'name', 'description', 'cover_image',
-            'is_public', 'track_count', 'created_at', 'updated_at'
+            'is_public', 'track_count', 'total_duration', 'cover_mosaic',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'track_count', 'total_duration', 'cover_mosaic', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'track_count', 'created_at', 'updated_at']
 
 
 class PlaylistDetailSerializer(serializers.ModelSerializer):
     tracks = serializers.SerializerMethodField()
-    track_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Playlist
         fields = [
             'id', 'name', 'description', 'cover_image',
-            'is_public', 'track_count', 'created_at', 'updated_at',
-            'tracks'
+            'is_public', 'track_count', 'total_duration', 'cover_mosaic',
+            'created_at', 'updated_at', 'tracks'
+        ]
+        read_only_fields = [
+            'id', 'track_count', 'total_duration', 'cover_mosaic', 'created_at', 'updated_at', 'tracks'
         ]
-        read_only_fields = ['id', 'track_count', 'created_at', 'updated_at', 'tracks']
 
     def get_tracks(self, obj):
         qs = PlaylistTrack.objects.filter(playlist=obj).order_by('position')
-        return PlaylistTrackSerializer(qs, many=True).data
+        return PlaylistTrackSerializer(qs, many=True, context=self.context).data
 
 
 class PlaylistTrackSerializer(serializers.ModelSerializer):
     genre = serializers.CharField(read_only=True, required=False)
+    is_favorite = MembershipField(favorites_for_request)
     
     class Meta:
         model = PlaylistTrack
         fields = [
             'id', 'track_id', 'artist_id', 'track_title',
             'artist_name', 'album_title', 'album_cover',
-            'duration', 'position', 'added_at', 'genre'
+            'duration', 'position', 'added_at', 'genre', 'is_favorite'
         ]
 
 
@@ -54,27 +60,29 @@ class QueueSerializer(serializers.ModelSerializer):
     class Meta:
         model = Queue
         fields = [
-            'id', 'current_track_id', 'current_position',
+            'id', 'current_track_id', 'current_position', 'shuffled',
             'updated_at', 'tracks'
         ]
-        read_only_fields = ['id', 'updated_at', 'tracks']
+        read_only_fields = ['id', 'shuffled', 'updated_at', 'tracks']
 
     def get_tracks(self, obj):
         return QueueTrackSerializer(
-            obj.tracks.order_by('position'),
-            many=True
+            queue_engine.entries(obj),
+            many=True,
+            context=self.context
         ).data
 
 
 class QueueTrackSerializer(serializers.ModelSerializer):
     genre = serializers.CharField(read_only=True, required=False)
+    is_favorite = MembershipField(favorites_for_request)
     
     class Meta:
         model = QueueTrack
         fields = [
             'id', 'track_id', 'artist_id', 'track_title',
             'artist_name', 'album_title', 'album_cover',
-            'duration', 'position', 'added_at', 'genre'
+            'duration', 'position', 'added_at', 'genre', 'is_favorite'
         ]
 
 
@@ -88,6 +96,23 @@ class QueueUpdateSerializer(serializers.ModelSerializer):
         fields = ['current_track_id', 'current_position']
 
 
+class TrackMoveSerializer(serializers.Serializer):
+    track_id = serializers.CharField()
+    before = serializers.CharField(required=False)
+    after = serializers.CharField(required=False)
+
+    def validate(self, data):
+        if ('before' in data) == ('after' in data):
+            raise serializers.ValidationError("Give exactly one of before or after.")
+        if data.get('before', data.get('after')) == data['track_id']:
+            raise serializers.ValidationError("A track cannot be moved relative to itself.")
+        return data
+
+
+class TrackReorderSerializer(serializers.Serializer):
+    moves = TrackMoveSerializer(many=True, allow_empty=False)
+
+
 class RecommendedTrackSerializer(serializers.Serializer):
     id = serializers.CharField()
     title = serializers.CharField()
@@ -101,4 +126,13 @@ class RecommendedPlaylistSerializer(serializers.Serializer):
     id = serializers.IntegerField()
     name = serializers.CharField()
     description = serializers.CharField(required=False, allow_blank=True)
-    tracks = serializers.ListField(child=serializers.DictField())
\ No newline at end of file
+    tracks = serializers.ListField(child=serializers.DictField())
+
+
+class GenerationJobSerializer(serializers.ModelSerializer):
+    playlist = PlaylistSerializer(read_only=True)
+
+    class Meta:
+        model = GenerationJob
+        fields = ['id', 'status', 'detail', 'playlist', 'created_at', 'updated_at']
+        read_only_fields = fields
@@ -1,16 +1,27 @@
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
-from collections import Counter
+import logging
 import random
+from django.db import transaction
 from apps.deezer.client import deezer_client
+from apps.recommendations import taste
+from apps.recommendations.embeddings import similar_tracks
+from .ordering import lock, append_positions, spaced_positions, rebalance
+from .utils import track_fields
+from . import queue_engine, radio
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def generate_radio_recommendations(user_id):
+    """Append radio tracks to a radio queue once fewer than RADIO_LOW_WATERMARK are left after the current one"""
     from django.contrib.auth import get_user_model
     from apps.accounts.models import PlaybackHistory
-    from .models import Queue, QueueTrack, Playlist, PlaylistTrack
+    from .models import Queue, QueueTrack
+    from . import queue_cache
 
     User = get_user_model()
 
@@ -18,102 +29,74 @@ def generate_radio_recommendations(user_id):
         user = User.objects.get(id=user_id)
 
         two_weeks_ago = timezone.now() - timedelta(days=14)
-        history = PlaybackHistory.objects.filter(
+        history = list(PlaybackHistory.objects.filter(
             user=user,
             timestamp__gte=two_weeks_ago
-        ).order_by('-timestamp')[:20]
+        ).order_by('-timestamp')[:20])
 
         if not history:
             return False
 
-        queue, created = Queue.objects.get_or_create(user=user)
+        if queue_cache.enabled():
+            # The cursor may have moved in Redis since the last flush
+            queue_cache.flush([user.pk])
 
-        track_count = QueueTrack.objects.filter(queue=queue).count()
+        queue = Queue.objects.filter(user=user).first()
 
-        if track_count >= 5:
+        # Only radio queues are refilled; a played playlist, lazy or copied, ends where it ends
+        if queue is None or not queue.radio or queue_engine.is_lazy(queue):
             return False
 
-        genres = []
-        for play in history:
-            artist_genres = deezer_client.get_artist_genres(play.artist_id)
-            genres.extend(artist_genres)
+        track_count = queue_engine.length(queue)
+        remaining = track_count - queue.current_position - 1 if queue.current_track_id else track_count
+
+        if remaining >= radio.low_watermark():
+            return False
 
-        genre_counter = Counter(genres)
-        top_genres = [genre for genre, _ in genre_counter.most_common(3)]
+        top_genres = taste.top_genres(user.id, 3)
         
         if not top_genres:
             top_genres = ["pop", "rock", "hip hop"]
 
-        recommendations = []
-        track_ids_in_queue = set(QueueTrack.objects.filter(queue=queue).values_list('track_id', flat=True))
-        track_ids_in_history = set(history.values_list('track_id', flat=True))
-        
-        for genre in top_genres:
-            if len(recommendations) >= 10:
-                break
-                
-            genre_tracks = deezer_client.get_genre_tracks(genre, limit=20)
-            
-            for track in genre_tracks:
-                track_id = str(track.get('id'))
-                if (track_id not in track_ids_in_queue and 
-                    track_id not in track_ids_in_history and
-                    not any(r.get('id') == track.get('id') for r in recommendations)):
-                    recommendations.append(track)
-                    
-                    if len(recommendations) >= 10:
-                        break
+        recent_track_ids = list(dict.fromkeys(play.track_id for play in history))[:5]
 
-        if history and len(recommendations) < 10:
-            most_recent = history.first()
-            related_tracks = deezer_client.get_related_tracks(most_recent.track_id, limit=10)
-            
-            for track in related_tracks:
-                track_id = str(track.get('id'))
-                if (track_id not in track_ids_in_queue and 
-                    track_id not in track_ids_in_history and
-                    not any(r.get('id') == track.get('id') for r in recommendations)):
-                    recommendations.append(track)
-                    
-                    if len(recommendations) >= 10:
-                        break
+        def candidates():
+            # Consumed lazily, so later genres and similar tracks are only fetched when still short
+            for genre in top_genres:
+                yield from deezer_client.get_genre_tracks(genre, limit=20)
+            yield from similar_tracks(recent_track_ids, limit=10)
 
-        next_position = track_count
-        for track in recommendations:
-            artist = track.get('artist', {})
-            album = track.get('album', {})
-            
-            QueueTrack.objects.create(
-                queue=queue,
-                track_id=str(track.get('id')),
-                artist_id=str(artist.get('id', '')),
-                track_title=track.get('title', ''),
-                artist_name=artist.get('name', ''),
-                album_title=album.get('title', ''),
-                album_cover=album.get('cover_medium', '') or album.get('cover', ''),
-                duration=track.get('duration', 0),
-                position=next_position
-            )
-            next_position += 1
-            
-        if track_count == 0 and next_position > 0:
-            first_track = QueueTrack.objects.filter(queue=queue).order_by('position').first()
-            if first_track:
-                queue.current_track_id = first_track.track_id
-                queue.current_position = 0
-                queue.save()
+        exclude = queue_engine.track_ids(queue) | {play.track_id for play in history}
+        recommendations = radio.pick(candidates(), exclude, getattr(settings, 'RADIO_REFILL_SIZE', 10))
+
+        if not recommendations:
+            return False
+
+        with transaction.atomic():
+            lock(queue)
+            positions = append_positions(QueueTrack.objects.filter(queue=queue), len(recommendations))
+            rows = QueueTrack.objects.bulk_create([
+                QueueTrack(queue=queue, position=position, **track_fields(track))
+                for track, position in zip(recommendations, positions)
+            ])
+
+            if track_count == 0:
+                queue.bump_version(current_track_id=rows[0].track_id, current_position=0)
+            else:
+                queue.bump_version()
 
         return True
 
-    except Exception as e:
-        print(f"Error generating recommendations for user {user_id}: {str(e)}")
+    except Exception:
+        logger.exception(f"Error generating recommendations for user {user_id}")
         return False
+    finally:
+        radio.refill_done(user_id)
 
 
 @shared_task
 def generate_recommended_playlists(user_id):
     from django.contrib.auth import get_user_model
-    from apps.accounts.models import PlaybackHistory
     from .models import Playlist, PlaylistTrack
 
     User = get_user_model()
@@ -121,18 +104,12 @@ def generate_recommended_playlists(user_id):
     try:
         user = User.objects.get(id=user_id)
 
-        history = PlaybackHistory.objects.filter(user=user).order_by('-timestamp')[:50]
+        profile = taste.get(user.id)
         
-        if not history:
+        if profile is None:
             return False
             
-        genres = []
-        for play in history:
-            artist_genres = deezer_client.get_artist_genres(play.artist_id)
-            genres.extend(artist_genres)
-            
-        genre_counter = Counter(genres)
-        top_genres = [genre for genre, _ in genre_counter.most_common(3)]
+        top_genres = profile.top_genres(3)
         
         if not top_genres:
             top_genres = ["pop", "rock", "hip hop"]
@@ -159,13 +136,14 @@ def generate_recommended_playlists(user_id):
         )
         
         added_track_ids = set()
-        position = 0
+        added = []
+        positions = spaced_positions(30)
         
         for genre in top_genres:
             genre_tracks = deezer_client.get_genre_tracks(genre, limit=15)
             
             for track in genre_tracks:
-                if position >= 30:
+                if len(added_track_ids) >= 30:
                     break
                     
                 track_id = str(track.get('id'))
@@ -175,7 +153,7 @@ def generate_recommended_playlists(user_id):
                 artist = track.get('artist', {})
                 album = track.get('album', {})
                 
-                PlaylistTrack.objects.create(
+                added.append(PlaylistTrack.objects.create(
                     playlist=playlist,
                     track_id=track_id,
                     artist_id=str(artist.get('id', '')),
@@ -184,12 +162,12 @@ def generate_recommended_playlists(user_id):
                     album_title=album.get('title', ''),
                     album_cover=album.get('cover_medium', '') or album.get('cover', ''),
                     duration=track.get('duration', 0),
-                    position=position
-                )
+                    position=positions[len(added_track_ids)]
+                ))
                 
                 added_track_ids.add(track_id)
-                position += 1
                 
+        playlist.bump_version(added=added)
         return True
         
     except Exception as e:
@@ -201,10 +179,17 @@ def generate_recommended_playlists(user_id):
 def clean_old_queue_tracks():
     from .models import Queue, QueueTrack
     from django.db.models import F
+    from . import queue_cache
 
     yesterday = timezone.now() - timedelta(days=1)
 
-    queues = Queue.objects.all()
+    if queue_cache.enabled():
+        # Clean relative to cursors still held in Redis
+        queue_cache.flush()
+
+    # Lazy queues have no stored rows to clean, and in a shuffled queue
+    # rows stored before the current track are not necessarily played
+    queues = Queue.objects.filter(source_playlist__isnull=True, shuffled=False)
 
     for queue in queues:
         try:
@@ -215,13 +200,76 @@ def clean_old_queue_tracks():
                 ).first()
 
                 if current_track:
-                    QueueTrack.objects.filter(
+                    deleted, _ = QueueTrack.objects.filter(
                         queue=queue,
                         position__lt=current_track.position,
                         added_at__lt=yesterday
                     ).delete()
+                    if deleted:
+                        queue.current_position = max(queue.current_position - deleted, 0)
+                        queue.save(update_fields=['current_position'])
+                        queue.bump_version()
         except Exception as e:
             print(f"Error cleaning queue {queue.id}: {str(e)}")
             continue
 
-    return True
\ No newline at end of file
+    return True
+
+
+@shared_task
+def rebalance_positions(kind, parent_id):
+    """Respace a playlist's or queue's positions once moves have used up the gaps"""
+    from .models import Playlist, PlaylistTrack, Queue, QueueTrack
+
+    parent_model, siblings = {
+        'playlist': (Playlist, PlaylistTrack.objects.filter(playlist_id=parent_id)),
+        'queue': (Queue, QueueTrack.objects.filter(queue_id=parent_id)),
+    }[kind]
+    with transaction.atomic():
+        parent = parent_model.objects.select_for_update().filter(pk=parent_id).first()
+        if parent is None:
+            return 0
+        changed = rebalance(siblings)
+        if changed:
+            parent.bump_version()
+    return changed
+
+
+@shared_task
+def flush_queue_state():
+    """Write queue cursors and plays kept in Redis back to Postgres"""
+    from . import queue_cache
+
+    if queue_cache.enabled():
+        queue_cache.flush()
+
+
+@shared_task
+def generate_playlist(job_id):
+    """Run a GenerationJob, recording the playlist it produced or why it failed"""
+    from .generation import generate, NoTracksFound
+    from .models import GenerationJob
+
+    # Claim the job, so a redelivered task cannot generate it twice
+    if not GenerationJob.objects.filter(pk=job_id, status=GenerationJob.PENDING).update(status=GenerationJob.RUNNING):
+        return None
+    job = GenerationJob.objects.select_related('user').get(pk=job_id)
+    try:
+        playlist = generate(job.user, **job.params)
+    except NoTracksFound as e:
+        job.status, job.detail = GenerationJob.FAILED, str(e)
+    except Exception:
+        logger.exception(f"Error generating playlist for job {job_id}")
+        job.status, job.detail = GenerationJob.FAILED, 'Playlist generation failed'
+    else:
+        job.status, job.playlist = GenerationJob.SUCCEEDED, playlist
+    job.save(update_fields=['status', 'detail', 'playlist', 'updated_at'])
+    return job.status
+
+
+@shared_task
+def compact_playlist_changes():
+    """Drop playlist change log entries past PLAYLIST_CHANGE_LOG_TTL"""
+    from .changes import compact
+
+    return compact()
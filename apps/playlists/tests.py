@@ -1,3 +1,143 @@
-from django.test import TestCase
+from unittest import skipUnless
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django_redis import get_redis_connection
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from apps.core.query_plans import analyze, plan_problems
+from .models import Playlist, PlaylistTrack, Queue, QueueTrack
+from .ordering import spaced_positions
+from . import queue_cache
+
+User = get_user_model()
+
+USERS = 200
+PLAYLISTS_PER_USER = 10
+TRACKS_PER_PLAYLIST = 100
+QUEUE_LENGTH = 100
+# The playlist and queue under test are long, where paging them by sorting would hurt
+LONG = 5000
+
+
+def track_columns(i):
+    return {
+        'track_id': str(i),
+        'artist_id': str(i % 500),
+        'track_title': f'Track {i}',
+        'artist_name': f'Artist {i % 500}',
+        'album_title': f'Album {i % 2000}',
+    }
+
+
+class HotQueryPlanTests(TestCase):
+    """Playlist and queue reads must come straight off an index, however large the tables grow"""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(username=f'user{n}', email=f'user{n}@example.com') for n in range(USERS)
+        )
+        playlists = Playlist.objects.bulk_create(
+            (Playlist(user=user, name=f'Playlist {n}', is_public=n == 0)
+             for user in users for n in range(PLAYLISTS_PER_USER)),
+            batch_size=5000,
+        )
+        cls.user = users[USERS // 2]
+        cls.playlist = playlists[PLAYLISTS_PER_USER * (USERS // 2)]
+        positions = spaced_positions(LONG)
+        PlaylistTrack.objects.bulk_create(
+            (PlaylistTrack(playlist=playlist, position=positions[i], **track_columns(i))
+             for playlist in playlists[::PLAYLISTS_PER_USER]
+             for i in range(LONG if playlist == cls.playlist else TRACKS_PER_PLAYLIST)),
+            batch_size=5000,
+        )
+        queues = Queue.objects.bulk_create(Queue(user=user) for user in users)
+        cls.queue = queues[USERS // 2]
+        QueueTrack.objects.bulk_create(
+            (QueueTrack(queue=queue, position=positions[i], **track_columns(i))
+             for queue in queues for i in range(LONG if queue == cls.queue else QUEUE_LENGTH)),
+            batch_size=5000,
+        )
+        analyze(User, Playlist, PlaylistTrack, Queue, QueueTrack)
+
+    def assertIndexed(self, queryset, **kwargs):
+        self.assertEqual(plan_problems(queryset, **kwargs), [], queryset.explain())
+
+    def test_own_playlists(self):
+        self.assertIndexed(Playlist.objects.filter(user=self.user).order_by('-updated_at')[:20])
+
+    @skipUnless(connection.vendor == 'postgresql', "SQLite cannot OR a partial index with another index")
+    def test_visible_playlists(self):
+        # Two index ranges OR'ed together come back unordered, so only the scans are checked
+        qs = Playlist.objects.filter(Q(is_public=True) | Q(user=self.user)).order_by('-updated_at')[:20]
+        self.assertIndexed(qs, allow_sort=True)
+
+    def test_public_playlists(self):
+        self.assertIndexed(Playlist.objects.filter(is_public=True).order_by('-updated_at')[:20])
+
+    def test_playlist_tracks_page(self):
+        self.assertIndexed(PlaylistTrack.objects.filter(playlist=self.playlist).order_by('position')[:51])
+
+    def test_playlist_tracks_deep_page(self):
+        qs = PlaylistTrack.objects.filter(playlist=self.playlist, position__gt=positions_after(LONG - 100))
+        self.assertIndexed(qs.order_by('position')[:51])
+
+    def test_playlist_track_lookup(self):
+        self.assertIndexed(PlaylistTrack.objects.filter(playlist=self.playlist, track_id='42').order_by())
+
+    def test_queue_window_forward(self):
+        qs = QueueTrack.objects.filter(queue=self.queue, position__gt=positions_after(LONG // 2))
+        self.assertIndexed(qs.order_by('position')[:51])
+
+    def test_queue_window_backward(self):
+        qs = QueueTrack.objects.filter(queue=self.queue, position__lt=positions_after(LONG // 2))
+        self.assertIndexed(qs.order_by('-position')[:50])
+
+    def test_queue_track_lookup(self):
+        self.assertIndexed(QueueTrack.objects.filter(queue=self.queue, track_id='42').order_by())
+
+
+def positions_after(count):
+    return spaced_positions(1, after=spaced_positions(count)[-1])[0]
+
+
+def redis_available():
+    try:
+        return get_redis_connection('default').ping()
+    except Exception:
+        return False
+
+
+@skipUnless(redis_available(), "Needs the Redis cache backend")
+@override_settings(QUEUE_BACKEND='redis')
+class RedisQueueETagTests(TestCase):
+    """Cursor moves kept in Redis must invalidate the queue tracks ETag"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='listener', email='listener@example.com', password='pass-123')
+        queue = Queue.objects.create(user=self.user, current_track_id='0', current_position=0)
+        QueueTrack.objects.bulk_create(
+            QueueTrack(queue=queue, position=position, **track_columns(i))
+            for i, position in enumerate(spaced_positions(10))
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.addCleanup(self.drop_keys)
+
+    def drop_keys(self):
+        conn = get_redis_connection('default')
+        conn.delete(*queue_cache._keys(self.user.pk))
+        conn.srem(queue_cache.DIRTY_KEY, str(self.user.pk))
+
+    def test_window_changes_after_next(self):
+        url = '/api/playlists/queue/tracks/?around=current'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+
+        self.assertEqual(self.client.post('/api/playlists/queue/next/').status_code, 200)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
@@ -8,10 +8,15 @@ playlist_tracks = PlaylistViewSet.as_view({'get': 'tracks'})
 playlist_add_track = PlaylistViewSet.as_view({'post': 'add_track'})
 playlist_add_tracks = PlaylistViewSet.as_view({'post': 'add_tracks'})
 playlist_remove_track = PlaylistViewSet.as_view({'delete': 'remove_track'})
+playlist_move = PlaylistViewSet.as_view({'post': 'move'})
+playlist_reorder = PlaylistViewSet.as_view({'post': 'reorder'})
 playlist_play = PlaylistViewSet.as_view({'post': 'play'})
+playlist_duplicate = PlaylistViewSet.as_view({'post': 'duplicate'})
+playlist_changes = PlaylistViewSet.as_view({'get': 'changes'})
 playlist_recommendations = PlaylistViewSet.as_view({'get': 'recommendations'})
 playlist_play_recommendation = PlaylistViewSet.as_view({'post': 'play_recommendation'})
 playlist_generate = PlaylistViewSet.as_view({'post': 'generate'})
+playlist_generate_job = PlaylistViewSet.as_view({'get': 'generate_job'})
 
 # Queue URLs
 queue_list = QueueViewSet.as_view({'get': 'list'})
@@ -23,6 +28,9 @@ queue_clear = QueueViewSet.as_view({'post': 'clear'})
 queue_current = QueueViewSet.as_view({'get': 'current'})
 queue_position = QueueViewSet.as_view({'post': 'position'})
 queue_shuffle = QueueViewSet.as_view({'post': 'shuffle'})
+queue_unshuffle = QueueViewSet.as_view({'post': 'unshuffle'})
+queue_move = QueueViewSet.as_view({'post': 'move'})
+queue_reorder = QueueViewSet.as_view({'post': 'reorder'})
 queue_stream = QueueViewSet.as_view({'post': 'stream'})
 queue_history = QueueViewSet.as_view({'get': 'history'})
 
@@ -33,11 +41,16 @@ urlpatterns = [
     path('<uuid:pk>/add_track/', playlist_add_track, name='playlist-add-track'),
     path('<uuid:pk>/add_tracks/', playlist_add_tracks, name='playlist-add-tracks'),
     path('<uuid:pk>/remove_track/', playlist_remove_track, name='playlist-remove-track'),
+    path('<uuid:pk>/move/', playlist_move, name='playlist-move'),
+    path('<uuid:pk>/reorder/', playlist_reorder, name='playlist-reorder'),
     path('<uuid:pk>/play/', playlist_play, name='playlist-play'),
+    path('<uuid:pk>/duplicate/', playlist_duplicate, name='playlist-duplicate'),
+    path('<uuid:pk>/changes/', playlist_changes, name='playlist-changes'),
 
     path('recommendations/', playlist_recommendations, name='playlist-recommendations'),
     path('play-recommendation/', playlist_play_recommendation, name='playlist-play-recommendation'),
     path('generate/', playlist_generate, name='playlist-generate'),
+    path('generate/<uuid:job_id>/', playlist_generate_job, name='playlist-generate-job'),
 
     path('queue/', queue_list, name='queue-list'),
     path('queue/next/', queue_next, name='queue-next'),
@@ -48,6 +61,9 @@ urlpatterns = [
     path('queue/current/', queue_current, name='queue-current'),
     path('queue/position/', queue_position, name='queue-position'),
     path('queue/shuffle/', queue_shuffle, name='queue-shuffle'),
+    path('queue/unshuffle/', queue_unshuffle, name='queue-unshuffle'),
+    path('queue/move/', queue_move, name='queue-move'),
+    path('queue/reorder/', queue_reorder, name='queue-reorder'),
     path('queue/stream/', queue_stream, name='queue-stream'),
     path('queue/history/', queue_history, name='queue-history'),
 ]
@@ -0,0 +1,19 @@
+TRACK_COLUMNS = (
+    'track_id', 'artist_id', 'track_title', 'artist_name',
+    'album_title', 'album_cover', 'genre_id', 'genre', 'duration',
+)
+
+
+def track_fields(data):
+    """Denormalised track columns shared by PlaylistTrack and QueueTrack, taken from a Deezer track document"""
+    artist = data.get('artist') or {}
+    album = data.get('album') or {}
+    return {
+        'track_id': str(data.get('id')),
+        'artist_id': str(artist.get('id', '')),
+        'track_title': data.get('title', ''),
+        'artist_name': artist.get('name', ''),
+        'album_title': album.get('title', ''),
+        'album_cover': album.get('cover_medium') or album.get('cover') or '',
+        'duration': data.get('duration', 0),
+    }
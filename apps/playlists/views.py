@@ -1,29 +1,183 @@
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.urls import reverse
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from django.db.models import Q, Max
 import random
 
 from apps.deezer.client import deezer_client
 from apps.accounts.models import PlaybackHistory
 from apps.accounts.serializers import PlaybackHistorySerializer
-from .models import Playlist, PlaylistTrack, Queue, QueueTrack
+from apps.accounts.favorites import favorites_version, mark_favorites
+from apps.recommendations import precompute, similarity, taste
+from apps.recommendations.embeddings import similar_tracks
+from .models import Playlist, PlaylistTrack, Queue, QueueTrack, GenerationJob
 from .serializers import (
     PlaylistSerializer, PlaylistDetailSerializer,
     PlaylistTrackSerializer, PlaylistTrackAddSerializer,
     QueueSerializer, QueueTrackSerializer, QueueTrackAddSerializer,
-    QueueUpdateSerializer, RecommendedPlaylistSerializer
+    QueueUpdateSerializer, RecommendedPlaylistSerializer,
+    TrackMoveSerializer, TrackReorderSerializer, GenerationJobSerializer
 )
+from .utils import track_fields
+from .copying import copy_tracks
+from .changes import changes_since
+from . import queue_engine, queue_cache, radio
+from .ordering import lock, spaced_positions, append_positions, place, index_of
 from .permissions import IsPlaylistOwner, IsPlaylistOwnerOrReadOnly, IsQueueOwner
-from .tasks import generate_radio_recommendations, generate_recommended_playlists
+from .tasks import (
+    generate_radio_recommendations, generate_recommended_playlists, rebalance_positions, generate_playlist
+)
 from apps.core.cache import get_cached_data, cache_data
+from apps.core.etag import version_etag, not_modified, with_etag
+from apps.core.pagination import (
+    KeysetPagination, HistoryPagination, PositionPagination, encode_cursor, decode_cursor
+)
 
 
 RECOMMENDATION_CACHE = {}
 
+
+def _apply_moves(parent, kind, siblings, moves):
+    """
+    Apply validated {track_id, before | after} moves under the parent lock.
+    Every move rewrites only the moved row; when the gaps run low a
+    background rebalance is scheduled after commit.
+    """
+    moved = []
+    needs_rebalance = False
+    with transaction.atomic():
+        lock(parent)
+        for move in moves:
+            anchor_id = move.get('before', move.get('after'))
+            rows = {row.track_id: row for row in siblings.filter(track_id__in=[move['track_id'], anchor_id])}
+            if move['track_id'] not in rows or anchor_id not in rows:
+                raise Http404(f"Track {move['track_id'] if move['track_id'] not in rows else anchor_id} not found")
+            anchor = rows[anchor_id]
+            if 'before' in move:
+                needs_rebalance |= place(siblings, rows[move['track_id']], before=anchor)
+            else:
+                needs_rebalance |= place(siblings, rows[move['track_id']], after=anchor)
+            moved.append(rows[move['track_id']])
+        if kind == 'playlist':
+            parent.bump_version(moved=moves)
+        else:
+            parent.bump_version()
+        if needs_rebalance:
+            transaction.on_commit(lambda: rebalance_positions.delay(kind, str(parent.pk)))
+    return moved
+
+
+def _queue_page(request, queue):
+    """
+    One page of queue entries in play order as {next, previous, results}.
+    Cursors carry the play index and, for unshuffled queues, the stored
+    position at the page edge to seek from; ?around=current opens a window
+    around the current track.
+    """
+    paginator = KeysetPagination()
+    size = paginator.get_page_size(request)
+    token = request.query_params.get(paginator.cursor_query_param)
+    cursor = decode_cursor(token) if token else {}
+    try:
+        if 'e' in cursor:
+            # Backwards from the first entry of a later page
+            end = int(cursor['e'])
+            index = max(end - size, 0)
+            entries, keys = queue_engine.window(queue, index, end - index, before=cursor.get('b'))
+        elif not token and request.query_params.get('around') == 'current':
+            index, entries, keys = queue_engine.around_current(queue, size + 1)
+        else:
+            index = int(cursor.get('i', 0))
+            entries, keys = queue_engine.window(queue, index, size + 1, after=cursor.get('a'))
+    except (TypeError, ValueError):
+        raise NotFound('Invalid cursor')
+
+    more = len(entries) > size or 'e' in cursor
+    entries = entries[:size]
+    url = remove_query_param(request.build_absolute_uri(), 'around')
+    next_link = previous_link = None
+    if more and entries:
+        next_cursor = {'i': index + len(entries)}
+        if keys:
+            next_cursor['a'] = keys[len(entries) - 1]
+        next_link = replace_query_param(url, paginator.cursor_query_param, encode_cursor(next_cursor))
+    if index > 0 and entries:
+        previous_cursor = {'e': index}
+        if keys:
+            previous_cursor['b'] = keys[0]
+        previous_link = replace_query_param(url, paginator.cursor_query_param, encode_cursor(previous_cursor))
+
+    serializer = QueueTrackSerializer(entries, many=True, context={'request': request})
+    return Response({'next': next_link, 'previous': previous_link, 'results': serializer.data})
+
+
+def _hydrated(track_ids):
+    """Documents for the tracks from the cache and mirror only, so Deezer is never called"""
+    if not track_ids:
+        return []
+    found = deezer_client.get_tracks(track_ids, fetch_missing=False)
+    return [found[track_id] for track_id in track_ids if track_id in found]
+
+
+def _model_recommendations(user, limit=20):
+    """Tracks from the co-listening model"""
+    return _hydrated([track_id for track_id, _ in similarity.recommend(user.id, limit)])
+
+
+def _deezer_recommendations(user):
+    """Tracks related to the user's recent plays and artists, asked of Deezer"""
+    tracks = []
+    user_playback_history = PlaybackHistory.objects.filter(user=user).order_by('-timestamp')[:20]
+    
+    if user_playback_history:
+        # Favourite artists over the whole history, not just the last 20 plays
+        artist_ids = taste.top_artists(user.id, 5)
+        track_ids = []
+        
+        for item in user_playback_history:
+            if item.track_id and item.track_id not in track_ids:
+                track_ids.append(item.track_id)
+        
+        if track_ids:
+            tracks = deezer_client.get_track_recommendations(track_ids[0])
+        
+        if not tracks and artist_ids:
+            for artist_id in artist_ids[:5]:
+                artist_tracks = deezer_client.get_artist_top_tracks(artist_id, limit=3)
+                if artist_tracks:
+                    tracks.extend(artist_tracks)
+                    if len(tracks) >= 10:
+                        break
+        
+        if not tracks and artist_ids:
+            for artist_id in artist_ids[:3]:
+                related_artists = deezer_client.get_related_artists(artist_id)
+                if related_artists:
+                    for related_artist in related_artists[:3]:
+                        related_id = related_artist.get('id')
+                        if related_id:
+                            artist_tracks = deezer_client.get_artist_top_tracks(related_id, limit=3)
+                            if artist_tracks:
+                                tracks.extend(artist_tracks)
+                                if len(tracks) >= 10:
+                                    break
+        
+        if not tracks:
+            tracks = deezer_client.get_top_charts(limit=10)
+        
+    else:
+        tracks = deezer_client.get_top_charts(limit=10)
+
+    return tracks
+
+
 class PlaylistViewSet(viewsets.ModelViewSet):
     """
     API endpoint for managing playlists.
@@ -58,15 +212,32 @@ class PlaylistViewSet(viewsets.ModelViewSet):
             self.queryset = Playlist.objects.filter(user=request.user)
         return super().list(request, *args, **kwargs)
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve a playlist with its tracks.
+        Honours If-None-Match using the playlist's version counter, so an
+        unchanged playlist costs a single indexed lookup and an empty 304.
+        """
+        etag = None
+        row = self.get_queryset().filter(pk=kwargs.get('pk')).values_list('version', 'updated_at').first()
+        if row:
+            etag = version_etag('playlist', kwargs.get('pk'), *row, variant=favorites_version(request.user.pk))
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
+        return with_etag(super().retrieve(request, *args, **kwargs), etag)
+
     @action(detail=True, methods=['get'])
     def tracks(self, request, pk=None):
         """
-        List all tracks in a playlist.
+        List the tracks of a playlist in order, a page at a time (?cursor=, ?page_size=).
         """
         playlist = self.get_object()
-        tracks = PlaylistTrack.objects.filter(playlist=playlist).order_by('position')
-        serializer = PlaylistTrackSerializer(tracks, many=True)
-        return Response(serializer.data)
+        tracks = PlaylistTrack.objects.filter(playlist=playlist)
+        paginator = PositionPagination()
+        page = paginator.paginate_queryset(tracks, request, view=self)
+        serializer = PlaylistTrackSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsPlaylistOwner])
     def add_track(self, request, pk=None):
@@ -100,19 +271,22 @@ class PlaylistViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Track not found'}, status=status.HTTP_404_NOT_FOUND)
         art = data.get('artist') or {}
         alb = data.get('album') or {}
-        pos = PlaylistTrack.objects.filter(playlist=pl).count()
-        item = PlaylistTrack.objects.create(
-            playlist=pl,
-            track_id=str(data.get('id')),
-            artist_id=str(art.get('id', '')),
-            track_title=data.get('title', ''),
-            artist_name=art.get('name', ''),
-            album_title=alb.get('title', ''),
-            album_cover=alb.get('cover_medium') or alb.get('cover') or '',
-            duration=data.get('duration', 0),
-            position=pos
-        )
-        return Response(PlaylistTrackSerializer(item).data, status=status.HTTP_201_CREATED)
+        with transaction.atomic():
+            lock(pl)
+            pos = append_positions(PlaylistTrack.objects.filter(playlist=pl))[0]
+            item = PlaylistTrack.objects.create(
+                playlist=pl,
+                track_id=str(data.get('id')),
+                artist_id=str(art.get('id', '')),
+                track_title=data.get('title', ''),
+                artist_name=art.get('name', ''),
+                album_title=alb.get('title', ''),
+                album_cover=alb.get('cover_medium') or alb.get('cover') or '',
+                duration=data.get('duration', 0),
+                position=pos
+            )
+            pl.bump_version(added=[item])
+        return Response(PlaylistTrackSerializer(item, context={'request': request}).data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsPlaylistOwner])
     def add_tracks(self, request, pk=None):
@@ -131,7 +305,7 @@ class PlaylistViewSet(viewsets.ModelViewSet):
               description: List of Deezer track IDs to add
         responses:
           201:
-            description: Tracks added successfully
+            description: Tracks added, with a per-ID status of added, already_present, not_found or invalid
           400:
             description: Invalid request format
         """
@@ -139,35 +313,61 @@ class PlaylistViewSet(viewsets.ModelViewSet):
         arr = request.data.get('tracks', [])
         if not isinstance(arr, list):
             return Response({'detail': 'tracks must be a list'}, status=status.HTTP_400_BAD_REQUEST)
-        added = 0
-        pos = PlaylistTrack.objects.filter(playlist=pl).count()
-        with transaction.atomic():
-            for tid in arr:
-                try:
-                    tid = int(tid)
-                except:
-                    continue
-                if PlaylistTrack.objects.filter(playlist=pl, track_id=tid).exists():
-                    continue
-                data = deezer_client.get_track(tid)
-                if not data or data.get('error'):
-                    continue
-                art = data.get('artist') or {}
-                alb = data.get('album') or {}
-                PlaylistTrack.objects.create(
-                    playlist=pl,
-                    track_id=str(data.get('id')),
-                    artist_id=str(art.get('id', '')),
-                    track_title=data.get('title', ''),
-                    artist_name=art.get('name', ''),
-                    album_title=alb.get('title', ''),
-                    album_cover=alb.get('cover_medium') or alb.get('cover') or '',
-                    duration=data.get('duration', 0),
-                    position=pos
+
+        results = {}
+        wanted = []
+        for tid in arr:
+            try:
+                tid = str(int(tid))
+            except (TypeError, ValueError):
+                results[str(tid)] = 'invalid'
+                continue
+            if tid not in results:
+                results[tid] = None
+                wanted.append(tid)
+
+        existing = set(
+            PlaylistTrack.objects.filter(playlist=pl, track_id__in=wanted).values_list('track_id', flat=True)
+        )
+        missing = [tid for tid in wanted if tid not in existing]
+        for tid in existing:
+            results[tid] = 'already_present'
+
+        # Hydrate outside the transaction so no lock is held across Deezer round trips
+        documents = deezer_client.get_tracks(missing) if missing else {}
+
+        rows = []
+        for tid in missing:
+            data = documents.get(tid)
+            if not data or data.get('error'):
+                results[tid] = 'not_found'
+                continue
+            rows.append(PlaylistTrack(playlist=pl, **track_fields(data)))
+            results[tid] = 'added'
+
+        if rows:
+            with transaction.atomic():
+                lock(pl)
+                # Re-check under the lock so the counters only move by rows actually inserted
+                raced = set(
+                    PlaylistTrack.objects.filter(playlist=pl, track_id__in=[row.track_id for row in rows])
+                    .values_list('track_id', flat=True)
                 )
-                pos += 1
-                added += 1
-        return Response({'added_count': added, 'total': pos}, status=status.HTTP_201_CREATED)
+                for tid in raced:
+                    results[tid] = 'already_present'
+                rows = [row for row in rows if row.track_id not in raced]
+                positions = append_positions(PlaylistTrack.objects.filter(playlist=pl), len(rows))
+                for row, position in zip(rows, positions):
+                    row.position = position
+                if rows:
+                    PlaylistTrack.objects.bulk_create(rows)
+                    pl.bump_version(added=rows)
+
+        return Response({
+            'added_count': len(rows),
+            'total': pl.track_count,
+            'results': [{'track_id': tid, 'status': result} for tid, result in results.items()],
+        }, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['delete'])
     def remove_track(self, request, pk=None):
@@ -195,19 +395,75 @@ class PlaylistViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'track_id is required'}, status=status.HTTP_400_BAD_REQUEST)
             
         track = get_object_or_404(PlaylistTrack, playlist=playlist, track_id=track_id)
-        position = track.position
-        track.delete()
-        
+        # Positions are sparse, so the rows after it keep theirs
         with transaction.atomic():
-            tracks_to_update = PlaylistTrack.objects.filter(
-                playlist=playlist, 
-                position__gt=position
-            )
-            for track in tracks_to_update:
-                track.position -= 1
-                track.save()
+            deleted, _ = track.delete()
+            if deleted:
+                playlist.bump_version(removed=[track])
                 
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsPlaylistOwner])
+    def move(self, request, pk=None):
+        """
+        Move a track directly before or after another track of the playlist.
+        ---
+        request_body:
+          type: object
+          required:
+            - track_id
+          properties:
+            track_id:
+              type: string
+              description: Deezer track ID to move
+            before:
+              type: string
+              description: Track ID to move it in front of
+            after:
+              type: string
+              description: Track ID to move it behind
+        responses:
+          200:
+            description: Track moved
+          400:
+            description: Missing or invalid anchor
+          404:
+            description: Track not found in playlist
+        """
+        playlist = self.get_object()
+        ser = TrackMoveSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        moved = _apply_moves(playlist, 'playlist', PlaylistTrack.objects.filter(playlist=playlist), [ser.validated_data])
+        return Response(PlaylistTrackSerializer(moved[0], context={'request': request}).data)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsPlaylistOwner])
+    def reorder(self, request, pk=None):
+        """
+        Apply several moves at once; each one writes a single row.
+        ---
+        request_body:
+          type: object
+          required:
+            - moves
+          properties:
+            moves:
+              type: array
+              items:
+                type: object
+              description: List of {track_id, before | after} moves, applied in order
+        responses:
+          200:
+            description: Tracks moved
+          400:
+            description: Missing or invalid anchor
+          404:
+            description: Track not found in playlist
+        """
+        playlist = self.get_object()
+        ser = TrackReorderSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        moved = _apply_moves(playlist, 'playlist', PlaylistTrack.objects.filter(playlist=playlist), ser.validated_data['moves'])
+        return Response(PlaylistTrackSerializer(moved, many=True, context={'request': request}).data)
         
     @action(detail=True, methods=['post'])
     def play(self, request, pk=None):
@@ -241,72 +497,120 @@ class PlaylistViewSet(viewsets.ModelViewSet):
             start_position = 0
             
         tracks = PlaylistTrack.objects.filter(playlist=playlist).order_by('position')
+        track_count = tracks.count()
         
-        if not tracks:
+        if not track_count:
             return Response({'detail': 'Playlist is empty'}, status=status.HTTP_400_BAD_REQUEST)
             
-        if start_position >= tracks.count():
+        if not 0 <= start_position < track_count:
             start_position = 0
             
         queue, _ = Queue.objects.get_or_create(user=request.user)
-        QueueTrack.objects.filter(queue=queue).delete()
+        queue_engine.clear(queue)
         
+        # The queue only references the playlist; rows are copied on the first edit
+        queue.source_playlist = playlist
         if shuffle:
-            tracks_to_queue = list(tracks)
-            start_track = tracks_to_queue[start_position]
-            tracks_to_queue.pop(start_position)
-            random.shuffle(tracks_to_queue)
-            tracks_to_queue.insert(0, start_track)
-            
-            position_in_queue = 0
-            for track in tracks_to_queue:
-                QueueTrack.objects.create(
-                    queue=queue,
-                    track_id=track.track_id,
-                    artist_id=track.artist_id,
-                    track_title=track.track_title,
-                    artist_name=track.artist_name,
-                    album_title=track.album_title,
-                    album_cover=track.album_cover,
-                    duration=track.duration,
-                    position=position_in_queue
-                )
-                position_in_queue += 1
+            for field, value in queue_engine.shuffle_fields(start_position, track_count).items():
+                setattr(queue, field, value)
         else:
-            position_in_queue = 0
-            for track in tracks[start_position:]:
-                QueueTrack.objects.create(
-                    queue=queue,
-                    track_id=track.track_id,
-                    artist_id=track.artist_id,
-                    track_title=track.track_title,
-                    artist_name=track.artist_name,
-                    album_title=track.album_title,
-                    album_cover=track.album_cover,
-                    duration=track.duration,
-                    position=position_in_queue
-                )
-                position_in_queue += 1
+            queue.source_offset = start_position
             
-        if position_in_queue > 0:
-            first_track = QueueTrack.objects.filter(queue=queue).order_by('position').first()
-            queue.current_track_id = first_track.track_id
-            queue.current_position = 0
-            queue.save()
+        first_track = queue_engine.track_at(queue, 0)
+        queue.current_track_id = first_track.track_id
+        queue.current_position = 0
+        queue.save()
+        queue.bump_version()
+        
+        PlaybackHistory.objects.create(
+            user=request.user,
+            track_id=first_track.track_id,
+            artist_id=first_track.artist_id,
+            track_title=first_track.track_title,
+            artist_name=first_track.artist_name,
+            album_title=first_track.album_title,
+            album_cover=first_track.album_cover,
+            position=0
+        )
             
-            PlaybackHistory.objects.create(
+        return Response(QueueSerializer(queue, context={'request': request}).data)
+        
+    @action(detail=True, methods=['get'])
+    def changes(self, request, pk=None):
+        """
+        Track operations since a version, for clients keeping a local copy.
+        Replay insert (append the track), remove and move (before or after
+        the anchor track) in order. When resync is true the log cannot
+        answer; fetch the whole playlist instead.
+        ---
+        parameters:
+          - name: since
+            in: query
+            type: integer
+            required: true
+            description: Version of the client's copy
+        responses:
+          200:
+            description: Changes since the version, or a resync instruction
+          400:
+            description: Missing or invalid since
+        """
+        try:
+            since = int(request.query_params['since'])
+        except (KeyError, ValueError):
+            return Response({'detail': 'since must be a playlist version'}, status=status.HTTP_400_BAD_REQUEST)
+        playlist = self.get_object()
+        changes = changes_since(playlist, since)
+        data = {
+            'version': playlist.version,
+            'resync': changes is None,
+            'playlist': PlaylistSerializer(playlist, context={'request': request}).data,
+            'changes': changes or [],
+        }
+        return Response(data)
+
+    @action(detail=True, methods=['post'])
+    def duplicate(self, request, pk=None):
+        """
+        Copy a playlist the user can see, their own or a public one, into a new playlist of theirs.
+        ---
+        request_body:
+          type: object
+          properties:
+            name:
+              type: string
+              description: Name of the copy (defaults to the original name with "(copy)")
+            is_public:
+              type: boolean
+              description: Whether the copy is public (defaults to false)
+        responses:
+          201:
+            description: Playlist duplicated
+          404:
+            description: Playlist not found
+        """
+        # Reading is enough to fork a playlist, so only visibility is checked, not ownership
+        source = get_object_or_404(self.get_queryset(), pk=pk)
+        name = request.data.get('name') or f"{source.name} (copy)"
+        is_public = str(request.data.get('is_public', False)).lower() in ('true', '1')
+
+        with transaction.atomic():
+            lock(source)
+            source.refresh_from_db()
+            playlist = Playlist.objects.create(
                 user=request.user,
-                track_id=first_track.track_id,
-                artist_id=first_track.artist_id,
-                track_title=first_track.track_title,
-                artist_name=first_track.artist_name,
-                album_title=first_track.album_title,
-                album_cover=first_track.album_cover,
-                position=0
+                name=name,
+                description=source.description,
+                is_public=is_public,
+                track_count=source.track_count,
+                total_duration=source.total_duration,
+                cover_mosaic=source.cover_mosaic,
             )
-            
-        return Response(QueueSerializer(queue).data)
-        
+            copy_tracks(PlaylistTrack.objects.filter(playlist=source), PlaylistTrack, playlist)
+
+        serializer = PlaylistSerializer(playlist, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     @action(detail=False, methods=['get'])
     def recommendations(self, request):
         """
@@ -316,60 +620,23 @@ class PlaylistViewSet(viewsets.ModelViewSet):
           200:
             description: List of recommended tracks
         """
+        # Active users' recommendations are precomputed nightly; the rest are computed here and cached
+        precomputed = _hydrated(precompute.stored(request.user.id))
+        if precomputed:
+            return Response(mark_favorites(request, precomputed))
+
         cache_key = f"user_recommendations_{request.user.id}"
         cached_recommendations = get_cached_data(cache_key)
         
         if cached_recommendations:
-            return Response(cached_recommendations)
-            
-        tracks = []
-        user_playback_history = PlaybackHistory.objects.filter(user=request.user).order_by('-timestamp')[:20]
-        
-        if user_playback_history:
-            genres = []
-            artist_ids = []
-            track_ids = []
+            return Response(mark_favorites(request, cached_recommendations))
             
-            for item in user_playback_history:
-                if item.artist_id and item.artist_id not in artist_ids:
-                    artist_ids.append(item.artist_id)
-                if item.track_id and item.track_id not in track_ids:
-                    track_ids.append(item.track_id)
-            
-            if track_ids:
-                tracks = deezer_client.get_track_recommendations(track_ids[0])
-            
-            if not tracks and artist_ids:
-                for artist_id in artist_ids[:5]:
-                    artist_tracks = deezer_client.get_artist_top_tracks(artist_id, limit=3)
-                    if artist_tracks:
-                        tracks.extend(artist_tracks)
-                        if len(tracks) >= 10:
-                            break
-            
-            if not tracks and artist_ids:
-                for artist_id in artist_ids[:3]:
-                    related_artists = deezer_client.get_related_artists(artist_id)
-                    if related_artists:
-                        for related_artist in related_artists[:3]:
-                            related_id = related_artist.get('id')
-                            if related_id:
-                                artist_tracks = deezer_client.get_artist_top_tracks(related_id, limit=3)
-                                if artist_tracks:
-                                    tracks.extend(artist_tracks)
-                                    if len(tracks) >= 10:
-                                        break
-            
-            if not tracks:
-                tracks = deezer_client.get_top_charts(limit=10)
-            
-        else:
-            tracks = deezer_client.get_top_charts(limit=10)
-        
+        tracks = _model_recommendations(request.user) or _deezer_recommendations(request.user)
+
         if tracks:
             cache_data(cache_key, tracks, timeout=3600)
             
-        return Response(tracks)
+        return Response(mark_favorites(request, tracks))
     
     @action(detail=False, methods=['post'])
     def play_recommendation(self, request):
@@ -401,59 +668,32 @@ class PlaylistViewSet(viewsets.ModelViewSet):
         if not track_data:
             return Response({"detail": "Track not found"}, status=status.HTTP_404_NOT_FOUND)
             
-        queue = Queue.objects.filter(user=request.user).first()
-        if not queue:
-            queue = Queue.objects.create(user=request.user)
-            
-        QueueTrack.objects.filter(queue=queue).delete()
-        
-        artist_name = track_data.get('artist', {}).get('name', '')
-        album_title = track_data.get('album', {}).get('title', '')
-        album_cover = track_data.get('album', {}).get('cover', '')
-        artist_id = track_data.get('artist', {}).get('id', '')
-        
-        queue_track = QueueTrack.objects.create(
-            queue=queue,
-            track_id=track_id,
-            track_title=track_data.get('title', ''),
-            artist_name=artist_name,
-            artist_id=artist_id,
-            album_title=album_title,
-            album_cover=album_cover,
-            duration=track_data.get('duration', 0),
-            position=0
-        )
-        
-        queue.current_track_id = track_id
-        queue.save()
-        
-        similar_tracks = deezer_client.get_track_recommendations(track_id)
-        
-        if similar_tracks:
-            for i, track in enumerate(similar_tracks[:20]):
-                if str(track.get('id')) != str(track_id):
-                    artist = track.get('artist', {})
-                    album = track.get('album', {})
-                    
-                    QueueTrack.objects.create(
-                        queue=queue,
-                        track_id=track.get('id'),
-                        track_title=track.get('title', ''),
-                        artist_name=artist.get('name', ''),
-                        artist_id=artist.get('id', ''),
-                        album_title=album.get('title', ''),
-                        album_cover=album.get('cover', ''),
-                        duration=track.get('duration', 0),
-                        position=i + 1
-                    )
+        # The seed track first, then up to 20 similar tracks without it or repeats
+        tracks = [track_data] + radio.pick(similar_tracks([track_id], limit=20), {str(track_id)}, 20)
+
+        queue, _ = Queue.objects.get_or_create(user=request.user)
+        with transaction.atomic():
+            lock(queue)
+            queue_engine.clear(queue)
+            # Radio keeps refilling this queue as it runs low
+            queue.radio = True
+            queue.current_track_id = track_id
+            queue.save()
+            QueueTrack.objects.bulk_create([
+                QueueTrack(queue=queue, position=position, **track_fields(track))
+                for track, position in zip(tracks, spaced_positions(len(tracks)))
+            ])
+            queue.bump_version()
                     
-        serializer = QueueSerializer(queue)
+        serializer = QueueSerializer(queue, context={'request': request})
         return Response(serializer.data)
     
     @action(detail=False, methods=['post'])
     def generate(self, request):
         """
         Generate a new playlist based on a specified genre.
+        Generation runs as a background job, returned straight away to
+        poll at generate/<job_id>/.
         ---
         request_body:
           type: object
@@ -470,90 +710,40 @@ class PlaylistViewSet(viewsets.ModelViewSet):
               type: string
               description: Optional custom name for the playlist
         responses:
-          201:
-            description: Playlist generated successfully
+          202:
+            description: Generation job accepted
           400:
             description: Missing genre information
-          404:
-            description: No tracks found for genre
         """
         genre = request.data.get('genre')
         genre_id = request.data.get('genre_id')
         name = request.data.get('name')
-        
+
         if not (genre or genre_id):
             return Response({'detail': 'Either genre or genre_id is required'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if genre and not genre_id:
-            try:
-                int_genre = int(genre)
-                genre_id = int_genre
-                genre = None
-            except (ValueError, TypeError):
-                pass
-        
-        genre_info = None
-        genre_name = None
-        if genre_id:
-            genre_info = deezer_client.get_genre(genre_id)
-            if genre_info and 'name' in genre_info:
-                genre_name = genre_info['name']
-        
-        if not name:
-            if genre_name:
-                name = f"{genre_name} Mix"
-            elif genre:
-                name = f"{genre.title()} Mix"
-            else:
-                name = "Genre Mix"
-        
-        tracks = []
-        if genre_id:
-            tracks = deezer_client.get_genre_tracks_by_id(genre_id, limit=30)
-        else:
-            tracks = deezer_client.get_genre_tracks(genre, limit=30)
-        
-        if not tracks:
-            if genre_name:
-                search_query = f'genre:"{genre_name}"'
-                search_results = deezer_client.search_tracks(search_query, limit=30)
-                if search_results:
-                    tracks = search_results
-        
-        if not tracks:
-            return Response({'detail': 'No tracks found for genre'}, status=status.HTTP_404_NOT_FOUND)
-        
 
-        description = f"A playlist of {genre_name or genre or 'genre'} music"
-        playlist = Playlist.objects.create(
+        job = GenerationJob.objects.create(
             user=request.user,
-            name=name,
-            description=description
+            params={'genre': genre, 'genre_id': genre_id, 'name': name},
         )
-        
-        for i, track in enumerate(tracks):
-            artist = track.get('artist', {})
-            album = track.get('album', {})
-            genre_info = track.get('genre', {})
-            genre_name = genre_info.get('name', '') if isinstance(genre_info, dict) else ''
-            track_genre_id = genre_info.get('id', '') if isinstance(genre_info, dict) else ''
-            
-            PlaylistTrack.objects.create(
-                playlist=playlist,
-                track_id=track.get('id'),
-                track_title=track.get('title', ''),
-                artist_name=artist.get('name', ''),
-                artist_id=artist.get('id', ''),
-                album_title=album.get('title', ''),
-                album_cover=album.get('cover', ''),
-                genre=genre_name,
-                genre_id=track_genre_id,
-                duration=track.get('duration', 0),
-                position=i
-            )
-        
-        serializer = PlaylistDetailSerializer(playlist)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        generate_playlist.delay(str(job.pk))
+        return self._job_response(request, job)
+
+    def generate_job(self, request, job_id=None):
+        """Poll a generation job; once it has succeeded this returns the playlist"""
+        job = get_object_or_404(GenerationJob.objects.select_related('playlist'), pk=job_id, user=request.user)
+        return self._job_response(request, job)
+
+    def _job_response(self, request, job):
+        if job.status == GenerationJob.SUCCEEDED and job.playlist is not None:
+            serializer = PlaylistDetailSerializer(job.playlist, context={'request': request})
+            return Response(serializer.data)
+        if job.status == GenerationJob.FAILED:
+            return Response({'detail': job.detail, 'job': GenerationJobSerializer(job).data},
+                            status=status.HTTP_404_NOT_FOUND)
+        response = Response(GenerationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        response['Location'] = request.build_absolute_uri(reverse('playlist-generate-job', kwargs={'job_id': job.pk}))
+        return response
 
 class QueueViewSet(viewsets.ModelViewSet):
     """
@@ -564,13 +754,26 @@ class QueueViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Get the queue for the current user"""
+        self._sync_cursor()
         return Queue.objects.filter(user=self.request.user)
 
     def get_object(self):
         """Get or create queue for the current user"""
+        self._sync_cursor()
         q, _ = Queue.objects.get_or_create(user=self.request.user)
         return q
 
+    def _sync_cursor(self):
+        """Write back a cursor moved in Redis before reading or editing the stored queue"""
+        if queue_cache.enabled():
+            queue_cache.flush([self.request.user.pk])
+
+    def _cached_move(self, request, mode, value=0, **record):
+        """Navigate in Redis when the Redis queue backend is on; None means use the database"""
+        if not queue_cache.enabled():
+            return None
+        return queue_cache.move(request.user.pk, mode, value, **record)
+
     def get_serializer_class(self):
         """Return appropriate serializer based on request method"""
         if self.request.method == 'PATCH':
@@ -602,6 +805,7 @@ class QueueViewSet(viewsets.ModelViewSet):
         ser = QueueTrackAddSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
         tid = ser.validated_data['track_id']
+        queue_engine.materialize(q)
         if QueueTrack.objects.filter(queue=q, track_id=tid).exists():
             return Response({'detail': 'Already in queue'}, status=status.HTTP_400_BAD_REQUEST)
         data = deezer_client.get_track(tid)
@@ -609,52 +813,89 @@ class QueueViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Track not found'}, status=status.HTTP_404_NOT_FOUND)
         art = data.get('artist') or {}
         alb = data.get('album') or {}
-        pos = QueueTrack.objects.filter(queue=q).count()
-        qt = QueueTrack.objects.create(
-            queue=q,
-            track_id=str(data.get('id')),
-            artist_id=str(art.get('id', '')),
-            track_title=data.get('title', ''),
-            artist_name=art.get('name', ''),
-            album_title=alb.get('title', ''),
-            album_cover=alb.get('cover_medium') or alb.get('cover') or '',
-            duration=data.get('duration', 0),
-            position=pos
-        )
+        with transaction.atomic():
+            lock(q)
+            pos = append_positions(QueueTrack.objects.filter(queue=q))[0]
+            qt = QueueTrack.objects.create(
+                queue=q,
+                track_id=str(data.get('id')),
+                artist_id=str(art.get('id', '')),
+                track_title=data.get('title', ''),
+                artist_name=art.get('name', ''),
+                album_title=alb.get('title', ''),
+                album_cover=alb.get('cover_medium') or alb.get('cover') or '',
+                duration=data.get('duration', 0),
+                position=pos
+            )
+            q.bump_version()
         
         if not q.current_track_id:
             q.current_track_id = qt.track_id
-            q.current_position = qt.position
+            q.current_position = index_of(QueueTrack.objects.filter(queue=q), qt)
             q.save()
             
-        return Response(QueueTrackSerializer(qt).data, status=status.HTTP_201_CREATED)
+        return Response(QueueTrackSerializer(qt, context={'request': request}).data, status=status.HTTP_201_CREATED)
         
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def tracks(self, request):
         """
-        List all tracks in the user's queue.
+        List the tracks in the user's queue in play order, a page at a time.
         ---
+        parameters:
+          - name: cursor
+            in: query
+            required: false
+            schema:
+              type: string
+            description: Opaque cursor from a previous page's next or previous link
+          - name: page_size
+            in: query
+            required: false
+            schema:
+              type: integer
+          - name: around
+            in: query
+            required: false
+            schema:
+              type: string
+            description: "current" to start with a page around the current track
         responses:
           200:
-            description: List of tracks in queue
+            description: A page of queue tracks with next and previous links
         """
-        queue = self.get_object()
-        tracks = QueueTrack.objects.filter(queue=queue).order_by('position')
-        serializer = QueueTrackSerializer(tracks, many=True)
-        return Response(serializer.data)
+        # A cursor moved in Redis changes updated_at once written back, so sync before reading it
+        self._sync_cursor()
+        etag = None
+        row = (
+            Queue.objects.filter(user=request.user)
+            .values_list('pk', 'version', 'updated_at', 'source_playlist__version')
+            .first()
+        )
+        if row:
+            # A lazy queue also changes whenever its source playlist does
+            *row, source_version = row
+            etag = version_etag('queue', *row, variant=f"{favorites_version(request.user.pk)}.{source_version}")
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
+
+        queue, _ = Queue.objects.get_or_create(user=request.user)
+        return with_etag(_queue_page(request, queue), etag)
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def history(self, request):
         """
-        Get user's playback history.
+        Get user's playback history, most recent first, a page at a time.
         ---
         responses:
           200:
-            description: List of recently played tracks
+            description: A page of recently played tracks with next and previous links
         """
-        history = PlaybackHistory.objects.filter(user=request.user).order_by('-timestamp')[:50]
-        serializer = PlaybackHistorySerializer(history, many=True, context={'request': request})
-        return Response(serializer.data)
+        history = PlaybackHistory.objects.filter(user=request.user)
+        paginator = HistoryPagination()
+        page = paginator.paginate_queryset(history, request, view=self)
+        serializer = PlaybackHistorySerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
         
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
     def stream(self, request):
@@ -675,19 +916,25 @@ class QueueViewSet(viewsets.ModelViewSet):
           404:
             description: Track not found
         """
-        queue = self.get_object()
         track_id = request.data.get('track_id')
-        
+        if track_id:
+            result = self._cached_move(request, 'track', track_id, record_arrived=0)
+        else:
+            result = self._cached_move(request, 'step', 0, record_arrived=0)
+        if result:
+            return Response(queue_cache.with_favorite(request, result[2]))
+
+        queue = self.get_object()
         if not track_id:
             if not queue.current_track_id:
                 return Response({'detail': 'No current track'}, status=status.HTTP_400_BAD_REQUEST)
             track_id = queue.current_track_id
         
         try:
-            track = QueueTrack.objects.get(queue=queue, track_id=track_id)
+            index, track = queue_engine.get(queue, track_id)
             
             queue.current_track_id = track.track_id
-            queue.current_position = track.position
+            queue.current_position = index
             queue.save()
             
             PlaybackHistory.objects.create(
@@ -701,7 +948,7 @@ class QueueViewSet(viewsets.ModelViewSet):
                 position=0
             )
             
-            return Response(QueueTrackSerializer(track).data)
+            return Response(QueueTrackSerializer(track, context={'request': request}).data)
             
         except QueueTrack.DoesNotExist:
             data = deezer_client.get_track(track_id)
@@ -710,22 +957,25 @@ class QueueViewSet(viewsets.ModelViewSet):
                 
             art = data.get('artist') or {}
             alb = data.get('album') or {}
-            pos = QueueTrack.objects.filter(queue=queue).count()
-            
-            track = QueueTrack.objects.create(
-                queue=queue,
-                track_id=str(data.get('id')),
-                artist_id=str(art.get('id', '')),
-                track_title=data.get('title', ''),
-                artist_name=art.get('name', ''),
-                album_title=alb.get('title', ''),
-                album_cover=alb.get('cover_medium') or alb.get('cover') or '',
-                duration=data.get('duration', 0),
-                position=pos
-            )
+            queue_engine.materialize(queue)
+            with transaction.atomic():
+                lock(queue)
+                pos = append_positions(QueueTrack.objects.filter(queue=queue))[0]
+                track = QueueTrack.objects.create(
+                    queue=queue,
+                    track_id=str(data.get('id')),
+                    artist_id=str(art.get('id', '')),
+                    track_title=data.get('title', ''),
+                    artist_name=art.get('name', ''),
+                    album_title=alb.get('title', ''),
+                    album_cover=alb.get('cover_medium') or alb.get('cover') or '',
+                    duration=data.get('duration', 0),
+                    position=pos
+                )
+                queue.bump_version()
             
             queue.current_track_id = track.track_id
-            queue.current_position = track.position
+            queue.current_position = index_of(QueueTrack.objects.filter(queue=queue), track)
             queue.save()
             
             PlaybackHistory.objects.create(
@@ -739,7 +989,7 @@ class QueueViewSet(viewsets.ModelViewSet):
                 position=0
             )
             
-            return Response(QueueTrackSerializer(track).data)
+            return Response(QueueTrackSerializer(track, context={'request': request}).data)
         
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
     def next(self, request):
@@ -754,12 +1004,20 @@ class QueueViewSet(viewsets.ModelViewSet):
           404:
             description: End of queue reached or track not found
         """
+        result = self._cached_move(request, 'step', 1, record_left=0, record_when_blocked=True)
+        if result:
+            moved, index, entry, size, is_radio = result
+            radio.refill_if_low(request.user.pk, size - index - 1, is_radio)
+            if not moved:
+                return Response({'detail': 'End of queue reached'}, status=status.HTTP_404_NOT_FOUND)
+            return Response(queue_cache.with_favorite(request, entry))
+
         queue = self.get_object()
         if not queue.current_track_id:
             return Response({'detail': 'No current track'}, status=status.HTTP_400_BAD_REQUEST)
             
         try:
-            current_track = QueueTrack.objects.get(queue=queue, track_id=queue.current_track_id)
+            index, current_track = queue_engine.current(queue)
             
             PlaybackHistory.objects.create(
                 user=request.user,
@@ -771,17 +1029,17 @@ class QueueViewSet(viewsets.ModelViewSet):
                 album_cover=current_track.album_cover
             )
             
-            next_track = QueueTrack.objects.filter(
-                queue=queue, 
-                position__gt=current_track.position
-            ).order_by('position').first()
+            next_track = queue_engine.track_at(queue, index + 1)
             
             if next_track:
                 queue.current_track_id = next_track.track_id
-                queue.current_position = next_track.position
+                queue.current_position = index + 1
                 queue.save()
-                return Response(QueueTrackSerializer(next_track).data)
+                if queue.radio:
+                    radio.refill_if_low(request.user.pk, queue_engine.length(queue) - index - 2, queue.radio)
+                return Response(QueueTrackSerializer(next_track, context={'request': request}).data)
             else:
+                radio.refill_if_low(request.user.pk, 0, queue.radio)
                 return Response({'detail': 'End of queue reached'}, status=status.HTTP_404_NOT_FOUND)
                 
         except QueueTrack.DoesNotExist:
@@ -800,38 +1058,37 @@ class QueueViewSet(viewsets.ModelViewSet):
           404:
             description: No previous track or track not found
         """
+        result = self._cached_move(request, 'step', -1, record_arrived=0)
+        if result:
+            return Response(queue_cache.with_favorite(request, result[2]))
+
         queue = self.get_object()
         if not queue.current_track_id:
             return Response({'detail': 'No current track'}, status=status.HTTP_400_BAD_REQUEST)
             
         try:
-            current_track = QueueTrack.objects.get(queue=queue, track_id=queue.current_track_id)
+            index, current_track = queue_engine.current(queue)
+            prev_track = queue_engine.track_at(queue, index - 1)
             
-            if current_track.position > 0:
-                prev_track = QueueTrack.objects.filter(
-                    queue=queue, 
-                    position=current_track.position - 1
-                ).first()
+            if prev_track:
+                queue.current_track_id = prev_track.track_id
+                queue.current_position = index - 1
+                queue.save()
                 
-                if prev_track:
-                    queue.current_track_id = prev_track.track_id
-                    queue.current_position = prev_track.position
-                    queue.save()
-                    
-                    PlaybackHistory.objects.create(
-                        user=request.user,
-                        track_id=prev_track.track_id,
-                        artist_id=prev_track.artist_id,
-                        track_title=prev_track.track_title,
-                        artist_name=prev_track.artist_name,
-                        album_title=prev_track.album_title,
-                        album_cover=prev_track.album_cover,
-                        position=0
-                    )
-                    
-                    return Response(QueueTrackSerializer(prev_track).data)
+                PlaybackHistory.objects.create(
+                    user=request.user,
+                    track_id=prev_track.track_id,
+                    artist_id=prev_track.artist_id,
+                    track_title=prev_track.track_title,
+                    artist_name=prev_track.artist_name,
+                    album_title=prev_track.album_title,
+                    album_cover=prev_track.album_cover,
+                    position=0
+                )
+                
+                return Response(QueueTrackSerializer(prev_track, context={'request': request}).data)
                 
-            return Response(QueueTrackSerializer(current_track).data)
+            return Response(QueueTrackSerializer(current_track, context={'request': request}).data)
                 
         except QueueTrack.DoesNotExist:
             return Response({'detail': 'Current track not found in queue'}, 
@@ -847,7 +1104,8 @@ class QueueViewSet(viewsets.ModelViewSet):
             description: Queue cleared successfully
         """
         queue = self.get_object()
-        QueueTrack.objects.filter(queue=queue).delete()
+        queue_engine.clear(queue)
+        queue.bump_version()
         queue.current_track_id = None
         queue.current_position = 0
         queue.save()
@@ -864,13 +1122,17 @@ class QueueViewSet(viewsets.ModelViewSet):
           404:
             description: No current track
         """
+        result = self._cached_move(request, 'step', 0)
+        if result:
+            return Response(queue_cache.with_favorite(request, result[2]))
+
         queue = self.get_object()
         if not queue.current_track_id:
             return Response({'detail': 'No current track'}, status=status.HTTP_404_NOT_FOUND)
             
         try:
-            current_track = QueueTrack.objects.get(queue=queue, track_id=queue.current_track_id)
-            return Response(QueueTrackSerializer(current_track).data)
+            _, current_track = queue_engine.current(queue)
+            return Response(QueueTrackSerializer(current_track, context={'request': request}).data)
         except QueueTrack.DoesNotExist:
             queue.current_track_id = None
             queue.save()
@@ -889,7 +1151,7 @@ class QueueViewSet(viewsets.ModelViewSet):
           properties:
             position:
               type: integer
-              description: Position in queue to jump to
+              description: Zero-based index in the queue to jump to
         responses:
           200:
             description: Jumped to position successfully
@@ -898,7 +1160,6 @@ class QueueViewSet(viewsets.ModelViewSet):
           404:
             description: No track at specified position
         """
-        queue = self.get_object()
         position = request.data.get('position')
         
         if position is None:
@@ -909,15 +1170,28 @@ class QueueViewSet(viewsets.ModelViewSet):
         except ValueError:
             return Response({'detail': 'position must be an integer'}, 
                           status=status.HTTP_400_BAD_REQUEST)
-                          
-        track = QueueTrack.objects.filter(queue=queue, position=position).first()
+        if position < 0:
+            return Response({'detail': 'position must not be negative'},
+                          status=status.HTTP_400_BAD_REQUEST)
+
+        result = self._cached_move(request, 'index', position, record_left=50, record_arrived=0)
+        if result:
+            moved, index, entry, size, is_radio = result
+            radio.refill_if_low(request.user.pk, size - index - 1, is_radio)
+            if not moved:
+                return Response({'detail': 'Track at position not found'},
+                              status=status.HTTP_404_NOT_FOUND)
+            return Response(queue_cache.with_favorite(request, entry))
+
+        queue = self.get_object()
+        track = queue_engine.track_at(queue, position)
         if not track:
             return Response({'detail': 'Track at position not found'}, 
                           status=status.HTTP_404_NOT_FOUND)
                           
         if queue.current_track_id and queue.current_track_id != track.track_id:
             try:
-                current_track = QueueTrack.objects.get(queue=queue, track_id=queue.current_track_id)
+                _, current_track = queue_engine.current(queue)
                 PlaybackHistory.objects.create(
                     user=request.user,
                     track_id=current_track.track_id,
@@ -934,6 +1208,8 @@ class QueueViewSet(viewsets.ModelViewSet):
         queue.current_track_id = track.track_id
         queue.current_position = position
         queue.save()
+        if queue.radio:
+            radio.refill_if_low(request.user.pk, queue_engine.length(queue) - position - 1, queue.radio)
         
         PlaybackHistory.objects.create(
             user=request.user,
@@ -946,7 +1222,7 @@ class QueueViewSet(viewsets.ModelViewSet):
             position=0
         )
         
-        return Response(QueueTrackSerializer(track).data)
+        return Response(QueueTrackSerializer(track, context={'request': request}).data)
         
     @action(detail=False, methods=['post'])
     def shuffle(self, request):
@@ -960,50 +1236,109 @@ class QueueViewSet(viewsets.ModelViewSet):
             description: Queue is empty
         """
         queue = self.get_object()
-        
-        try:
+        size = queue_engine.length(queue)
+        if not size:
+            return Response({'detail': 'Queue is empty'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Only a seed is stored; the order is derived on read, so this is a single UPDATE
+        anchor = None
+        if queue.current_track_id:
+            anchor = queue_engine.stored_index(queue, queue.current_track_id)
+        if anchor is None:
+            anchor = random.randrange(size)
+        changes = queue_engine.shuffle_fields(anchor, size)
+        for field, value in changes.items():
+            setattr(queue, field, value)
+        first_track = queue_engine.track_at(queue, 0)
+        queue.bump_version(current_track_id=first_track.track_id, current_position=0, **changes)
+        return Response(QueueSerializer(queue, context={'request': request}).data)
+
+    @action(detail=False, methods=['post'])
+    def unshuffle(self, request):
+        """
+        Return the queue to its stored order, keeping the current track.
+        ---
+        responses:
+          200:
+            description: Queue unshuffled successfully
+        """
+        queue = self.get_object()
+        if queue.shuffled:
+            changes = {'shuffled': False}
             if queue.current_track_id:
-                current_track = QueueTrack.objects.get(queue=queue, track_id=queue.current_track_id)
-                other_tracks = list(QueueTrack.objects.filter(queue=queue).exclude(id=current_track.id))
-                
-                random.shuffle(other_tracks)
-                
-                with transaction.atomic():
-                    current_track.position = 0
-                    current_track.save()
-                    
-                    for i, track in enumerate(other_tracks, 1):
-                        track.position = i
-                        track.save()
-            else:
-                tracks = list(QueueTrack.objects.filter(queue=queue))
-                random.shuffle(tracks)
-                
-                with transaction.atomic():
-                    for i, track in enumerate(tracks):
-                        track.position = i
-                        track.save()
-                        
-                if tracks:
-                    queue.current_track_id = tracks[0].track_id
-                    queue.current_position = 0
-                    queue.save()
-                
-            return Response(QueueSerializer(queue).data)
-            
-        except QueueTrack.DoesNotExist:
-            tracks = list(QueueTrack.objects.filter(queue=queue))
-            if not tracks:
-                return Response({'detail': 'Queue is empty'}, status=status.HTTP_400_BAD_REQUEST)
-                
-            random.shuffle(tracks)
-            with transaction.atomic():
-                for i, track in enumerate(tracks):
-                    track.position = i
-                    track.save()
-            
-            queue.current_track_id = tracks[0].track_id
-            queue.current_position = 0
-            queue.save()
-            
-            return Response(QueueSerializer(queue).data)
+                changes['current_position'] = queue_engine.stored_index(queue, queue.current_track_id) or 0
+            queue.bump_version(**changes)
+        return Response(QueueSerializer(queue, context={'request': request}).data)
+
+    @action(detail=False, methods=['post'])
+    def move(self, request):
+        """
+        Move a queued track directly before or after another queued track.
+        ---
+        request_body:
+          type: object
+          required:
+            - track_id
+          properties:
+            track_id:
+              type: string
+              description: Deezer track ID to move
+            before:
+              type: string
+              description: Track ID to move it in front of
+            after:
+              type: string
+              description: Track ID to move it behind
+        responses:
+          200:
+            description: Track moved
+          400:
+            description: Missing or invalid anchor
+          404:
+            description: Track not found in queue
+        """
+        queue = self.get_object()
+        ser = TrackMoveSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        moved = self._move(queue, [ser.validated_data])
+        return Response(QueueTrackSerializer(moved[0], context={'request': request}).data)
+
+    @action(detail=False, methods=['post'])
+    def reorder(self, request):
+        """
+        Apply several queue moves at once; each one writes a single row.
+        ---
+        request_body:
+          type: object
+          required:
+            - moves
+          properties:
+            moves:
+              type: array
+              items:
+                type: object
+              description: List of {track_id, before | after} moves, applied in order
+        responses:
+          200:
+            description: Tracks moved
+          400:
+            description: Missing or invalid anchor
+          404:
+            description: Track not found in queue
+        """
+        queue = self.get_object()
+        ser = TrackReorderSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        moved = self._move(queue, ser.validated_data['moves'])
+        return Response(QueueTrackSerializer(moved, many=True, context={'request': request}).data)
+
+    def _move(self, queue, moves):
+        queue_engine.bake(queue)
+        siblings = QueueTrack.objects.filter(queue=queue)
+        moved = _apply_moves(queue, 'queue', siblings, moves)
+        current = siblings.filter(track_id=queue.current_track_id).first() if queue.current_track_id else None
+        if current:
+            # Moves around the current track shift its index
+            queue.current_position = index_of(siblings, current)
+            queue.save(update_fields=['current_position'])
+        return moved
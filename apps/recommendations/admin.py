@@ -0,0 +1,16 @@
+from django.contrib import admin
+from .models import PrecomputedRecommendations, TasteProfile
+
+
+@admin.register(PrecomputedRecommendations)
+class PrecomputedRecommendationsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'model_version', 'computed_at']
+    search_fields = ['user__username']
+    readonly_fields = ['user', 'track_ids', 'model_version', 'computed_at']
+
+
+@admin.register(TasteProfile)
+class TasteProfileAdmin(admin.ModelAdmin):
+    list_display = ['user', 'plays', 'updated_at']
+    search_fields = ['user__username']
+    readonly_fields = ['user', 'artists', 'genres', 'plays', 'updated_at']
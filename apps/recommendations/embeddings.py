@@ -0,0 +1,265 @@
+"""
+Dense track embeddings for "more like this" and radio. build() factorises
+the co-listen matrix (users' plays and playlists' tracks against tracks)
+with a truncated SVD and writes unit-length float32 vectors to .npy files.
+Each worker memory-maps the files, so all workers on a host share the same
+page cache instead of holding their own copy.
+
+Rows are grouped by k-means cluster so the approximate search (IVF) scans a
+few contiguous slices; the exact search scans every row in batches.
+"""
+import os
+import shutil
+import time
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+from scipy import sparse
+from scipy.sparse.linalg import svds
+
+from apps.accounts.models import PlaybackHistory
+from apps.core.reloadable import Reloadable
+from apps.deezer.client import deezer_client
+from apps.playlists.models import PlaylistTrack
+from .similarity import _popular, _weights
+
+DIMENSIONS = 64
+# Tracks in fewer users' histories or playlists have too little signal to place
+MIN_CONTEXTS = 2
+# Clusters probed by the approximate search
+NPROBE = 16
+KMEANS_ITERATIONS = 10
+# Rows scored per matrix product in the exact search
+SCAN_BATCH = 65536
+CURRENT = 'current'
+FILES = ('vectors', 'track_ids', 'sorted_ids', 'sorted_rows', 'centroids', 'offsets')
+
+
+def _directory():
+    return str(getattr(settings, 'RECOMMENDER_EMBEDDINGS_DIR', os.path.join(settings.BASE_DIR, 'var', 'embeddings')))
+
+
+def co_listens(since):
+    """(contexts x tracks CSR, track ids): users' plays since `since` and every playlist's tracks"""
+    tracks, rows, cols, weights = {}, [], [], []
+    plays = (
+        PlaybackHistory.objects.filter(timestamp__gte=since)
+        .values_list('user_id', 'track_id')
+        .annotate(plays=Count('id'))
+        .order_by()
+    )
+    contexts = {}
+    for user_id, track_id, count in plays.iterator(chunk_size=10000):
+        rows.append(contexts.setdefault(('user', user_id), len(contexts)))
+        cols.append(tracks.setdefault(track_id, len(tracks)))
+        weights.append(count)
+    listed = PlaylistTrack.objects.values_list('playlist_id', 'track_id').distinct().order_by()
+    for playlist_id, track_id in listed.iterator(chunk_size=10000):
+        rows.append(contexts.setdefault(('playlist', playlist_id), len(contexts)))
+        cols.append(tracks.setdefault(track_id, len(tracks)))
+        weights.append(1)
+    matrix = sparse.csr_matrix(
+        (_weights(weights), (rows, cols)), shape=(len(contexts), len(tracks)), dtype=np.float32
+    )
+    return matrix, list(tracks)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (vectors / norms).astype(np.float32)
+
+
+def factorize(matrix, dimensions=DIMENSIONS):
+    """Unit-length tracks x dimensions embeddings from a truncated SVD of the co-listen matrix"""
+    dimensions = min(dimensions, min(matrix.shape) - 1)
+    if dimensions < 1:
+        return np.zeros((matrix.shape[1], 0), dtype=np.float32)
+    _, strengths, components = svds(matrix.astype(np.float64), k=dimensions, random_state=0)
+    return _normalize(components.T * np.sqrt(strengths))
+
+
+def kmeans(vectors, clusters, iterations=KMEANS_ITERATIONS, seed=0):
+    """(unit-length centroids, cluster per row) by spherical k-means"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    assignment = np.zeros(len(vectors), dtype=np.int64)
+    for _ in range(iterations):
+        for start in range(0, len(vectors), SCAN_BATCH):
+            assignment[start:start + SCAN_BATCH] = np.argmax(vectors[start:start + SCAN_BATCH] @ centroids.T, axis=1)
+        members = sparse.csr_matrix(
+            (np.ones(len(vectors), dtype=np.float32), (assignment, np.arange(len(vectors)))),
+            shape=(clusters, len(vectors)),
+        )
+        sums = np.asarray(members @ vectors)
+        empty = np.flatnonzero(np.bincount(assignment, minlength=clusters) == 0)
+        # Re-seed empty clusters on random rows rather than losing them
+        sums[empty] = vectors[rng.choice(len(vectors), len(empty))]
+        centroids = _normalize(sums)
+    return centroids, assignment
+
+
+def build(days=None, dimensions=DIMENSIONS, min_contexts=MIN_CONTEXTS):
+    """The index arrays for the last `days` of plays and all playlists, ready for publish()"""
+    days = days or getattr(settings, 'RECOMMENDER_HISTORY_DAYS', 180)
+    matrix, track_ids = co_listens(timezone.now() - timedelta(days=days))
+    matrix, track_ids = _popular(matrix, track_ids, min_contexts)
+    return arrays(factorize(matrix, dimensions), track_ids)
+
+
+def arrays(vectors, track_ids):
+    """Index arrays for unit-length vectors, with rows grouped by cluster"""
+    track_ids = np.array(track_ids, dtype=str)
+    clusters = max(1, int(np.sqrt(len(vectors)))) if len(vectors) else 0
+    if clusters:
+        centroids, assignment = kmeans(vectors, clusters)
+    else:
+        centroids, assignment = np.zeros((0, vectors.shape[1]), dtype=np.float32), np.zeros(0, dtype=np.int64)
+    order = np.argsort(assignment, kind='stable')
+    track_ids = track_ids[order]
+    by_id = np.argsort(track_ids)
+    return {
+        'vectors': np.ascontiguousarray(vectors[order]),
+        'track_ids': track_ids,
+        'sorted_ids': track_ids[by_id],
+        'sorted_rows': by_id.astype(np.int64),
+        'centroids': centroids,
+        'offsets': np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=clusters))]).astype(np.int64),
+    }
+
+
+def publish(index_arrays, directory=None):
+    """
+    Write the arrays to a new version directory and repoint the `current`
+    link at it in one rename, so workers never map a half-written index.
+    Returns the version.
+    """
+    directory = directory or _directory()
+    version = str(time.time_ns())
+    path = os.path.join(directory, version)
+    os.makedirs(path)
+    for name in FILES:
+        np.save(os.path.join(path, f'{name}.npy'), index_arrays[name], allow_pickle=False)
+    link = os.path.join(directory, f'{CURRENT}.{version}')
+    os.symlink(version, link)
+    os.replace(link, os.path.join(directory, CURRENT))
+    # Keep the previous version for workers that have not switched yet; unlinking mapped files is safe
+    versions = sorted(name for name in os.listdir(directory) if name.isdigit())
+    for old in versions[:-2]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    return version
+
+
+def rebuild():
+    index_arrays = build()
+    if not index_arrays['vectors'].size:
+        # Too little history to embed anything yet; keep serving the current index
+        return 0
+    publish(index_arrays)
+    return len(index_arrays['track_ids'])
+
+
+class EmbeddingIndex:
+    """A published index, memory-mapped read-only"""
+
+    def __init__(self, path, version=None):
+        self.version = version
+        for name in FILES:
+            setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r', allow_pickle=False))
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    def rows(self, track_ids):
+        """Rows of the given tracks; tracks not in the index are skipped"""
+        wanted = np.array([str(track_id) for track_id in track_ids], dtype=str)
+        if not len(wanted) or not len(self):
+            return np.zeros(0, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self.sorted_ids, wanted), len(self) - 1)
+        return np.asarray(self.sorted_rows[found[self.sorted_ids[found] == wanted]])
+
+    @staticmethod
+    def _top(scores, rows, k):
+        """The k best (rows, scores) of one row of scores, best first"""
+        if len(scores) > k:
+            top = np.argpartition(scores, -k)[-k:]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return rows[order], scores[order]
+
+    def exact(self, queries, k):
+        """
+        Brute-force top k rows by cosine similarity for each of the unit-length
+        queries, scanning SCAN_BATCH rows per matrix product. Returns a list of
+        (rows, scores) per query.
+        """
+        queries = np.atleast_2d(queries).astype(np.float32)
+        best = [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+        for start in range(0, len(self), SCAN_BATCH):
+            scores = queries @ np.asarray(self.vectors[start:start + SCAN_BATCH]).T
+            rows = np.arange(start, start + scores.shape[1])
+            for i, (kept_rows, kept_scores) in enumerate(best):
+                best[i] = self._top(np.concatenate([kept_scores, scores[i]]), np.concatenate([kept_rows, rows]), k)
+        return best
+
+    def approximate(self, queries, k, nprobe=NPROBE):
+        """Top k rows for each query from its nprobe nearest clusters only"""
+        queries = np.atleast_2d(queries).astype(np.float32)
+        if nprobe >= len(self.centroids):
+            return self.exact(queries, k)
+        probes = np.argpartition(queries @ np.asarray(self.centroids).T, -nprobe, axis=1)[:, -nprobe:]
+        results = []
+        for query, clusters in zip(queries, probes):
+            rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in clusters])
+            results.append(self._top(np.asarray(self.vectors[rows]) @ query, rows, k))
+        return results
+
+    def similar(self, track_ids, limit=20, exact=False):
+        """[(track_id, score)] for the tracks closest to the given ones together, best first"""
+        seeds = self.rows(track_ids)
+        if not len(seeds):
+            return []
+        query = _normalize(np.asarray(self.vectors[np.sort(seeds)]).mean(axis=0, keepdims=True))
+        k = limit + len(seeds)
+        rows, scores = (self.exact(query, k) if exact else self.approximate(query, k))[0]
+        keep = ~np.isin(rows, seeds)
+        return [(str(self.track_ids[row]), float(score)) for row, score in zip(rows[keep][:limit], scores[keep][:limit])]
+
+
+def _load(current):
+    try:
+        version = os.readlink(os.path.join(_directory(), CURRENT))
+    except OSError:
+        return current
+    if current is not None and current.version == version:
+        return current
+    return EmbeddingIndex(os.path.join(_directory(), version), version)
+
+
+_index = Reloadable(_load, 'RECOMMENDER_REFRESH', 600)
+
+
+def get_index():
+    """
+    This process's index, or None until one has been published. The
+    `current` link is checked every RECOMMENDER_REFRESH seconds.
+    """
+    return _index.get()
+
+
+def similar_tracks(track_ids, limit=20):
+    """
+    Track documents like the given tracks, from the embedding index and
+    hydrated from the cache and mirror only. Falls back to Deezer's related
+    tracks for the first track when the index knows none of them.
+    """
+    index = get_index()
+    similar = [track_id for track_id, _ in index.similar(track_ids, limit)] if index is not None else []
+    if similar:
+        found = deezer_client.get_tracks(similar, fetch_missing=False)
+        tracks = [found[track_id] for track_id in similar if track_id in found]
+        if tracks:
+            return tracks
+    return deezer_client.get_related_tracks(track_ids[0], limit=limit) if track_ids else []
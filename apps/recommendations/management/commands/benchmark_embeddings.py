@@ -0,0 +1,73 @@
+import statistics
+import tempfile
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.recommendations import embeddings
+
+
+class Command(BaseCommand):
+    help = "Measure recall and latency of the approximate embedding search against the exact one"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200, help="Tracks sampled as queries")
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--nprobe', type=int, nargs='*', default=[1, 4, 8, 16, 32])
+        parser.add_argument('--synthetic', type=int, metavar='TRACKS',
+                            help="Benchmark a random clustered index of this many tracks instead of the published one")
+        parser.add_argument('--dimensions', type=int, default=embeddings.DIMENSIONS,
+                            help="Dimensions of the synthetic index")
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            with tempfile.TemporaryDirectory() as directory:
+                self._benchmark(self._synthetic(directory, options['synthetic'], options['dimensions']), options)
+            return
+        index = embeddings.get_index()
+        if index is None:
+            self.stderr.write("No embedding index has been published; run build_embeddings or pass --synthetic")
+            return
+        self._benchmark(index, options)
+
+    def _benchmark(self, index, options):
+        k = options['k']
+        rng = np.random.default_rng(0)
+        queries = np.asarray(index.vectors[np.sort(rng.choice(len(index), min(options['queries'], len(index)), replace=False))])
+        self.stdout.write(f"{len(index)} tracks, {index.vectors.shape[1]} dimensions, {len(index.centroids)} clusters")
+
+        exact, timings = self._run(lambda query: index.exact(query, k), queries)
+        self._report('exact', timings, 1.0)
+        started = time.perf_counter()
+        index.exact(queries, k)
+        batched = (time.perf_counter() - started) * 1000 / len(queries)
+        self.stdout.write(f"{'batched':>10}: {batched:.2f} ms per query over one batch of {len(queries)}")
+
+        for nprobe in options['nprobe']:
+            found, timings = self._run(lambda query: index.approximate(query, k, nprobe), queries)
+            recall = np.mean([len(np.intersect1d(a[0], e[0])) / max(len(e[0]), 1) for a, e in zip(found, exact)])
+            self._report(f'nprobe={nprobe}', timings, recall)
+
+    def _run(self, search, queries):
+        results, timings = [], []
+        for query in queries:
+            started = time.perf_counter()
+            results.append(search(query)[0])
+            timings.append((time.perf_counter() - started) * 1000)
+        return results, timings
+
+    def _report(self, label, timings, recall):
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"{label:>10}: recall {recall:.3f}, "
+            f"median {statistics.median(timings):.2f} ms, p95 {p95:.2f} ms, max {timings[-1]:.2f} ms"
+        )
+
+    def _synthetic(self, directory, tracks, dimensions):
+        """Tracks drawn around random centres, so the data has the cluster structure real co-listens have"""
+        rng = np.random.default_rng(0)
+        centres = rng.standard_normal((max(1, tracks // 500), dimensions))
+        vectors = centres[rng.integers(0, len(centres), tracks)] + 1.5 * rng.standard_normal((tracks, dimensions))
+        version = embeddings.publish(embeddings.arrays(embeddings._normalize(vectors), [str(i) for i in range(tracks)]), directory)
+        return embeddings.EmbeddingIndex(f"{directory}/{version}", version)
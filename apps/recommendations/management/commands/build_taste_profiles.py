@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.recommendations import taste
+
+
+class Command(BaseCommand):
+    help = "Recompute taste profiles from the whole playback history, e.g. to backfill plays recorded before profiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users', help="Only this user id (repeatable)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = taste.rebuild(options['users'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} taste profiles"))
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.5 on 2026-10-19 03:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0004_favorite_recent_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecomputedRecommendations',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='precomputed_recommendations', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('track_ids', models.JSONField(default=list)),
+                ('model_version', models.CharField(blank=True, max_length=32)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'Precomputed recommendations',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import models
+from django.conf import settings
+
+
+class PrecomputedRecommendations(models.Model):
+    """A user's recommended track ids, written by the nightly precompute_recommendations run"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='precomputed_recommendations'
+    )
+    # Best first
+    track_ids = models.JSONField(default=list)
+    model_version = models.CharField(max_length=32, blank=True)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "Precomputed recommendations"
+
+    def __str__(self):
+        return f"{self.user} at {self.computed_at}"
+
+
+class TasteProfile(models.Model):
+    """
+    Exponentially decayed play weights per artist and genre, updated as plays
+    are recorded (see apps.recommendations.taste). Weights are as of
+    updated_at; decay is uniform, so their order holds at any later time.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='taste_profile'
+    )
+    # {artist_id: weight} and {genre: weight}
+    artists = models.JSONField(default=dict)
+    genres = models.JSONField(default=dict)
+    plays = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def top_artists(self, limit=5):
+        return sorted(self.artists, key=self.artists.get, reverse=True)[:limit]
+
+    def top_genres(self, limit=3):
+        return sorted(self.genres, key=self.genres.get, reverse=True)[:limit]
+
+    def __str__(self):
+        return f"{self.user} taste profile"
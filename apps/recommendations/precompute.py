@@ -0,0 +1,89 @@
+"""
+Nightly recommendations for every active user. precompute_recommendations
+splits the users who played something in the last RECOMMENDER_ACTIVE_DAYS
+into shards and fans them out to the workers with a chord. Each shard task
+streams its users' recent plays in one query, scores them a batch at a time
+with the item-item model, and upserts one row per user. The endpoint then
+answers with a primary-key lookup; only users without a row take the lazy
+path.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+
+from apps.accounts.models import PlaybackHistory
+from . import similarity
+from .models import PrecomputedRecommendations
+
+SHARD_SIZE = 500
+# Users scored together in one set of sparse products
+SCORE_BATCH = 256
+LIMIT = 20
+
+
+def active_users(days=None):
+    """Ids, as strings, of the users who played something in the last `days`"""
+    days = days or getattr(settings, 'RECOMMENDER_ACTIVE_DAYS', 30)
+    users = (
+        PlaybackHistory.objects.filter(timestamp__gte=timezone.now() - timedelta(days=days))
+        .values_list('user_id', flat=True)
+        .distinct()
+        .order_by('user_id')
+    )
+    return [str(user_id) for user_id in users.iterator(chunk_size=10000)]
+
+
+def shards(user_ids, size=SHARD_SIZE):
+    return [user_ids[start:start + size] for start in range(0, len(user_ids), size)]
+
+
+def histories(user_ids):
+    """{user id: [(track_id, artist_id)]} of each user's last PROFILE_PLAYS plays, newest first"""
+    since = timezone.now() - timedelta(days=getattr(settings, 'RECOMMENDER_HISTORY_DAYS', 180))
+    rows = (
+        PlaybackHistory.objects.filter(user_id__in=user_ids, timestamp__gte=since)
+        .order_by('user_id', '-timestamp', '-id')
+        .values_list('user_id', 'track_id', 'artist_id')
+    )
+    found = {}
+    for user_id, track_id, artist_id in rows.iterator(chunk_size=5000):
+        plays = found.setdefault(user_id, [])
+        if len(plays) < similarity.PROFILE_PLAYS:
+            plays.append((track_id, artist_id))
+    return found
+
+
+def score_shard(user_ids, limit=LIMIT):
+    """Score and store the users' recommendations; returns the number of users stored"""
+    model = similarity.get_model()
+    if model is None:
+        return 0
+    found = histories(user_ids)
+    users = list(found)
+    computed_at = timezone.now()
+    rows = []
+    for start in range(0, len(users), SCORE_BATCH):
+        batch = users[start:start + SCORE_BATCH]
+        for user_id, recommended in zip(batch, model.recommend_many([found[user] for user in batch], limit)):
+            if recommended:
+                rows.append(PrecomputedRecommendations(
+                    user_id=user_id,
+                    track_ids=[track_id for track_id, _ in recommended],
+                    model_version=model.version or '',
+                    computed_at=computed_at,
+                ))
+    PrecomputedRecommendations.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['user'], update_fields=['track_ids', 'model_version', 'computed_at']
+    )
+    return len(rows)
+
+
+def purge(before):
+    """Drop rows the run that started at `before` did not rewrite: users no longer active or scorable"""
+    deleted, _ = PrecomputedRecommendations.objects.filter(computed_at__lt=before).delete()
+    return deleted
+
+
+def stored(user_id):
+    """The user's precomputed track ids, best first, or None when there are none"""
+    return PrecomputedRecommendations.objects.filter(user_id=user_id).values_list('track_ids', flat=True).first()
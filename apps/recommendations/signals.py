@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from apps.accounts.models import PlaybackHistory
+from .tasks import record_taste
+
+
+@receiver(post_save, sender=PlaybackHistory)
+def queue_taste_update(sender, instance, created, **kwargs):
+    """Fold the play into the user's taste profile after the request, off the playback path"""
+    if created:
+        transaction.on_commit(lambda: record_taste.delay([str(instance.pk)]))
@@ -0,0 +1,270 @@
+"""
+Item-item collaborative filtering over PlaybackHistory. build() turns recent
+plays into sparse user x track and user x artist matrices, computes cosine
+similarities between items a block of rows at a time, keeps each item's top
+NEIGHBOURS and publishes the result through the cache. Every process loads
+it once and scores a user with a sparse vector-matrix product, so answering
+needs one history query and no Deezer calls.
+"""
+import io
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+from scipy import sparse
+
+from apps.accounts.models import PlaybackHistory
+from apps.core.cache import get_cache_key
+from apps.core.reloadable import Reloadable
+
+MODEL_KEY = get_cache_key('recommender', 'model')
+VERSION_KEY = get_cache_key('recommender', 'version')
+
+NEIGHBOURS = 50
+BLOCK_SIZE = 1024
+# Items heard by fewer users have no co-listens worth keeping
+MIN_LISTENERS = 2
+# How much affinity for a track's artist adds to the track's own score
+ARTIST_WEIGHT = 0.3
+# Recent plays that make up the user vector at scoring time
+PROFILE_PLAYS = 200
+
+
+def _weights(plays):
+    """Dampen repeat plays so one obsessive listener does not dominate an item"""
+    return np.log1p(np.asarray(plays, dtype=np.float32))
+
+
+def _matrix(entries, item_ids):
+    """users x items CSR from {(user index, item index): plays}"""
+    if not entries:
+        return sparse.csr_matrix((0, len(item_ids)), dtype=np.float32)
+    (rows, cols), plays = zip(*entries.keys()), list(entries.values())
+    shape = (max(rows) + 1, len(item_ids))
+    return sparse.csr_matrix((_weights(plays), (rows, cols)), shape=shape, dtype=np.float32)
+
+
+def interactions(since):
+    """
+    (track matrix, track ids, artist matrix, artist ids, track artist ids) for
+    plays since `since`, aggregated per user and track by the database and
+    streamed rather than loaded at once.
+    """
+    rows = (
+        PlaybackHistory.objects.filter(timestamp__gte=since)
+        .values_list('user_id', 'track_id', 'artist_id')
+        .annotate(plays=Count('id'))
+        .order_by()
+    )
+    users, tracks, artists = {}, {}, {}
+    track_entries, artist_entries = {}, defaultdict(int)
+    track_artist = {}
+    for user_id, track_id, artist_id, plays in rows.iterator(chunk_size=10000):
+        user = users.setdefault(user_id, len(users))
+        track = tracks.setdefault(track_id, len(tracks))
+        track_entries[user, track] = track_entries.get((user, track), 0) + plays
+        if artist_id:
+            artist = artists.setdefault(artist_id, len(artists))
+            artist_entries[user, artist] += plays
+            track_artist.setdefault(track_id, artist_id)
+    track_ids, artist_ids = list(tracks), list(artists)
+    return (
+        _matrix(track_entries, track_ids), track_ids,
+        _matrix(artist_entries, artist_ids), artist_ids,
+        track_artist,
+    )
+
+
+def _popular(matrix, ids, min_listeners):
+    """The matrix and ids restricted to items with at least min_listeners users"""
+    listeners = np.diff(matrix.tocsc().indptr)
+    keep = np.flatnonzero(listeners >= min_listeners)
+    return matrix[:, keep].tocsr(), [ids[i] for i in keep]
+
+
+def top_neighbours(matrix, k=NEIGHBOURS, block_size=BLOCK_SIZE):
+    """
+    items x items CSR holding each item's k most cosine-similar other items,
+    computed block_size items at a time so the full similarity matrix is
+    never materialised.
+    """
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    normalized = (matrix @ sparse.diags(1 / norms)).astype(np.float32).tocsc()
+    by_item = normalized.T.tocsr()
+    items = matrix.shape[1]
+
+    indptr, indices, data = [0], [], []
+    for start in range(0, items, block_size):
+        block = (by_item[start:start + block_size] @ normalized).tocsr()
+        for row in range(block.shape[0]):
+            lo, hi = block.indptr[row], block.indptr[row + 1]
+            cols, sims = block.indices[lo:hi], block.data[lo:hi]
+            keep = cols != start + row
+            cols, sims = cols[keep], sims[keep]
+            if len(sims) > k:
+                top = np.argpartition(sims, -k)[-k:]
+                cols, sims = cols[top], sims[top]
+            indices.append(cols)
+            data.append(sims)
+            indptr.append(indptr[-1] + len(cols))
+    if not indices:
+        return sparse.csr_matrix((items, items), dtype=np.float32)
+    return sparse.csr_matrix(
+        (np.concatenate(data).astype(np.float32), np.concatenate(indices).astype(np.int32), np.asarray(indptr)),
+        shape=(items, items),
+    )
+
+
+def build(days=None, k=NEIGHBOURS, min_listeners=MIN_LISTENERS):
+    """Neighbour arrays for the last `days` of plays, ready for publish()"""
+    days = days or getattr(settings, 'RECOMMENDER_HISTORY_DAYS', 180)
+    track_matrix, track_ids, artist_matrix, artist_ids, track_artist = interactions(timezone.now() - timedelta(days=days))
+    track_matrix, track_ids = _popular(track_matrix, track_ids, min_listeners)
+    artist_matrix, artist_ids = _popular(artist_matrix, artist_ids, min_listeners)
+    tracks = top_neighbours(track_matrix, k)
+    artists = top_neighbours(artist_matrix, k)
+    artist_index = {artist_id: i for i, artist_id in enumerate(artist_ids)}
+    return {
+        'track_ids': np.array(track_ids, dtype=str),
+        'artist_ids': np.array(artist_ids, dtype=str),
+        'track_artist': np.array([artist_index.get(track_artist.get(t), -1) for t in track_ids], dtype=np.int32),
+        'track_data': tracks.data, 'track_indices': tracks.indices, 'track_indptr': tracks.indptr,
+        'artist_data': artists.data, 'artist_indices': artists.indices, 'artist_indptr': artists.indptr,
+    }
+
+
+def publish(arrays):
+    """Store the arrays for every process to load; returns the new model version"""
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    version = str(time.time_ns())
+    cache.set(MODEL_KEY, buffer.getvalue(), None)
+    cache.set(VERSION_KEY, version, None)
+    return version
+
+
+def rebuild():
+    arrays = build()
+    publish(arrays)
+    return len(arrays['track_ids'])
+
+
+class Model:
+    """Loaded neighbour lists with the id lookups scoring needs"""
+
+    def __init__(self, arrays, version=None):
+        self.version = version
+        self.track_ids = arrays['track_ids']
+        self.artist_ids = arrays['artist_ids']
+        self.track_artist = arrays['track_artist']
+        self.track_index = {track_id: i for i, track_id in enumerate(self.track_ids.tolist())}
+        self.artist_index = {artist_id: i for i, artist_id in enumerate(self.artist_ids.tolist())}
+        items, artists = len(self.track_ids), len(self.artist_ids)
+        self.tracks = sparse.csr_matrix(
+            (arrays['track_data'], arrays['track_indices'], arrays['track_indptr']), shape=(items, items)
+        )
+        self.artists = sparse.csr_matrix(
+            (arrays['artist_data'], arrays['artist_indices'], arrays['artist_indptr']), shape=(artists, artists)
+        )
+        known = np.flatnonzero(self.track_artist >= 0)
+        self.artist_tracks = sparse.csr_matrix(
+            (np.ones(len(known), dtype=np.float32), (self.track_artist[known], known)), shape=(artists, items)
+        )
+
+    @classmethod
+    def loads(cls, blob, version=None):
+        with np.load(io.BytesIO(blob), allow_pickle=False) as arrays:
+            return cls({name: arrays[name] for name in arrays.files}, version)
+
+    @staticmethod
+    def _profiles(index, histories, size):
+        """users x items CSR of damped play counts, from one Counter of item plays per user"""
+        rows, cols, plays = [], [], []
+        for row, counts in enumerate(histories):
+            for item, count in counts.items():
+                col = index.get(item)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+                    plays.append(count)
+        return sparse.csr_matrix((_weights(plays), (rows, cols)), shape=(len(histories), size), dtype=np.float32)
+
+    def scores(self, histories):
+        """
+        users x tracks CSR of scores for each user's (track_id, artist_id)
+        plays, computed for all of them in one set of sparse products.
+        Tracks a user has played are left out.
+        """
+        tracks = self._profiles(
+            self.track_index, [Counter(track_id for track_id, _ in history) for history in histories], len(self.track_ids)
+        )
+        artists = self._profiles(
+            self.artist_index,
+            [Counter(artist_id for _, artist_id in history if artist_id) for history in histories],
+            len(self.artist_ids),
+        )
+        # The user's own artists count as well as the artists similar to them
+        affinity = artists + artists @ self.artists
+        scores = (tracks @ self.tracks + ARTIST_WEIGHT * (affinity @ self.artist_tracks)).tocsr()
+        played = tracks.copy()
+        played.data[:] = 1
+        scores = (scores - scores.multiply(played)).tocsr()
+        scores.eliminate_zeros()
+        scores.sort_indices()
+        return scores
+
+    def recommend_many(self, histories, limit=20):
+        """[(track_id, score)] best first for each history"""
+        scores = self.scores(histories)
+        results = []
+        for row in range(scores.shape[0]):
+            lo, hi = scores.indptr[row], scores.indptr[row + 1]
+            cols, values = scores.indices[lo:hi], scores.data[lo:hi]
+            if len(values) > limit:
+                top = np.sort(np.argpartition(values, -limit)[-limit:])
+                cols, values = cols[top], values[top]
+            order = np.argsort(-values, kind='stable')
+            results.append([(str(self.track_ids[col]), float(value)) for col, value in zip(cols[order], values[order])])
+        return results
+
+    def recommend(self, history, limit=20):
+        """[(track_id, score)] best first"""
+        return self.recommend_many([history], limit)[0]
+
+
+def _load(current):
+    version = cache.get(VERSION_KEY)
+    if version is None or (current is not None and current.version == version):
+        return current
+    blob = cache.get(MODEL_KEY)
+    return Model.loads(blob, version) if blob is not None else current
+
+
+_model = Reloadable(_load, 'RECOMMENDER_REFRESH', 600)
+
+
+def get_model():
+    """
+    This process's model, or None until one has been published. The version
+    is checked every RECOMMENDER_REFRESH seconds and a newer model is loaded
+    in the background while the current one keeps serving.
+    """
+    return _model.get()
+
+
+def recommend(user_id, limit=20):
+    """[(track_id, score)] for the user from their recent plays, or [] without a model or history"""
+    model = get_model()
+    if model is None:
+        return []
+    history = list(
+        PlaybackHistory.objects.filter(user_id=user_id)
+        .order_by('-timestamp', '-id')
+        .values_list('track_id', 'artist_id')[:PROFILE_PLAYS]
+    )
+    return model.recommend(history, limit) if history else []
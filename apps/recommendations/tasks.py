@@ -0,0 +1,52 @@
+from celery import chord, shared_task
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+@shared_task
+def build_recommender():
+    from .similarity import rebuild
+
+    return rebuild()
+
+
+@shared_task
+def build_embeddings():
+    from .embeddings import rebuild
+
+    return rebuild()
+
+
+@shared_task
+def precompute_recommendations():
+    """Fan the active users out to precompute_recommendations_shard; returns the number of shards"""
+    from .precompute import active_users, shards
+
+    started = timezone.now().isoformat()
+    header = [precompute_recommendations_shard.s(user_ids) for user_ids in shards(active_users())]
+    if header:
+        chord(header)(finish_precompute.s(started))
+    return len(header)
+
+
+@shared_task
+def precompute_recommendations_shard(user_ids):
+    from .precompute import score_shard
+
+    return score_shard(user_ids)
+
+
+@shared_task
+def finish_precompute(counts, started):
+    from .precompute import purge
+
+    purge(parse_datetime(started))
+    return sum(counts)
+
+
+@shared_task
+def record_taste(play_ids):
+    from apps.accounts.models import PlaybackHistory
+    from .taste import record
+
+    record(list(PlaybackHistory.objects.filter(pk__in=play_ids)))
@@ -0,0 +1,182 @@
+"""
+Per-user taste profiles: play weights per artist and genre that halve every
+RECOMMENDER_TASTE_HALF_LIFE days. record() folds new plays into the stored
+weights as they are written, so a profile reflects the whole history at the
+cost of one row read and write per batch of plays, and readers get a user's
+top artists or genres from a single primary-key lookup.
+"""
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.core.cache import get_cache_key
+from .models import TasteProfile
+
+MAX_ARTISTS = 200
+MAX_GENRES = 50
+# Weights decayed below this are dropped
+MIN_WEIGHT = 0.01
+ARTIST_GENRES_TTL = 60 * 60 * 24
+
+
+def _half_life():
+    return getattr(settings, 'RECOMMENDER_TASTE_HALF_LIFE', 30) * 24 * 60 * 60
+
+
+def _decay(seconds):
+    return 0.5 ** (max(seconds, 0) / _half_life())
+
+
+def _genre_key(artist_id):
+    return get_cache_key('artist_genres', artist_id)
+
+
+def artist_genres(artist_ids):
+    """
+    {artist_id: [genre names]} from the genres of the artists' mirrored
+    albums, cached per artist. Artists the mirror knows no genres for are
+    looked up on Deezer, which also mirrors their albums, so this belongs
+    in tasks rather than on the request path.
+    """
+    artist_ids = [str(artist_id) for artist_id in dict.fromkeys(artist_ids) if artist_id]
+    keys = {_genre_key(artist_id): artist_id for artist_id in artist_ids}
+    found = {keys[key]: genres for key, genres in cache.get_many(list(keys)).items()}
+    missing = [artist_id for artist_id in artist_ids if artist_id not in found]
+    if missing:
+        from apps.catalogue.models import Album
+
+        fetched = defaultdict(set)
+        albums = Album.objects.filter(artist__deezer_id__in=missing).exclude(synced_at=None)
+        for artist_id, payload in albums.values_list('artist__deezer_id', 'payload'):
+            genres = (payload or {}).get('genres') or {}
+            fetched[artist_id].update(genre['name'] for genre in genres.get('data', []) if genre.get('name'))
+        fetched = {artist_id: sorted(fetched[artist_id]) for artist_id in missing}
+        if not all(fetched.values()):
+            from apps.deezer.client import deezer_client
+
+            for artist_id, genres in fetched.items():
+                if not genres:
+                    fetched[artist_id] = deezer_client.get_artist_genres(artist_id)
+        cache.set_many({_genre_key(artist_id): genres for artist_id, genres in fetched.items()}, ARTIST_GENRES_TTL)
+        found.update(fetched)
+    return found
+
+
+def _add(weights, key, amount):
+    weights[key] = weights.get(key, 0) + amount
+
+
+def _pruned(weights, cap):
+    kept = sorted(((w, k) for k, w in weights.items() if w >= MIN_WEIGHT), reverse=True)[:cap]
+    return {k: round(w, 4) for w, k in kept}
+
+
+def fold(profile, plays, genres_by_artist):
+    """
+    Add the (artist_id, genre, timestamp) plays to the profile's weights in
+    memory. A play newer than the profile decays the stored weights up to
+    its time; an older one is added at its own decayed weight.
+    """
+    artists, genres = dict(profile.artists), dict(profile.genres)
+    for artist_id, genre, timestamp in sorted(plays, key=lambda play: play[2]):
+        if timestamp > profile.updated_at:
+            factor = _decay((timestamp - profile.updated_at).total_seconds())
+            artists = {k: w * factor for k, w in artists.items()}
+            genres = {k: w * factor for k, w in genres.items()}
+            profile.updated_at = timestamp
+            weight = 1.0
+        else:
+            weight = _decay((profile.updated_at - timestamp).total_seconds())
+        if artist_id:
+            _add(artists, str(artist_id), weight)
+        play_genres = [genre] if genre else genres_by_artist.get(str(artist_id), [])
+        for name in play_genres:
+            # A play counts once however many genres its artist spans
+            _add(genres, name, weight / len(play_genres))
+        profile.plays += 1
+    profile.artists = _pruned(artists, MAX_ARTISTS)
+    profile.genres = _pruned(genres, MAX_GENRES)
+    return profile
+
+
+def _plays(rows):
+    return [(row.artist_id, row.genre, row.timestamp) for row in rows]
+
+
+def record(plays):
+    """Fold PlaybackHistory rows just written into their users' profiles"""
+    by_user = defaultdict(list)
+    for play in plays:
+        by_user[play.user_id].append(play)
+    if not by_user:
+        return
+    genres_by_artist = artist_genres(play.artist_id for play in plays if not play.genre)
+    for user_id, rows in by_user.items():
+        with transaction.atomic():
+            profile = TasteProfile.objects.select_for_update().filter(user_id=user_id).first()
+            if profile is None:
+                TasteProfile.objects.bulk_create(
+                    [TasteProfile(user_id=user_id, updated_at=min(row.timestamp for row in rows))], ignore_conflicts=True
+                )
+                profile = TasteProfile.objects.select_for_update().get(user_id=user_id)
+            fold(profile, _plays(rows), genres_by_artist)
+            profile.save(update_fields=['artists', 'genres', 'plays', 'updated_at'])
+
+
+def get(user_id):
+    """The user's profile, or None before their first recorded play"""
+    return TasteProfile.objects.filter(user_id=user_id).first()
+
+
+def top_artists(user_id, limit=5):
+    profile = get(user_id)
+    return profile.top_artists(limit) if profile else []
+
+
+def top_genres(user_id, limit=3):
+    profile = get(user_id)
+    return profile.top_genres(limit) if profile else []
+
+
+def rebuild(user_ids=None, batch_size=1000):
+    """
+    Recompute profiles from the whole of PlaybackHistory, streamed in user
+    order, for backfilling users whose plays predate profiles. Returns the
+    number of profiles written.
+    """
+    from apps.accounts.models import PlaybackHistory
+
+    rows = PlaybackHistory.objects.order_by('user_id', 'timestamp')
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+    rows = rows.values_list('user_id', 'artist_id', 'genre', 'timestamp')
+
+    written = 0
+    batch, current, plays = [], None, []
+
+    def flush_batch():
+        genres_by_artist = artist_genres(
+            artist_id for profile, user_plays in batch for artist_id, genre, _ in user_plays if not genre
+        )
+        profiles = [fold(profile, user_plays, genres_by_artist) for profile, user_plays in batch]
+        TasteProfile.objects.bulk_create(
+            profiles, update_conflicts=True, unique_fields=['user'],
+            update_fields=['artists', 'genres', 'plays', 'updated_at'],
+        )
+        return len(profiles)
+
+    for user_id, artist_id, genre, timestamp in rows.iterator(chunk_size=10000):
+        if user_id != current:
+            if plays:
+                batch.append((TasteProfile(user_id=current, updated_at=plays[0][2]), plays))
+                if len(batch) >= batch_size:
+                    written += flush_batch()
+                    batch = []
+            current, plays = user_id, []
+        plays.append((artist_id, genre, timestamp))
+    if plays:
+        batch.append((TasteProfile(user_id=current, updated_at=plays[0][2]), plays))
+    if batch:
+        written += flush_batch()
+    return written